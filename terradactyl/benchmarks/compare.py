@@ -0,0 +1,60 @@
+"""Compare two sets of benchmark results, e.g. from before and after a change.
+
+The median of each target found in both files is compared, and the exit status
+is 1 when any has slowed down by more than the threshold, so this can gate CI.
+
+Usage:
+    python -m benchmarks.compare before.json after.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+
+
+def compare(baseline: dict, current: dict, threshold: float):
+    """Compare the median duration of each target in both results.
+
+    Args
+        baseline: the results to compare against.
+        current: the new results.
+        threshold: the fraction a median has to increase by to count as a regression.
+    Returns
+        A list of (target, baseline median, current median, relative change, regressed), in target order.
+    """
+    comparisons = []
+    for target in sorted(set(baseline['targets']) & set(current['targets'])):
+        before = baseline['targets'][target]['median']
+        after = current['targets'][target]['median']
+        change = (after - before) / before if before else 0.0
+        comparisons.append((target, before, after, change, change > threshold))
+    return comparisons
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files.')
+    parser.add_argument('baseline', help='JSON results to compare against')
+    parser.add_argument('current', help='JSON results to compare')
+    parser.add_argument('--threshold', type=float, default=0.1, help='fractional slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    with open(args.baseline) as baseline_file, open(args.current) as current_file:
+        baseline, current = json.load(baseline_file), json.load(current_file)
+    if baseline['benchmark'] != current['benchmark']:
+        parser.error(f'cannot compare {baseline["benchmark"]} results with {current["benchmark"]} results')
+    if baseline.get('parameters') != current.get('parameters'):
+        print('Warning: the results were run with different parameters.', file=sys.stderr)
+
+    comparisons = compare(baseline, current, args.threshold)
+    for target, before, after, change, regressed in comparisons:
+        print(f'{target:40} {before:10.4f}s {after:10.4f}s {change:+8.1%}{"  REGRESSED" if regressed else ""}')
+    for target in sorted(set(baseline['targets']) ^ set(current['targets'])):
+        print(f'{target:40} only in {"baseline" if target in baseline["targets"] else "current"}')
+
+    regressions = [c for c in comparisons if c[4]]
+    if regressions:
+        print(f'{len(regressions)} of {len(comparisons)} targets regressed by more than {args.threshold:.0%}.')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""A local stand in for the parts of the Terraform Cloud API that Terradactyl syncs
+from, serving a SyntheticOrganization. Point Terradactyl at it by setting
+TERRADACTYL_TERRAFORM_CLOUD_URL to its url.
+
+Usage:
+    python -m benchmarks.fake_tfc --workspaces 1000 --port 8000
+"""
+import argparse
+import datetime
+import json
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks import synthetic
+
+WORKSPACES_PAGE_SIZE = 100
+STATE_VERSIONS_PAGE_SIZE = 20
+RUNS_PER_WORKSPACE = 5
+
+NOT_FOUND = {'errors': [{'status': '404', 'title': 'not found'}]}
+
+
+def _pagination(items: list, page_number: int, page_size: int):
+    start = (page_number - 1) * page_size
+    total_pages = max(1, -(-len(items) // page_size))
+    return items[start:start + page_size], {'pagination': {'current-page': page_number, 'total-pages': total_pages, 'total-count': len(items)}}
+
+
+class FakeTerraformCloud():
+    """Serves a SyntheticOrganization over HTTP on a background thread, counting the requests made to it.
+
+    Usage:
+        with FakeTerraformCloud(SyntheticOrganization(workspaces=100)) as server:
+            os.environ['TERRADACTYL_TERRAFORM_CLOUD_URL'] = server.url
+    """
+
+    def __init__(self, organization, host: str = '127.0.0.1', port: int = 0):
+        self.organization = organization
+        self.requests = 0
+        self._requests_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def _count_request(self):
+        with self._requests_lock:
+            self.requests += 1
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                fake._count_request()
+                url = urlsplit(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                parts = [p for p in url.path.split('/') if p]
+                status, body = fake.route(parts, params)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/vnd.api+json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+    def route(self, parts: list, params: dict):
+        """Returns the status and JSON body for a GET request.
+
+        Args
+            parts: the parts of the request path, e.g. ['api', 'v2', 'state-versions'].
+            params: the query string parameters.
+        """
+        if parts[:3] == ['api', 'v2', 'organizations'] and len(parts) >= 5 and parts[4] == 'workspaces':
+            if parts[3] != self.organization.name:
+                return 404, NOT_FOUND
+            if len(parts) == 5:
+                return 200, self._workspaces(params)
+            if len(parts) == 6:
+                return self._workspace(parts[5])
+        elif parts[:3] == ['api', 'v2', 'workspaces'] and len(parts) == 5:
+            workspace = self.organization.workspace(workspace_id=parts[3])
+            if workspace is None:
+                return 404, NOT_FOUND
+            if parts[4] == 'current-state-version':
+                return 200, {'data': self._state_version(self.organization.state_versions(workspace['name'])[-1])}
+            if parts[4] == 'runs':
+                return 200, self._runs(workspace)
+        elif parts == ['api', 'v2', 'state-versions']:
+            return self._state_versions(params)
+        elif len(parts) == 2 and parts[0] == 'state':
+            state = self.organization.state(parts[1])
+            return (200, state) if state else (404, NOT_FOUND)
+        return 404, NOT_FOUND
+
+    def _workspace_json(self, workspace):
+        current_state_version_id = self.organization.state_versions(workspace['name'])[-1]['id']
+        return {
+            'id': workspace['id'],
+            'type': 'workspaces',
+            'attributes': {
+                'name': workspace['name'],
+                'created-at': workspace['created_at'].strftime(synthetic.TF_DATETIME_FORMAT)
+            },
+            'relationships': {
+                'current-state-version': {
+                    'data': {'id': current_state_version_id, 'type': 'state-versions'},
+                    'links': {'related': f'/api/v2/workspaces/{workspace["id"]}/current-state-version'}
+                }
+            }
+        }
+
+    def _workspaces(self, params):
+        page_number = int(params.get('page[number]', 1))
+        page_size = int(params.get('page[size]', WORKSPACES_PAGE_SIZE))
+        workspaces, meta = _pagination(self.organization.workspaces, page_number, page_size)
+        return {'data': [self._workspace_json(w) for w in workspaces], 'meta': meta}
+
+    def _workspace(self, name):
+        workspace = self.organization.workspace(name=name)
+        if workspace is None:
+            return 404, NOT_FOUND
+        return 200, {'data': self._workspace_json(workspace)}
+
+    def _state_version(self, state_version):
+        return {
+            'id': state_version['id'],
+            'type': 'state-versions',
+            'attributes': {
+                'serial': state_version['serial'],
+                'created-at': state_version['created_at'].strftime(synthetic.TF_DATETIME_FORMAT),
+                'hosted-state-download-url': f'{self.url}/state/{state_version["id"]}'
+            }
+        }
+
+    def _state_versions(self, params):
+        if params.get('filter[organization][name]') != self.organization.name:
+            return 404, NOT_FOUND
+        workspace = self.organization.workspace(name=params.get('filter[workspace][name]'))
+        if workspace is None:
+            return 404, NOT_FOUND
+        # Terraform Cloud lists state versions newest first.
+        state_versions = list(reversed(self.organization.state_versions(workspace['name'])))
+        page, meta = _pagination(state_versions, int(params.get('page[number]', 1)), STATE_VERSIONS_PAGE_SIZE)
+        return 200, {'data': [self._state_version(s) for s in page], 'meta': meta}
+
+    def _runs(self, workspace):
+        runs = []
+        for n in range(RUNS_PER_WORKSPACE):
+            planning_at = workspace['created_at'] + datetime.timedelta(days=n)
+            applied_at = planning_at + datetime.timedelta(seconds=60 + 30 * n)
+            runs.append({
+                'id': f'run-{workspace["id"]}-{n}',
+                'attributes': {
+                    'status': 'applied',
+                    'status-timestamps': {
+                        'plan-queued-at': planning_at.isoformat() + '+00:00',
+                        'applied-at': applied_at.isoformat() + '+00:00'
+                    }
+                }
+            })
+        return {'data': runs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a synthetic Organization as a fake Terraform Cloud API.')
+    synthetic.add_arguments(parser)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    server = FakeTerraformCloud(synthetic.from_arguments(args), host=args.host, port=args.port)
+    print(f'Serving Organization {args.organization} at {server.url}, set TERRADACTYL_TERRAFORM_CLOUD_URL to use it.')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
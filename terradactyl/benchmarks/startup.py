@@ -0,0 +1,79 @@
+"""Measure how long Terradactyl's processes take to start from cold.
+
+Each target is run in a fresh interpreter so nothing is shared between runs, the
+results are written as JSON so they can be compared between commits.
+
+Usage:
+    python -m benchmarks.startup --repeat 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    'manage_check': [sys.executable, 'manage.py', 'check'],
+    'celery_worker': [sys.executable, '-c',
+                      'from terradactyl.celery import app; app.loader.import_default_modules()'],
+    'wsgi': [sys.executable, '-c',
+             'import terradactyl.wsgi; from django.urls import get_resolver; get_resolver().url_patterns'],
+}
+
+
+def time_target(command, repeat: int):
+    """Run the command repeat times and time each run.
+
+    Args
+        command: the command to run, as a list of arguments.
+        repeat: the number of times to run the command.
+    Returns
+        A list of the wall clock durations in seconds.
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='terradactyl.settings')
+    durations = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        subprocess.run(command, cwd=PROJECT_DIR, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        durations.append(time.perf_counter() - started_at)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cold start of Terradactyl processes.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--target', action='append', choices=sorted(TARGETS), help='defaults to every target')
+    parser.add_argument('--output', help='file to write the JSON results to, defaults to stdout')
+    args = parser.parse_args()
+
+    results = {
+        'benchmark': 'startup',
+        'python': platform.python_version(),
+        'repeat': args.repeat,
+        'targets': {}
+    }
+    for name in args.target or sorted(TARGETS):
+        durations = time_target(TARGETS[name], args.repeat)
+        results['targets'][name] = {
+            'min': min(durations),
+            'median': statistics.median(durations),
+            'max': max(durations),
+            'runs': durations
+        }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""Measure an end to end sync of a synthetic Organization, and the APIs over the result.
+
+A SyntheticOrganization is served by FakeTerraformCloud and synced stage by stage
+in this process, with the same functions that sync_chunk runs for each Workspace,
+so the timings aren't mixed up with broker latency or worker concurrency. Each
+stage records how many requests it made to Terraform Cloud. The APIs are then
+called through the Django test client, and the results written as JSON so they
+can be compared between commits with benchmarks.compare.
+
+The Gremlin server and Redis configured in settings are used, the database is a
+throwaway test database. The graph has to be empty unless --replace is given, in
+which case everything in it is dropped first.
+
+Usage:
+    python -m benchmarks.sync --workspaces 1000 --repeat 5 --replace --output sync.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from benchmarks import synthetic
+from benchmarks.fake_tfc import FakeTerraformCloud
+
+# Timed before the OrganizationSyncJob.STAGES, as _sync_organization fetches the Workspaces up front.
+FETCH_WORKSPACES = 'fetch_workspaces'
+
+
+def api_targets(organization):
+    """Returns the API requests to time, as a dict of name to (path, query parameters).
+    """
+    workspace_name = organization.workspaces[-1]['name']
+    table = {'draw': 1, 'start': 0, 'length': 25, 'order[0][column]': 0, 'order[0][dir]': 'asc', 'columns[0][name]': 'name'}
+    return {
+        'dt_workspaces': ('/api/v1/dt/workspaces', table),
+        'dt_redundant_dependencies': ('/api/v1/dt/redundant-dependencies', table),
+        'g_workspaces': ('/api/v1/g/workspaces', {}),
+        'g_run_waves': ('/api/v1/g/run-waves', {}),
+        'g_cycles': ('/api/v1/g/cycles', {}),
+        'g_run_plan': ('/api/v1/g/run-plan', {}),
+        'g_workspace': (f'/api/v1/g/workspaces/{workspace_name}', {}),
+        'g_workspace_resources': (f'/api/v1/g/workspaces/{workspace_name}/resources', {'dependencies': 'true'}),
+        'search': ('/api/v1/search', {'q': 'workspace-0'}),
+        'report_terraform_versions': ('/reports/terraform-versions', {}),
+        'report_redundant_dependencies': ('/reports/redundant-dependencies', {}),
+        'report_dependency_cycles': ('/reports/dependency-cycles', {}),
+    }
+
+
+def summarise(durations, **extra):
+    return dict({
+        'min': min(durations),
+        'median': statistics.median(durations),
+        'max': max(durations),
+        'runs': durations
+    }, **extra)
+
+
+def sync(server, organization_name: str):
+    """Sync the Organization served by the FakeTerraformCloud, one stage at a time.
+
+    Returns
+        A dict of stage name to its duration in seconds and the number of requests it made.
+    """
+    from cartographer.gizmo.models import Workspace
+    from cartographer.models import OrganizationSyncJob
+    from cartographer.tasks.terraform_cloud import _sync_resources, _sync_revisions, _sync_workspace
+    from cartographer.utils.cache import bump_dependency_generation
+    from cartographer.utils.terraform_cloud import TerraformCloudClient
+
+    client = TerraformCloudClient('benchmark')
+    results = {}
+
+    def timed(stage, function):
+        requests_before = server.requests
+        started_at = time.perf_counter()
+        value = function()
+        results[stage] = summarise([time.perf_counter() - started_at], requests=server.requests - requests_before)
+        print(f'{stage}: {results[stage]["min"]:.2f}s, {results[stage]["requests"]} requests', file=sys.stderr)
+        return value
+
+    workspaces = timed(FETCH_WORKSPACES, lambda: client.workspaces(organization_name))
+
+    def draw_local_graph():
+        # As sync_chunk does, create every Workspace up front so dependencies never have to wait on each other.
+        for workspace in workspaces:
+            Workspace.vertices.get_or_create(workspace_id=workspace['id'], name=workspace['name'],
+                                             organization=workspace['organization'], created_at=workspace['created_at'])
+        bump_dependency_generation()
+        for workspace in workspaces:
+            _sync_workspace(None, workspace, tfc_client=client)
+
+    stages = {
+        OrganizationSyncJob.DRAWING_LOCAL_GRAPH: draw_local_graph,
+        OrganizationSyncJob.IMPORTING_STATE_HISTORY: lambda: [
+            _sync_revisions(client, w['name'], organization_name, initial_run=True) for w in workspaces],
+        OrganizationSyncJob.IMPORTING_RESOURCES: lambda: [
+            _sync_resources(client, w['name'], organization_name) for w in workspaces],
+    }
+    for stage in OrganizationSyncJob.STAGES:
+        timed(stage, stages[stage])
+    return results
+
+
+def time_apis(organization, repeat: int):
+    """Call each of the APIs repeat times as a logged in user, timing each call.
+
+    Returns
+        A dict of API name to its durations and the status code of the last call.
+    """
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    http = Client()
+    http.force_login(User.objects.create_user('benchmark'))
+
+    results = {}
+    for name, (path, params) in api_targets(organization).items():
+        durations = []
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            response = http.get(path, params)
+            durations.append(time.perf_counter() - started_at)
+        results[name] = summarise(durations, status=response.status_code)
+        print(f'{name}: {results[name]["median"] * 1000:.1f}ms median, status {response.status_code}', file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark syncing a synthetic Organization and the APIs over it.')
+    synthetic.add_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=5, help='times to call each API')
+    parser.add_argument('--replace', action='store_true', help='drop everything in the graph database first')
+    parser.add_argument('--output', help='file to write the JSON results to, defaults to stdout')
+    args = parser.parse_args()
+
+    organization = synthetic.from_arguments(args)
+    with FakeTerraformCloud(organization) as server:
+        # Settings are read once, so point them at the fake before Django is set up.
+        os.environ['TERRADACTYL_TERRAFORM_CLOUD_URL'] = server.url
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'terradactyl.settings')
+        import django
+        django.setup()
+
+        from django.db import connection
+
+        from cartographer.gizmo import Gizmo
+        from cartographer.models import TerraformCloudAPIKey, TerraformCloudOrganization
+        from cartographer.utils.garbage import drop_in_batches
+
+        if args.replace:
+            drop_in_batches(lambda: Gizmo().g.V())
+        elif Gizmo().g.V().limit(1).hasNext():
+            parser.error('the graph database is not empty, run with --replace to drop what is in it first')
+
+        old_database_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0)
+        try:
+            api_key = TerraformCloudAPIKey.objects.create(name='benchmark', value='benchmark')
+            TerraformCloudOrganization.objects.create(name=organization.name, api_key=api_key)
+
+            results = {
+                'benchmark': 'sync',
+                'python': platform.python_version(),
+                'repeat': args.repeat,
+                'parameters': organization.parameters,
+                'targets': {}
+            }
+            results['targets'].update({f'sync_{stage}': result for stage, result in sync(server, organization.name).items()})
+            results['targets'].update({f'api_{name}': result for name, result in time_apis(organization, args.repeat).items()})
+        finally:
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""Generate a synthetic Terraform Cloud Organization to benchmark against.
+
+Workspaces only depend on Workspaces generated before them so the dependency graph
+is acyclic, every other remote state lookup is left unused so there are redundant
+dependencies to report on. Everything is derived from the seed, so the same
+arguments always produce the same Organization, and states are built on demand
+so large Organizations don't need holding in memory.
+
+Usage:
+    python -m benchmarks.synthetic --workspaces 10000 --output-dir states/
+    python manage.py import_states states/
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+
+TF_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+EPOCH = datetime.datetime(2022, 1, 1)
+
+AWS_PROVIDER = 'provider["registry.terraform.io/hashicorp/aws"]'
+TERRAFORM_PROVIDER = 'provider["terraform.io/builtin/terraform"]'
+RESOURCE_TYPES = ['aws_instance', 'aws_s3_bucket', 'aws_iam_role', 'aws_security_group', 'aws_lambda_function']
+TERRAFORM_VERSIONS = ['0.14.11', '1.0.11', '1.1.9', '1.2.0']
+
+# Every COUNTED_RESOURCE_INTERVAL-th Resource uses count, with COUNTED_RESOURCE_INSTANCES instances.
+COUNTED_RESOURCE_INTERVAL = 5
+COUNTED_RESOURCE_INSTANCES = 3
+
+
+class SyntheticOrganization():
+    """A generated Organization of Workspaces, each with revisions states.
+
+    Args
+        name: the name of the Organization.
+        workspaces: the number of Workspaces.
+        fan_out: the number of Workspaces each Workspace depends on, where there are enough before it.
+        resources: the number of Resources in each Workspace's current state, earlier revisions have fewer.
+        revisions: the number of state revisions each Workspace has.
+        seed: the seed for choosing dependencies.
+    """
+
+    def __init__(self, name: str = 'benchmark', workspaces: int = 100, fan_out: int = 2, resources: int = 20,
+                 revisions: int = 3, seed: int = 0):
+        self.name = name
+        self.fan_out = fan_out
+        self.resources = resources
+        self.revisions = revisions
+        self.seed = seed
+
+        rng = random.Random(seed)
+        names = [f'workspace-{i:05d}' for i in range(workspaces)]
+        self.workspaces = []
+        for i, workspace_name in enumerate(names):
+            self.workspaces.append({
+                'id': f'ws-{i:016d}',
+                'name': workspace_name,
+                'created_at': EPOCH + datetime.timedelta(minutes=i),
+                'depends_on': sorted(rng.sample(names[:i], min(fan_out, i)))
+            })
+        self._workspaces_by_name = {w['name']: w for w in self.workspaces}
+        self._workspaces_by_id = {w['id']: w for w in self.workspaces}
+
+    @property
+    def parameters(self):
+        return {
+            'organization': self.name,
+            'workspaces': len(self.workspaces),
+            'fan_out': self.fan_out,
+            'resources': self.resources,
+            'revisions': self.revisions,
+            'seed': self.seed
+        }
+
+    def workspace(self, name: str = None, workspace_id: str = None):
+        """Returns the Workspace with the given name or id, or None if there isn't one.
+        """
+        if workspace_id is not None:
+            return self._workspaces_by_id.get(workspace_id)
+        return self._workspaces_by_name.get(name)
+
+    def state_versions(self, workspace_name: str):
+        """Returns the Workspace's state versions, oldest first, as dicts of id, serial and created_at.
+        """
+        index = int(workspace_name.rsplit('-', 1)[1])
+        return [{
+            'id': f'sv-{index:05d}-{serial:04d}',
+            'serial': serial,
+            'created_at': self._workspaces_by_name[workspace_name]['created_at'] + datetime.timedelta(days=serial)
+        } for serial in range(1, self.revisions + 1)]
+
+    def state(self, state_id: str):
+        """Build the state file for a state version, as Terraform would write it.
+
+        Returns
+            The state as a dict, or None if there is no state version with the id.
+        """
+        try:
+            _, index, serial = state_id.split('-')
+            workspace = self.workspaces[int(index)]
+            serial = int(serial)
+        except (ValueError, IndexError):
+            return None
+        if not 1 <= serial <= self.revisions:
+            return None
+
+        resources = []
+        for dependency in workspace['depends_on']:
+            resources.append({
+                'mode': 'data',
+                'type': 'terraform_remote_state',
+                'name': dependency,
+                'provider': TERRAFORM_PROVIDER,
+                'instances': [{
+                    'schema_version': 0,
+                    'attributes': {'backend': 'remote', 'config': {'value': {'organization': self.name, 'workspaces': {'name': dependency}}}}
+                }]
+            })
+
+        # Workspaces grow over their revisions, Resources kept between revisions keep their ids.
+        resource_count = max(1, self.resources * serial // self.revisions)
+        previous_namespace = None
+        for i in range(resource_count):
+            resource_type = RESOURCE_TYPES[i % len(RESOURCE_TYPES)]
+            dependencies = [previous_namespace] if previous_namespace else []
+            # Only use every other remote state lookup, the rest are redundant.
+            if i < len(workspace['depends_on']) and i % 2 == 0:
+                dependencies.append(f'data.terraform_remote_state.{workspace["depends_on"][i]}')
+
+            if i % COUNTED_RESOURCE_INTERVAL == 0:
+                instances = [{'index_key': k, 'schema_version': 0, 'attributes': {'id': f'{workspace["name"]}-r{i}-{k}'},
+                              'dependencies': dependencies} for k in range(COUNTED_RESOURCE_INSTANCES)]
+            else:
+                instances = [{'schema_version': 0, 'attributes': {'id': f'{workspace["name"]}-r{i}'}, 'dependencies': dependencies}]
+            resources.append({'mode': 'managed', 'type': resource_type, 'name': f'r{i}', 'provider': AWS_PROVIDER, 'instances': instances})
+            previous_namespace = f'{resource_type}.r{i}'
+
+        return {
+            'version': 4,
+            'terraform_version': TERRAFORM_VERSIONS[(int(index) + serial) % len(TERRAFORM_VERSIONS)],
+            'serial': serial,
+            'lineage': workspace['id'],
+            'outputs': {},
+            'resources': resources
+        }
+
+    def write_state_files(self, directory: str):
+        """Write every state version in the layout read by the import_states management command,
+        <directory>/<organization>/<workspace>/<state version id>.json.
+
+        Returns
+            The number of state files written.
+        """
+        written = 0
+        for workspace in self.workspaces:
+            workspace_dir = os.path.join(directory, self.name, workspace['name'])
+            os.makedirs(workspace_dir, exist_ok=True)
+            for state_version in self.state_versions(workspace['name']):
+                path = os.path.join(workspace_dir, f'{state_version["id"]}.json')
+                with open(path, 'w') as state_file:
+                    json.dump(self.state(state_version['id']), state_file)
+                created_at = state_version['created_at'].timestamp()
+                os.utime(path, (created_at, created_at))
+                written += 1
+        return written
+
+
+def add_arguments(parser):
+    """Add the arguments for generating a SyntheticOrganization to an argparse parser.
+    """
+    parser.add_argument('--organization', default='benchmark')
+    parser.add_argument('--workspaces', type=int, default=100)
+    parser.add_argument('--fan-out', type=int, default=2, help='Workspaces each Workspace depends on')
+    parser.add_argument('--resources', type=int, default=20, help='Resources in each current state')
+    parser.add_argument('--revisions', type=int, default=3, help='state revisions per Workspace')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def from_arguments(args):
+    return SyntheticOrganization(name=args.organization, workspaces=args.workspaces, fan_out=args.fan_out,
+                                 resources=args.resources, revisions=args.revisions, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write the state files of a synthetic Organization.')
+    add_arguments(parser)
+    parser.add_argument('--output-dir', required=True, help='directory to write the state files to')
+    args = parser.parse_args()
+
+    written = from_arguments(args).write_state_files(args.output_dir)
+    print(f'Wrote {written} state files to {args.output_dir}.')
+
+
+if __name__ == '__main__':
+    main()
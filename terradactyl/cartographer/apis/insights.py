@@ -1,15 +1,14 @@
+import calendar
 import datetime
 import logging
 
 from django.contrib.auth.decorators import login_required
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
 from django.views.decorators.http import require_http_methods
 from django.http import JsonResponse
 
-
-from gremlin_python.process.traversal import T
-
-from cartographer.gizmo.models import Workspace
-from cartographer.gizmo.models.exceptions import VertexDoesNotExistException
+from cartographer.models import WorkspaceApplyRollup
 
 
 logger = logging.getLogger(__name__)
@@ -18,40 +17,43 @@ logger = logging.getLogger(__name__)
 @login_required
 @require_http_methods(['GET'])
 def daily_change(request):
+    """Returns the number of applies per day and per month, read from the apply rollups kept up to date
+    by revision syncs.
+
+    Query params
+        organization: only count applies for Workspaces in this Organization.
+        since: only count applies on or after this date (YYYY-MM-DD).
+        until: only count applies on or before this date (YYYY-MM-DD).
+    """
     data = {
         'daily_change': {},
         'stats': {}
     }
 
-    workspaces = Workspace.vertices.all()
-    for workspace in workspaces:
-        has_current_revision = True
-        try:
-            workspace.get_current_state_revision()
-        except VertexDoesNotExistException:
-            has_current_revision = False
-
-        state_revisions = workspace.get_state_revisions() if has_current_revision else []
-        for state_revision in state_revisions:
-            created_date = datetime.datetime.fromtimestamp(state_revision.created_at)
-            seconds = int((created_date - datetime.datetime(1970,1,1)).total_seconds())
-            month_year = created_date.strftime('%Y-%m')
-            if seconds not in data['daily_change']:
-                data['daily_change'][seconds] = 1
-            else:
-                data['daily_change'][seconds] += 1
-
-            # if created_date.year == 2021:
-            if month_year not in data['stats']:
-                data['stats'][month_year] = 1
-            else:
-                data['stats'][month_year] += 1
+    rollups = WorkspaceApplyRollup.objects.all()
+    organization_name = request.GET.get('organization')
+    if organization_name:
+        rollups = rollups.filter(organization__name=organization_name)
+    try:
+        if request.GET.get('since'):
+            rollups = rollups.filter(day__gte=datetime.date.fromisoformat(request.GET['since']))
+        if request.GET.get('until'):
+            rollups = rollups.filter(day__lte=datetime.date.fromisoformat(request.GET['until']))
+    except ValueError as error:
+        return JsonResponse({'error': f'Invalid date, expected YYYY-MM-DD. {error}'}, status=400)
+
+    for rollup in rollups.values('day').annotate(applies=Sum('apply_count')).order_by('day'):
+        seconds = calendar.timegm(rollup['day'].timetuple())
+        data['daily_change'][seconds] = rollup['applies']
+
+    for rollup in rollups.annotate(month=TruncMonth('day')).values('month').annotate(applies=Sum('apply_count')).order_by('month'):
+        data['stats'][rollup['month'].strftime('%Y-%m')] = rollup['applies']
 
     total_months = len(data['stats'])
     total_applies = sum(data['stats'].values())
 
-    avg_month = total_applies / total_months
+    avg_month = total_applies / total_months if total_months else 0
     data['stats']['avg_monthly_applies'] = avg_month
 
     response = JsonResponse(data)
-    return response
\ No newline at end of file
+    return response
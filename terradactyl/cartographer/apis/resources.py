@@ -0,0 +1,46 @@
+import json
+import logging
+
+from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_http_methods
+from django.http import JsonResponse
+
+from cartographer.models import ResourceInstanceOwner
+
+
+logger = logging.getLogger(__name__)
+
+# The most instance ids that can be looked up in a single request.
+MAX_OWNER_LOOKUPS = 1000
+
+
+@login_required
+@require_http_methods(['GET', 'POST'])
+def get_resource_owners(request):
+    """Returns the Workspace, state and Resource namespace managing each of the given cloud resource ids,
+    flagging any id managed by more than one Workspace.
+
+    Query params (GET)
+        iids: a comma separated list of instance ids.
+    Body (POST)
+        {"iids": ["i-0123456789", ...]}
+    """
+    if request.method == 'POST':
+        try:
+            iids = json.loads(request.body)['iids']
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'error': 'Expected a JSON body of the form {"iids": [...]}.'}, status=400)
+    else:
+        iids = [iid for iid in request.GET.get('iids', '').split(',') if iid]
+
+    if not isinstance(iids, list) or not all(isinstance(iid, str) for iid in iids):
+        return JsonResponse({'error': 'iids must be a list of strings.'}, status=400)
+    if len(iids) > MAX_OWNER_LOOKUPS:
+        return JsonResponse({'error': f'At most {MAX_OWNER_LOOKUPS} iids can be looked up at once.'}, status=400)
+
+    owners = ResourceInstanceOwner.lookup(iids)
+    return JsonResponse({
+        'owners': owners,
+        'shared': [iid for iid, found in owners.items() if len({(o['organization'], o['workspace']) for o in found}) > 1],
+        'unmanaged': [iid for iid, found in owners.items() if not found]
+    })
@@ -0,0 +1,34 @@
+import logging
+
+from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_http_methods
+from django.http import JsonResponse
+
+from cartographer.utils.search import get_search_index
+
+
+logger = logging.getLogger(__name__)
+
+# The most results a single search can ask for.
+MAX_SEARCH_RESULTS = 100
+
+
+@login_required
+@require_http_methods(['GET'])
+def search(request):
+    """Typeahead search over Workspace names and the namespaces, types and instance ids of the Resources in
+    their current states, answered from the in process search index.
+
+    Query params
+        q: the text to search for.
+        kind: only return matches of this kind, one of workspace, namespace, resource_type or iid.
+        limit: the maximum number of results to return, defaults to 20.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), MAX_SEARCH_RESULTS)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number.'}, status=400)
+
+    results = get_search_index().search(query, kind=request.GET.get('kind') or None, limit=limit) if query else []
+    return JsonResponse({'query': query, 'results': results})
@@ -6,6 +6,7 @@ from django.views import View
 
 from cartographer.models import TerraformCloudAPIKey, TerraformCloudOrganization
 from cartographer.tasks.terraform_cloud import sync_organization
+from cartographer.utils.locks import coalesce
 
 
 logger = logging.getLogger(__name__)
@@ -40,10 +41,13 @@ class TerraformCloudOrganizations(View):
         # Get a list of Workspaces
             # For each workspace, create the node (group 1)
             # task.delay : pull state and update node with info / dependencies (can't complete until group 1 is done)
+        # Requests for an Organization that is already syncing attach to the in flight task.
+        data = {'tasks': {}}
         for org_name in org_names:
-            sync_organization.delay(org_name)
+            result = coalesce(f'sync-organization:{org_name}', sync_organization, org_name)
+            data['tasks'][org_name] = result.id
 
-        return HttpResponse(status=200)
+        return JsonResponse(data)
 
     def put(self, request):
         request_json = json.loads(request.body)
@@ -3,25 +3,33 @@ import math
 import logging
 
 import humanize
-import networkx as nx
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
 from django.http import HttpResponse, JsonResponse
 
 
 from gremlin_python.process.graph_traversal import __, outE, select, valueMap
-from gremlin_python.process.traversal import gte, T, Order, TextP
+from gremlin_python.process.traversal import gte, within, T, Order
 
 from cartographer.gizmo import Gizmo
-from cartographer.gizmo.models import Resource, State, Workspace
-from cartographer.utils.terraform_cloud import TerraformCloudClient
+from cartographer.gizmo.models import State, Workspace
 from cartographer.gizmo.models.exceptions import VertexDoesNotExistException
-from cartographer.tasks.terraform_cloud import sync_workspace
+from cartographer.models import WorkspaceRunDuration
+from cartographer.tasks.terraform_cloud import sync_resources, sync_workspace
+from cartographer.utils.cache import cached_for_generation
+from cartographer.utils.dag import get_dependency_cycles, get_dependency_graph
+from cartographer.utils.garbage import resources_lock_name
+from cartographer.utils.locks import coalesce
+from cartographer.utils.search import KIND_WORKSPACE, get_search_index
 
 
 logger = logging.getLogger(__name__)
 
+# Columns of the redundant dependencies table, in the order they are returned.
+REDUNDANT_DEPENDENCY_COLUMNS = ['source', 'target', 'type', 'organization']
+
 
 def _index_for_name(ws_list, ws_name):
     for pos, ws in enumerate(ws_list):
@@ -49,7 +57,8 @@ def get_table_workspaces_data(request):
 
     base_query = Gizmo().g.V().hasLabel(Workspace.label)
     if search_value:
-        base_query = base_query.has('name', TextP.containing(search_value))
+        matches = get_search_index().search(search_value, kind=KIND_WORKSPACE, limit=None)
+        base_query = base_query.has('name', within(*[m['workspace'] for m in matches]))
 
     # Handle Redundant Dependencies
     if redundant_dependencies:
@@ -81,6 +90,37 @@ def get_table_workspaces_data(request):
     return JsonResponse(response_data)
 
 
+@login_required
+@require_http_methods(['GET'])
+def get_table_redundant_dependencies(request):
+    """Returns every redundant dependency in a format compatible with data tables. The Edges are fetched
+    in a single traversal, cached for the sync generation, then searched, sorted and paged from the cache.
+    """
+    edges = cached_for_generation('redundant-dependencies', Workspace.vertices.redundant_dependency_edges)
+    records_total = len(edges)
+
+    search_value = request.GET.get('search[value]')
+    if search_value:
+        edges = [e for e in edges if search_value in e['source'] or search_value in e['target']]
+
+    order_by_col_index = request.GET.get('order[0][column]', 0)
+    order_column_name = request.GET.get(f'columns[{order_by_col_index}][name]')
+    if order_column_name not in REDUNDANT_DEPENDENCY_COLUMNS:
+        order_column_name = 'source'
+    edges = sorted(edges, key=lambda e: (e[order_column_name] or '', e['source'], e['target']),
+                   reverse=request.GET.get('order[0][dir]') == 'desc')
+
+    start = int(request.GET.get('start', 0))
+    length = int(request.GET.get('length', 25))
+
+    return JsonResponse({
+        'draw': int(request.GET.get('draw', 0)),
+        'recordsTotal': records_total,
+        'recordsFiltered': len(edges),
+        'data': [[e[c] for c in REDUNDANT_DEPENDENCY_COLUMNS] for e in edges[start:start + length]]
+    })
+
+
 @login_required
 @require_http_methods(['GET'])
 def get_graph_workspaces_data(request):
@@ -101,27 +141,19 @@ def get_graph_workspaces_data(request):
 
     workspaces = Workspace.vertices.all()
     for ws in workspaces:
-        try:
-            current_state = ws.get_current_state_revision()
-            current_state_serial = current_state.serial
-            current_state_terraform_version = current_state.terraform_version
-            current_state_resource_count = current_state.resource_count
-        except VertexDoesNotExistException:
-            current_state_serial = 0
-            current_state_terraform_version = 'N/A'
-            current_state_resource_count = 0
-
-        heatmap_p = math.log(current_state_serial if current_state_serial > 0 else 1) / upper_serial_log
+        summary = ws.get_summary()
+
+        heatmap_p = math.log(summary['serial'] if summary['serial'] > 0 else 1) / upper_serial_log
         data['nodes'].append({
             '_id': ws._id,
             'name': ws.name,
             'group': 1,
             'class': 'state',
-            'terraform_version': current_state_terraform_version,
-            'serial': current_state_serial,
+            'terraform_version': summary['terraform_version'],
+            'serial': summary['serial'],
             'heatmap_p': heatmap_p,
-            'dependency_count': ws.get_dependency_count(),
-            'resource_count': current_state_resource_count,
+            'dependency_count': summary['dependency_count'],
+            'resource_count': summary['resource_count'],
             'organization': ws.organization,
             'created_at': humanize_created_at(ws.created_at),
             'last_updated': ws.last_updated
@@ -153,82 +185,58 @@ def get_graph_workspaces_data(request):
 @login_required
 @require_http_methods(['GET'])
 def get_workspace_resources(request, workspace_name):
+    """Returns the Resources in the Workspace's current state, and optionally those of the Workspaces it
+    depends on, along with the dependencies between the Resources of each state. Every state is read in
+    a single traversal. With refresh the Workspace's Resources are synced in the background, the response
+    holds the Resources as they are now along with the id of the task doing the sync.
+    """
     is_refresh_str = request.GET.get('refresh')
     is_refresh = True if is_refresh_str == 'true' else False
 
     include_deps_str = request.GET.get('dependencies')
     include_deps = True if include_deps_str == 'true' else False
 
-    if is_refresh:
-        tfc_client = TerraformCloudClient()
-
-        workspace = Workspace.vertices.get(name=workspace_name)
-        resources = tfc_client.resources(workspace.organization, workspace.name)
-
-        # First pass, create resources.
-        for r_namespace, resource in resources.items():
-            r = Resource.vertices.update_or_create(
-                name=resource['name'],
-                state_id=workspace.workspace_id,
-                namespace=r_namespace,
-                resource_type=resource['resource_type']
-            )
-            workspace.contains(r)
-
-        # Second pass, create dependencies.
-        for r_namespace, resource in resources.items():
-            for dependency in [dep for dep in resource['depends_on'] if 'terraform_remote_state' not in dep]:
-                r = Resource.vertices.get(namespace=resource['r_namespace'], state_id=workspace.workspace_id)
-
-                dependency_r = Resource.vertices.get(namespace=dependency, state_id=workspace.workspace_id)
-                r.depends_on(dependency_r)
+    ws = Workspace.vertices.get(name=workspace_name)
 
     data = {
         'nodes': [],
         'links': []
     }
+    if is_refresh:
+        result = coalesce(resources_lock_name(ws.organization, ws.name), sync_resources,
+                          workspace_name=ws.name, organization_name=ws.organization)
+        data['task'] = result.id
 
-    # Fetch the main state resources
-    ws = Workspace.vertices.get(name=workspace_name)
-    resources = ws.get_resources()
-    for r in resources:
-        data['nodes'].append({
-            '_id': r._id,
-            'name': r.name,
-            'namespace': r.namespace,
-            'resource_type': r.resource_type,
-            'state_id': r.state_id,
-            'class': 'resource',
-            'last_updated': r.last_updated
-        })
-
+    names = [ws.name]
     if include_deps:
-        # Fetch dependency state resources
-        dependencies = ws.get_dependencies()
-        for dep_name in dependencies:
-            dep_ws = Workspace.vertices.get(name=dep_name, organization=ws.organization)
-            dep_resources = dep_ws.get_resources()
-            for dr in dep_resources:
-                data['nodes'].append({
-                        '_id': dr._id,
-                        'name': dr.name,
-                        'namespace': dr.namespace,
-                        'resource_type': dr.resource_type,
-                        'state_id': dr.state_id,
-                        'class': 'resource',
-                        'last_updated': dr.last_updated
-                    })
+        names.extend(ws.get_dependencies())
 
-    for i, node in enumerate(data['nodes']):
-        for name in Resource.vertices.get(name=node['name']).get_dependencies():
-            # Handle local dependencies
-            data['links'].append({
-                'source': i,
-                'target': _index_for_name(data['nodes'], name),
-                'value': 1,
-                'type': 'depends_on'
+    resource_graphs = Workspace.vertices.resource_graphs(names, organization=ws.organization)
+    for graph in sorted(resource_graphs, key=lambda g: names.index(g['workspace'])):
+        positions = {}
+        for r in graph['resources']:
+            positions[r.namespace] = len(data['nodes'])
+            data['nodes'].append({
+                '_id': r._id,
+                'name': r.name,
+                'namespace': r.namespace,
+                'resource_type': r.resource_type,
+                'state_id': r.state_id,
+                'class': 'resource',
+                'last_updated': r.last_updated
             })
 
+        # Handle local dependencies
+        for namespace, dependencies in graph['dependencies'].items():
+            for dependency in dependencies:
+                if namespace in positions and dependency in positions:
+                    data['links'].append({
+                        'source': positions[namespace],
+                        'target': positions[dependency],
+                        'value': 1,
+                        'type': 'depends_on'
+                    })
+
     response = JsonResponse(data)
 
     return response
@@ -328,11 +336,7 @@ def get_workspace_run_order(request, workspace_name):
                         'required_by': workspace
                     })
 
-    workspace_dependencies = {ws: workspaces_data[ws]['depends_on'] for ws in workspaces_data}
-    G = nx.DiGraph(workspace_dependencies)
-    H = nx.path_graph(workspace_dependencies)
-    G.add_nodes_from(H)
-    run_order = list(reversed(list(nx.topological_sort(G))))
+    run_order = get_dependency_graph().run_order(workspaces_data.keys())
 
     # Fromate the data block that d3 will use, create nodes and links.
     for i, workspace in enumerate(run_order):
@@ -403,13 +407,13 @@ def get_workspace(request, workspace_name):
     ws = Workspace.vertices.get(name=workspace_name)
     # TODO : This url should be {org}/{workspace}
     if is_sync:
-        sync_workspace.delay({
+        result = coalesce(f'sync-workspace:{ws.organization}:{ws.name}', sync_workspace, {
             'name': ws.name,
             'organization': ws.organization,
             'id': ws.workspace_id,
             'created_at': ws.created_at
         })
-        response = HttpResponse()
+        response = JsonResponse({'task': result.id})
     else:
         chain = ws.get_chain()
         added_edge_ids = []   # Keep track of added edge IDs to prevent duplication.
@@ -419,36 +423,8 @@ def get_workspace(request, workspace_name):
                 if part[T.label] == 'depends_on':
                     edge_indices[i] = {'id': part[T.id], 'redundant': part['redundant']}
             for i, edge_info in edge_indices.items():
-                source_ws = Workspace.vertices.get(name=path[i-1]['name'][0], organization=path[i-1]['organization'][0])
-                source_state = source_ws.get_current_state_revision()
-                source_index = _insert_dict(data['nodes'], {
-                    '_id': path[i-1][T.id],
-                    'name': path[i-1]['name'][0],
-                    'terraform_version': source_state.terraform_version,
-                    'organization': source_ws.organization,
-                    'serial': source_state.serial,
-                    'dependency_count': Workspace.vertices.get(name=path[i-1]['name'][0]).get_dependency_count(),
-                    'resource_count': source_state.resource_count,
-                    'created_at': humanize_created_at(path[i-1]['created_at'][0]),
-                    'group': 1,
-                    'class': 'state'
-                })
-                
-                taget_ws = Workspace.vertices.get(name=path[i-1]['name'][0], organization=path[i-1]['organization'][0])
-                target_state = taget_ws.get_current_state_revision()
-
-                target_index = _insert_dict(data['nodes'], {
-                    '_id': path[i+1][T.id],
-                    'name': path[i+1]['name'][0],
-                    'terraform_version': target_state.terraform_version,
-                    'organization': taget_ws.organization,
-                    'serial': target_state.serial,
-                    'dependency_count': Workspace.vertices.get(name=path[i+1]['name'][0]).get_dependency_count(),
-                    'resource_count': target_state.resource_count,
-                    'created_at': humanize_created_at(path[i+1]['created_at'][0]),
-                    'group': 1,
-                    'class': 'state'
-                })
+                source_index = _insert_dict(data['nodes'], _workspace_node(path[i-1]))
+                target_index = _insert_dict(data['nodes'], _workspace_node(path[i+1]))
                 if edge_info['id'] not in added_edge_ids:
                     data['links'].append({
                         'source': source_index,
@@ -463,6 +439,101 @@ def get_workspace(request, workspace_name):
     return response
 
 
+@login_required
+@require_http_methods(['GET'])
+def get_run_waves(request):
+    """Returns every Workspace grouped into waves that can be applied in parallel, each wave only depending
+    on earlier ones. Used to plan rebuilding a whole Organization, e.g. for disaster recovery.
+
+    Query params
+        organization: only include Workspaces in this Organization.
+    """
+    waves = get_dependency_graph().waves(organization=request.GET.get('organization'))
+    return JsonResponse({
+        'waves': [{'wave': i, 'workspaces': workspaces} for i, workspaces in enumerate(waves['waves'])],
+        'cycles': waves['cycles'],
+        'workspace_count': sum(len(workspaces) for workspaces in waves['waves'])
+    })
+
+
+@login_required
+@require_http_methods(['GET'])
+def get_cycles(request):
+    """Returns every dependency cycle across all Workspaces, with the Edges that make up each cycle.
+    """
+    cycles = get_dependency_cycles()
+    return JsonResponse({'cycle_count': len(cycles), 'cycles': cycles})
+
+
+@login_required
+@require_http_methods(['GET'])
+def get_run_plan(request):
+    """Returns how long rebuilding a set of Workspaces would take, weighted by how long each usually takes
+    to apply, along with the critical path and the earliest each Workspace could start.
+
+    Query params
+        workspace: plan only this Workspace and everything it depends on.
+        organization: plan only Workspaces in this Organization.
+    """
+    dependency_graph = get_dependency_graph()
+    target = request.GET.get('workspace')
+    if target and target not in dependency_graph:
+        return JsonResponse({'error': f'Workspace {target} does not exist.'}, status=404)
+
+    durations = {}
+    for run_duration in WorkspaceRunDuration.objects.select_related('organization'):
+        # Workspaces are identified by name in the graph, ignore durations for another Organization's namesake.
+        if dependency_graph.organizations.get(run_duration.workspace_name) == run_duration.organization.name:
+            durations[run_duration.workspace_name] = run_duration.apply_duration
+
+    plan = dependency_graph.plan(durations, settings.DEFAULT_APPLY_DURATION, target=target, organization=request.GET.get('organization'))
+    plan['estimated'] = sorted(e['name'] for e in plan['schedule'] if e['name'] not in durations)
+    return JsonResponse(plan)
+
+
+@login_required
+@require_http_methods(['GET'])
+def get_workspace_impact(request, workspace_name):
+    """Returns every Workspace that transitively depends on the given Workspace (its upstreams, which may
+    break if it changes) and every Workspace it transitively depends on (its downstreams), with the
+    minimum number of depends_on hops to each.
+    """
+    dependency_graph = get_dependency_graph()
+    if workspace_name not in dependency_graph:
+        return JsonResponse({'error': f'Workspace {workspace_name} does not exist.'}, status=404)
+
+    impact = dependency_graph.impact(workspace_name)
+    return JsonResponse({
+        'name': workspace_name,
+        'upstream_count': len(impact['upstreams']),
+        'downstream_count': len(impact['downstreams']),
+        'upstreams': impact['upstreams'],
+        'downstreams': impact['downstreams'],
+        'cycle': impact['cycle']
+    })
+
+
+def _workspace_node(value_map):
+    """Build a graph node for a Workspace from the valueMap returned in a chain path.
+    """
+    summary = Workspace.summary_from_map(value_map)
+    if summary is None:
+        summary = Workspace.vertices.get(name=value_map['name'][0], organization=value_map['organization'][0]).get_summary()
+
+    return {
+        '_id': value_map[T.id],
+        'name': value_map['name'][0],
+        'terraform_version': summary['terraform_version'],
+        'organization': value_map['organization'][0],
+        'serial': summary['serial'],
+        'dependency_count': summary['dependency_count'],
+        'resource_count': summary['resource_count'],
+        'created_at': humanize_created_at(value_map['created_at'][0]),
+        'group': 1,
+        'class': 'state'
+    }
+
+
 def _insert_dict(l, d):
     for i, ld in enumerate(l):
         if ld['name'] == d['name']:
@@ -1,19 +1,57 @@
+import logging
+import threading
+
+from gremlin_python.driver.client import Client
 from gremlin_python.driver.driver_remote_connection import DriverRemoteConnection
 from gremlin_python.structure.graph import Graph
 
+logger = logging.getLogger(__name__)
+
+# Vertex properties that are looked up directly rather than traversed to.
+INDEXED_PROPERTIES = ['name', 'workspace_id', 'state_id', 'owner_workspace_id']
+
 class Gizmo:
+    """Singleton holding the traversal source for the graph database. The websocket is only
+    opened the first time the traversal source is used, so importing or constructing Gizmo
+    (e.g. during manage.py commands or worker start up) does not need the graph database.
+    """
     _instance = None
     _graph = None
-    g = None
+    _g = None
+    _connect_lock = threading.Lock()
 
     def __new__(cls, host: str="localhost", port: int=8182):
         if cls._instance is None:
-            cls._graph = Graph()
-            cls.g = cls._graph.traversal().withRemote(DriverRemoteConnection(f'ws://{host}:{port}/gremlin', 'g'))
+            cls._url = f'ws://{host}:{port}/gremlin'
             cls._instance = super(Gizmo, cls).__new__(cls)
 
         return cls._instance
 
+    @property
+    def g(self):
+        cls = type(self)
+        if cls._g is None:
+            with cls._connect_lock:
+                if cls._g is None:
+                    cls._graph = Graph()
+                    cls._g = cls._graph.traversal().withRemote(DriverRemoteConnection(cls._url, 'g'))
+                    cls._create_indexes()
+        return cls._g
+
+    @classmethod
+    def _create_indexes(cls):
+        """Create the vertex property indexes, if the graph supports them. Indexes can't be created through
+        a traversal so this submits a script, which TinkerGraph ignores for keys that are already indexed.
+        """
+        client = Client(cls._url, 'g')
+        try:
+            for prop in INDEXED_PROPERTIES:
+                client.submit(f"graph.createIndex('{prop}', Vertex.class)").all().result()
+        except Exception as error:
+            logger.warning(f'Unable to create graph indexes, lookups will scan all vertices. Error: {error}.')
+        finally:
+            client.close()
+
     def count_edges(self, label, **kwargs):
         """
             Args
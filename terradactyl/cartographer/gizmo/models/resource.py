@@ -1,8 +1,9 @@
 import datetime
+import json
 
 from gremlin_python.process.anonymous_traversal import traversal
 from gremlin_python.process.graph_traversal import __, both, bothE, out, path
-from gremlin_python.process.traversal import T
+from gremlin_python.process.traversal import T, Cardinality, within
 
 from cartographer.gizmo import Gizmo
 from cartographer.gizmo.models import Vertex
@@ -10,6 +11,36 @@ from cartographer.gizmo.models.resource_instance import ResourceInstance
 from cartographer.gizmo.models.exceptions import VertexDoesNotExistException, MultipleVerticesFoundException
 
 LABEL = 'resource'
+
+# Number of Resources written per traversal when syncing a state's Resources in bulk.
+RESOURCE_BATCH_SIZE = 100
+
+
+def _state(source, state_id: str):
+    """Traverse from the source (the graph traversal source or an anonymous traversal) to the State Vertex with
+    the given id.
+    """
+    # Imported here as the State model imports this one.
+    from cartographer.gizmo.models.state import State
+    return source.V().hasLabel(State.label).has('state_id', state_id)
+
+
+def _add_instances(query, state_id: str, resource: dict, resource_label: str, last_updated: str):
+    """Chain the creation of a ResourceInstance Vertex, and its instance_of Edge to the labelled Resource, for
+    each of the Resource's instances onto the query.
+    """
+    for instance in resource['instances']:
+        query = query.sideEffect(
+            __.addV(ResourceInstance.label)
+            .property('index_key', instance['index_key'])
+            .property('iid', instance['iid'])
+            .property('state_id', state_id)
+            .property('resource_type', resource['resource_type'])
+            .property('provider', resource['provider'])
+            .property('last_updated', last_updated)
+            .addE('instance_of').to(resource_label))
+    return query
+
 class Resource(Vertex):
     """Represents a Terraform Resource in the graph database.
     """
@@ -83,6 +114,144 @@ class Resource(Vertex):
                 )
             return r
 
+        @classmethod
+        def snapshot(cls, state_id: str):
+            """Fetch every Resource in a state with its instances, in a single traversal. Instances are read from
+            ResourceInstance Vertices or, for Resources synced with COMPACT_RESOURCE_INSTANCES, the packed property.
+
+            Args
+                state_id: the id of the state.
+            Returns
+                A dict of namespace to a dict of the Resource's resource_type, name, mode, provider (None when it has
+                no instances to read it from) and its instances as [index_key, iid] pairs.
+            """
+            results = Gizmo().g.V().hasLabel(Resource.label).has('state_id', state_id) \
+                .project('namespace', 'resource_type', 'name', 'mode', 'provider', 'instances', 'packed_instances') \
+                .by('namespace') \
+                .by('resource_type') \
+                .by('name') \
+                .by('mode') \
+                .by(__.coalesce(__.values('provider'), __.in_('instance_of').values('provider')).limit(1).fold()) \
+                .by(__.in_('instance_of').project('index_key', 'iid').by('index_key').by('iid').fold()) \
+                .by(__.values('instances').fold()).toList()
+
+            snapshot = {}
+            for r in results:
+                instances = [[i['index_key'], i['iid']] for i in r['instances']]
+                for packed in r['packed_instances']:
+                    instances.extend(json.loads(packed))
+                snapshot[r['namespace']] = {
+                    'resource_type': r['resource_type'],
+                    'name': r['name'],
+                    'mode': r['mode'],
+                    'provider': r['provider'][0] if r['provider'] else None,
+                    'instances': instances
+                }
+            return snapshot
+
+        @classmethod
+        def bulk_create(cls, state_id: str, resources: dict, compact: bool = False):
+            """Create Resources, their contains Edge from the state and their instances, chaining up to
+            RESOURCE_BATCH_SIZE Resources into each traversal.
+
+            Args
+                state_id: the id of the state the Resources belong to.
+                resources: namespace to resource info as returned by TerraformCloudClient.resources(), with the
+                           provider name cleaned up.
+                compact: pack the instances onto the Resource Vertex instead of creating ResourceInstance Vertices.
+            """
+            last_updated = str(datetime.datetime.utcnow().timestamp())
+            namespaces = list(resources)
+            for start in range(0, len(namespaces), RESOURCE_BATCH_SIZE):
+                query = _state(Gizmo().g, state_id).as_('s')
+                for n, namespace in enumerate(namespaces[start:start + RESOURCE_BATCH_SIZE]):
+                    resource = resources[namespace]
+                    label = f'r{n}'
+                    query = query.addV(Resource.label) \
+                        .property('state_id', state_id) \
+                        .property('name', resource['name']) \
+                        .property('resource_type', resource['resource_type']) \
+                        .property('namespace', namespace) \
+                        .property('mode', resource['mode']) \
+                        .property('last_updated', last_updated)
+                    if compact:
+                        query = query \
+                            .property('provider', resource['provider']) \
+                            .property('instance_count', len(resource['instances'])) \
+                            .property('instances', json.dumps([[i['index_key'], i['iid']] for i in resource['instances']]))
+                    query = query.as_(label).addE('contains').from_('s')
+                    if not compact:
+                        query = _add_instances(query, state_id, resource, label, last_updated)
+                query.iterate()
+
+        @classmethod
+        def carry_forward(cls, from_state_id: str, to_state_id: str, namespaces):
+            """Move unchanged Resources (and their instances) from the previous state to the new one instead of
+            creating them again, RESOURCE_BATCH_SIZE Resources per traversal.
+
+            Args
+                from_state_id: the id of the state the Resources currently belong to.
+                to_state_id: the id of the state to move them to.
+                namespaces: the namespaces of the Resources to move.
+            """
+            namespaces = list(namespaces)
+            for start in range(0, len(namespaces), RESOURCE_BATCH_SIZE):
+                Gizmo().g.V().hasLabel(Resource.label).has('state_id', from_state_id) \
+                    .has('namespace', within(*namespaces[start:start + RESOURCE_BATCH_SIZE])) \
+                    .sideEffect(__.inE('contains').drop()) \
+                    .sideEffect(__.in_('instance_of').property(Cardinality.single, 'state_id', to_state_id)) \
+                    .property(Cardinality.single, 'state_id', to_state_id) \
+                    .addE('contains').from_(_state(__, to_state_id)).iterate()
+
+        @classmethod
+        def move(cls, state_id: str, moves: dict, resources: dict):
+            """Rename Resources that have moved to a new namespace, one traversal per move as moves are rare.
+
+            Args
+                state_id: the id of the state the Resources belong to.
+                moves: a dict of the previous namespace to the new one.
+                resources: the new namespace to resource info, for the Resources' new names.
+            """
+            for previous, namespace in moves.items():
+                Gizmo().g.V().hasLabel(Resource.label).has('state_id', state_id).has('namespace', previous) \
+                    .property(Cardinality.single, 'namespace', namespace) \
+                    .property(Cardinality.single, 'name', resources[namespace]['name']).iterate()
+
+        @classmethod
+        def replace_instances(cls, state_id: str, resources: dict, compact: bool = False):
+            """Replace the instances of Resources whose instances or attributes have changed, one traversal per Resource.
+
+            Args
+                state_id: the id of the state the Resources belong to.
+                resources: namespace to resource info for the changed Resources.
+                compact: pack the instances onto the Resource Vertex instead of using ResourceInstance Vertices.
+            """
+            last_updated = str(datetime.datetime.utcnow().timestamp())
+            for namespace, resource in resources.items():
+                query = Gizmo().g.V().hasLabel(Resource.label).has('state_id', state_id).has('namespace', namespace) \
+                    .sideEffect(__.in_('instance_of').drop()) \
+                    .property(Cardinality.single, 'name', resource['name']) \
+                    .property(Cardinality.single, 'mode', resource['mode'])
+                if compact:
+                    query = query \
+                        .property(Cardinality.single, 'provider', resource['provider']) \
+                        .property(Cardinality.single, 'instance_count', len(resource['instances'])) \
+                        .property(Cardinality.single, 'instances', json.dumps([[i['index_key'], i['iid']] for i in resource['instances']]))
+                else:
+                    query = _add_instances(query.as_('r'), state_id, resource, 'r', last_updated)
+                query.iterate()
+
+        @classmethod
+        def bulk_drop(cls, state_id: str, namespaces):
+            """Drop Resources, and their instances, from a state, RESOURCE_BATCH_SIZE Resources per traversal.
+            """
+            namespaces = list(namespaces)
+            for start in range(0, len(namespaces), RESOURCE_BATCH_SIZE):
+                Gizmo().g.V().hasLabel(Resource.label).has('state_id', state_id) \
+                    .has('namespace', within(*namespaces[start:start + RESOURCE_BATCH_SIZE])) \
+                    .sideEffect(__.in_('instance_of').drop()) \
+                    .drop().iterate()
+
     @property
     def v(self):
         return Gizmo().g.V().has('state_id', self.state_id).has('namespace', self.namespace).has('resource_type', self.resource_type).next()
@@ -116,6 +285,19 @@ class Resource(Vertex):
         """
         return [v['name'][0] for v in Gizmo().g.V(self.v).outE('r_depends_on').inV().valueMap('name')]
 
+    def set_instances(self, provider: str, instances):
+        """Store the Resource's instances packed onto the Resource Vertex, used in place of a ResourceInstance
+        Vertex per instance when COMPACT_RESOURCE_INSTANCES is on.
+
+        Args
+            provider: the provider of the Resource, e.g. registry.terraform.io/hashicorp/aws.
+            instances: [index_key, iid] pairs for each instance of the Resource.
+        """
+        Gizmo().g.V(self.v) \
+            .property(Cardinality.single, 'provider', provider) \
+            .property(Cardinality.single, 'instance_count', len(instances)) \
+            .property(Cardinality.single, 'instances', json.dumps(instances)).next()
+
     def get_instances(self):
         """Feth a list of ResourceInstance that this Resource is implemented by.
         """
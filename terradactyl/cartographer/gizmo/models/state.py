@@ -1,8 +1,9 @@
 import datetime
+import json
 
 from gremlin_python.process.anonymous_traversal import traversal
 from gremlin_python.process.graph_traversal import __, both, bothE, out, path
-from gremlin_python.process.traversal import T
+from gremlin_python.process.traversal import T, Cardinality
 
 from cartographer.gizmo import Gizmo
 from cartographer.gizmo.models import Vertex
@@ -11,6 +12,10 @@ from cartographer.gizmo.models.exceptions import VertexDoesNotExistException, Mu
 
 LABEL = 'state'
 
+# The properties read into a State. Every elementMap() of States should name them, so the resource_dependencies
+# adjacency list, which can be large, is only fetched when it is wanted.
+PROPERTIES = ['state_id', 'serial', 'resource_count', 'terraform_version', 'created_at', 'ordinal', 'owner_workspace_id']
+
 class State(Vertex):
     """Represents a State, including State Revisions in the graph database.
     """
@@ -20,30 +25,45 @@ class State(Vertex):
         label = LABEL
 
         @classmethod
-        def create(cls, state_id: str, resource_count: int, serial: int, created_at: str, terraform_version: str):
+        def create(cls, state_id: str, resource_count: int, serial: int, created_at: str, terraform_version: str,
+                   owner_workspace_id: str = None, ordinal: int = None):
             """Create a new State Vertex
             created_at : the timestamp from Terraform Cloud for when the State was created. *Not* when it was created in Terradactyl.
+            owner_workspace_id : the workspace_id of the Workspace the State is a revision of.
+            ordinal : the position of the State in the Workspace's history, 0 being the first revision.
             """
             last_updated = str(datetime.datetime.utcnow().timestamp())
-            v = Gizmo().g.addV(State.label) \
+            query = Gizmo().g.addV(State.label) \
                 .property('state_id', state_id) \
                 .property('resource_count', resource_count) \
                 .property('serial', serial) \
                 .property('terraform_version', terraform_version) \
-                .property('created_at', created_at).next()
+                .property('created_at', created_at)
+            if owner_workspace_id is not None:
+                query = query.property('owner_workspace_id', owner_workspace_id)
+            if ordinal is not None:
+                query = query.property('ordinal', ordinal)
+            v = query.next()
             return State(
                 _id=v.id,
                 state_id=state_id,
                 resource_count=resource_count,
                 serial=serial,
                 terraform_version=terraform_version,
-                created_at=created_at)
+                created_at=created_at,
+                owner_workspace_id=owner_workspace_id,
+                ordinal=ordinal)
 
         @classmethod
-        def update_or_create(cls, state_id: str, resource_count: int, serial: int, terraform_version: str, created_at: str):
+        def update_or_create(cls, state_id: str, resource_count: int, serial: int, terraform_version: str, created_at: str,
+                             owner_workspace_id: str = None, ordinal: int = None):
             try:
                 s = State.vertices.get(state_id=state_id)
                 s.resource_count = resource_count
+                if owner_workspace_id is not None:
+                    s.owner_workspace_id = owner_workspace_id
+                if ordinal is not None:
+                    s.ordinal = ordinal
                 s.save()
             except VertexDoesNotExistException:
                 s = State.vertices.create(
@@ -51,10 +71,49 @@ class State(Vertex):
                     resource_count=resource_count,
                     serial=serial,
                     terraform_version=terraform_version,
-                    created_at=created_at
+                    created_at=created_at,
+                    owner_workspace_id=owner_workspace_id,
+                    ordinal=ordinal
                 )
             return s
 
+        @classmethod
+        def revision_columns(cls):
+            """Fetch the created_at, owner_workspace_id and resource_count of every State that has been indexed
+            as a revision of a Workspace, in one traversal.
+
+            Returns
+                A dict of lists keyed by property, where the same position in each list is the same State.
+            """
+            results = Gizmo().g.V().hasLabel(State.label).has('owner_workspace_id') \
+                .project('created_at', 'owner_workspace_id', 'resource_count') \
+                .by('created_at').by('owner_workspace_id').by('resource_count').toList()
+            return {prop: [r[prop] for r in results] for prop in ['created_at', 'owner_workspace_id', 'resource_count']}
+
+        @classmethod
+        def revision_summaries(cls):
+            """Fetch every State that has been indexed as a revision of a Workspace along with whether any
+            Resources belong to it, in one traversal. Used by garbage collection to plan what to drop.
+
+            Returns
+                A list of dicts containing the state_id, owner_workspace_id, ordinal (-1 if not set), created_at
+                and has_resources (the number of Resources, capped at 1) of each State.
+            """
+            return Gizmo().g.V().hasLabel(State.label).has('owner_workspace_id') \
+                .project('state_id', 'owner_workspace_id', 'ordinal', 'created_at', 'has_resources') \
+                .by('state_id') \
+                .by('owner_workspace_id') \
+                .by(__.coalesce(__.values('ordinal'), __.constant(-1))) \
+                .by('created_at') \
+                .by(__.out('contains').limit(1).count()).toList()
+
+        @classmethod
+        def drop_resource_dependencies(cls, state_id: str):
+            """Drop the adjacency list stored on a State, e.g. once its Resources have been carried forward to the
+            next State and it no longer holds the Resources it describes.
+            """
+            Gizmo().g.V().hasLabel(State.label).has('state_id', state_id).properties('resource_dependencies').drop().iterate()
+
         @classmethod
         def get(cls, **kwargs):
             """Fetch a vertex where the given kwargs are has() filters that are dynamically concatenated to build
@@ -70,24 +129,35 @@ class State(Vertex):
             if not State.vertices.exists(**kwargs):
                 raise VertexDoesNotExistException
             else:
-                element_map = base_query.elementMap().next()
+                element_map = base_query.elementMap(*PROPERTIES).next()
                 # TODO : Returned more than one error
-                return State(
-                    _id=element_map[T.id],
-                    state_id=element_map['state_id'],
-                    created_at=element_map['created_at'],
-                    terraform_version=element_map['terraform_version'],
-                    serial=element_map['serial'],
-                    resource_count=element_map['resource_count']
-                )
+                return State.from_element_map(element_map)
 
-    def __init__(self, _id: int, state_id: str, created_at: str, serial: int, resource_count: int, terraform_version: str):
+    def __init__(self, _id: int, state_id: str, created_at: str, serial: int, resource_count: int, terraform_version: str,
+                 owner_workspace_id: str = None, ordinal: int = None):
         self._id = _id
         self.state_id = state_id
         self.created_at = created_at
         self.terraform_version = terraform_version
         self.serial = serial
         self.resource_count = resource_count
+        self.owner_workspace_id = owner_workspace_id
+        self.ordinal = ordinal
+
+    @staticmethod
+    def from_element_map(element_map):
+        """Create a State from the elementMap() of a State Vertex.
+        """
+        return State(
+            _id=element_map[T.id],
+            state_id=element_map['state_id'],
+            created_at=element_map['created_at'],
+            terraform_version=element_map['terraform_version'],
+            serial=element_map['serial'],
+            resource_count=element_map['resource_count'],
+            owner_workspace_id=element_map.get('owner_workspace_id'),
+            ordinal=element_map.get('ordinal')
+        )
 
     @property
     def v(self):
@@ -118,10 +188,24 @@ class State(Vertex):
             __.addE('contains').from_('v')
         ).next()
 
+    def set_resource_dependencies(self, adjacency: dict):
+        """Store the dependencies between the Resources in this State as a single adjacency list property on the
+        State Vertex, rather than an Edge per dependency.
+
+        Args
+            adjacency: a dict of Resource namespace to the namespaces it depends on.
+        """
+        Gizmo().g.V(self.v).property(Cardinality.single, 'resource_dependencies', json.dumps(adjacency, sort_keys=True)).next()
+
     def save(self):
         self.last_updated = str(datetime.datetime.utcnow().timestamp())
-        Gizmo().g.V(self.v).has('state_id', self.state_id) \
+        query = Gizmo().g.V(self.v).has('state_id', self.state_id) \
             .property('terraform_version', self.terraform_version) \
             .property('serial', self.serial) \
             .property('resource_count', self.resource_count) \
-            .property('last_updated', self.last_updated).next()
+            .property('last_updated', self.last_updated)
+        if self.owner_workspace_id is not None:
+            query = query.property(Cardinality.single, 'owner_workspace_id', self.owner_workspace_id)
+        if self.ordinal is not None:
+            query = query.property(Cardinality.single, 'ordinal', self.ordinal)
+        query.next()
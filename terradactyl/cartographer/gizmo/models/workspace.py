@@ -1,13 +1,14 @@
 from cgitb import lookup
 import datetime
+import json
 import logging
 
-from gremlin_python.process.traversal import T, Cardinality
+from gremlin_python.process.traversal import T, Cardinality, Order, gte, lte, within
 from gremlin_python.process.graph_traversal import __, outE, otherV
 
 from cartographer.gizmo import Gizmo
 from cartographer.gizmo.models import Vertex
-from cartographer.gizmo.models.state import State
+from cartographer.gizmo.models.state import PROPERTIES as STATE_PROPERTIES, State
 from cartographer.gizmo.models.resource import Resource
 from cartographer.gizmo.models.exceptions import VertexDoesNotExistException
 
@@ -16,6 +17,20 @@ logger = logging.getLogger(__name__)
 
 LABEL = 'workspace'
 
+# Number of State Vertices tagged per traversal when indexing a Workspace's revisions.
+REVISION_INDEX_BATCH_SIZE = 100
+
+# Facts about a Workspace that are read far more often than they change. They are stored on the Workspace
+# Vertex and refreshed by update_summary() when the Workspace is synced, along with their default values.
+SUMMARY_PROPERTIES = {
+    'terraform_version': 'N/A',
+    'serial': 0,
+    'resource_count': 0,
+    'dependency_count': 0,
+    'redundant_dependency_count': 0,
+    'revision_count': 0
+}
+
 class Workspace(Vertex):
     """Represents a Workspace in the graph database.
     """
@@ -47,6 +62,58 @@ class Workspace(Vertex):
         def count_by_current_rev(cls, group_by):
             return Gizmo().g.V().hasLabel(Workspace.label).outE('has_current_state').inV().groupCount().by(group_by).next()
 
+        @classmethod
+        def _terraform_versions_query(cls, organization: str = None):
+            query = Gizmo().g.V().hasLabel(Workspace.label)
+            if organization:
+                query = query.has('organization', organization)
+            return query
+
+        @staticmethod
+        def _terraform_version():
+            # Read the version from the summary, falling back to the current state for Workspaces synced before
+            # summaries existed so they are still grouped correctly.
+            return __.coalesce(
+                __.values('terraform_version'),
+                __.out('has_current_state').values('terraform_version'),
+                __.constant(SUMMARY_PROPERTIES['terraform_version']))
+
+        @classmethod
+        def count_by_terraform_version(cls, organization: str = None):
+            """Count the Workspaces on each Terraform version in a single traversal.
+
+            Args
+                organization: optionally only count the Workspaces in this Organization.
+            Returns
+                A dict of Terraform version to the number of Workspaces on it.
+            """
+            return cls._terraform_versions_query(organization).groupCount().by(cls._terraform_version()).next()
+
+        @classmethod
+        def terraform_versions(cls, terraform_version: str = None, organization: str = None, start: int = 0, end: int = None):
+            """Fetch the Terraform version of each Workspace, ordered by name, in a single traversal.
+
+            Args
+                terraform_version: optionally only return the Workspaces on this Terraform version.
+                organization: optionally only return the Workspaces in this Organization.
+                start: the index of the first Workspace to return, used for paging.
+                end: the index after the last Workspace to return, defaults to returning all of them.
+            Returns
+                A list of dicts containing the name, organization and terraform_version of each Workspace.
+            """
+            query = cls._terraform_versions_query(organization).order().by('name') \
+                .project('name', 'organization', 'terraform_version') \
+                .by('name') \
+                .by('organization') \
+                .by(cls._terraform_version())
+            if terraform_version:
+                query = query.filter_(__.select('terraform_version').is_(terraform_version))
+            if end is not None:
+                query = query.range_(start, end)
+            elif start:
+                query = query.skip(start)
+            return query.toList()
+
         @classmethod
         def get(cls, **kwargs):
             """Fetch a vertex where the given kwargs are has() filters that are dynamically concatenated to build
@@ -72,7 +139,9 @@ class Workspace(Vertex):
                     workspace_id=element_map['workspace_id'],
                     organization=element_map['organization'],
                     created_at=element_map['created_at'],
-                    last_updated=element_map['last_updated']
+                    last_updated=element_map['last_updated'],
+                    summary=Workspace.summary_from_map(element_map),
+                    revisions_indexed=element_map.get('revisions_indexed', False)
                 )
 
         @classmethod
@@ -143,6 +212,112 @@ class Workspace(Vertex):
                 raise VertexDoesNotExistException
             # return [v['name'][0] for v in Gizmo().g.V(self.v).outE('depends_on').has('redundant', 'true').inV().valueMap('name')]
 
+        @classmethod
+        def organizations(cls):
+            """Returns a dict of every Workspace name to the name of its Organization.
+            """
+            results = Gizmo().g.V().hasLabel(Workspace.label).project('name', 'organization').by('name').by('organization').toList()
+            return {r['name']: r['organization'] for r in results}
+
+        @classmethod
+        def names(cls, organization: str):
+            """Returns the names of every Workspace in the Organization.
+            """
+            return Gizmo().g.V().hasLabel(Workspace.label).has('organization', organization).values('name').toList()
+
+        @classmethod
+        def dependency_edges(cls):
+            """Fetch every depends_on Edge between Workspaces in a single traversal.
+
+            Returns
+                A list of dicts containing the source (dependent) and target (dependency) Workspace names,
+                the lookup type and whether the dependency is redundant.
+            """
+            return Gizmo().g.E().hasLabel('depends_on') \
+                .project('source', 'target', 'type', 'redundant') \
+                .by(__.outV().values('name')) \
+                .by(__.inV().values('name')) \
+                .by('type') \
+                .by('redundant').toList()
+
+        @classmethod
+        def search_documents(cls, names=None):
+            """Fetch what the search index holds for each Workspace, its name and the namespace, type and
+            instance ids (as ResourceInstance Vertices or packed instances) of every Resource in its current
+            state, in a single traversal.
+
+            Args
+                names: optionally only fetch these Workspaces, defaults to all of them.
+            Returns
+                A list of dicts containing the name, organization and resources of each Workspace.
+            """
+            query = Gizmo().g.V().hasLabel(Workspace.label)
+            if names is not None:
+                query = query.has('name', within(*names))
+            return query.project('name', 'organization', 'resources') \
+                .by('name') \
+                .by('organization') \
+                .by(__.out('has_current_state').out('contains').hasLabel(Resource.label)
+                    .project('namespace', 'resource_type', 'iids', 'instances')
+                    .by('namespace')
+                    .by('resource_type')
+                    .by(__.in_('instance_of').values('iid').fold())
+                    .by(__.values('instances').fold()).fold()).toList()
+
+        @classmethod
+        def resource_graphs(cls, names, organization: str = None):
+            """Fetch the Resources in the current state of each of the given Workspaces, along with the dependencies
+            between them, in a single traversal.
+
+            Args
+                names: the names of the Workspaces.
+                organization: optionally only fetch Workspaces in this Organization.
+            Returns
+                A list of dicts containing the Workspace name, the state_id of its current state, its Resources and
+                a dict of Resource namespace to the namespaces it depends on. Workspaces without a current state
+                are left out.
+            """
+            query = Gizmo().g.V().hasLabel(Workspace.label).has('name', within(*names))
+            if organization:
+                query = query.has('organization', organization)
+            results = query.as_('workspace').out('has_current_state') \
+                .project('workspace', 'state_id', 'resource_dependencies', 'resources') \
+                .by(__.select('workspace').values('name')) \
+                .by('state_id') \
+                .by(__.values('resource_dependencies').fold()) \
+                .by(__.out('contains').hasLabel(Resource.label).elementMap('name', 'state_id', 'resource_type', 'namespace', 'mode', 'last_updated').fold()) \
+                .toList()
+
+            return [{
+                'workspace': result['workspace'],
+                'state_id': result['state_id'],
+                'dependencies': json.loads(result['resource_dependencies'][0]) if result['resource_dependencies'] else {},
+                'resources': [Resource(
+                    _id=v[T.id],
+                    name=v['name'],
+                    state_id=v['state_id'],
+                    resource_type=v['resource_type'],
+                    namespace=v['namespace'],
+                    mode=v.get('mode'),
+                    last_updated=v.get('last_updated')
+                ) for v in result['resources']]
+            } for result in results]
+
+        @classmethod
+        def redundant_dependency_edges(cls):
+            """Fetch every redundant depends_on Edge in a single traversal.
+
+            Returns
+                A list of dicts containing the source (dependent) and target (dependency) Workspace names,
+                the lookup type and the Organization of the source Workspace.
+            """
+            return Gizmo().g.E().hasLabel('depends_on').has('redundant', 'true') \
+                .project('source', 'target', 'type', 'organization') \
+                .by(__.outV().values('name')) \
+                .by(__.inV().values('name')) \
+                .by('type') \
+                .by(__.outV().values('organization')).toList()
+
         @classmethod
         def drop_all(cls):
             Gizmo().g.V().drop().iterate()
@@ -150,7 +325,7 @@ class Workspace(Vertex):
         @classmethod
         def all(cls):
             workspaces = []
-            for v in Gizmo().g.V().hasLabel(Workspace.label).elementMap('workspace_id', 'name', 'organization', 'last_updated', 'created_at'):
+            for v in Gizmo().g.V().hasLabel(Workspace.label).elementMap('workspace_id', 'name', 'organization', 'last_updated', 'created_at', 'revisions_indexed', *SUMMARY_PROPERTIES):
                 workspaces.append(
                     Workspace(
                         _id=v[T.id],
@@ -158,7 +333,9 @@ class Workspace(Vertex):
                         name=v['name'],
                         organization=v['organization'],
                         created_at=v['created_at'],
-                        last_updated=v['last_updated'])
+                        last_updated=v['last_updated'],
+                        summary=Workspace.summary_from_map(v),
+                        revisions_indexed=v.get('revisions_indexed', False))
                 )
             return workspaces
 
@@ -170,41 +347,81 @@ class Workspace(Vertex):
     def created_at_dt(self):
         return datetime.datetime.fromtimestamp(int(self.created_at))
 
-    def get_total_revision_count(self):
-        """Traverse the state revisions tree and count how many there are.
+    def _revisions_query(self, since=None, until=None):
+        if not self.revisions_indexed:
+            self.index_revisions()
+
+        base_query = Gizmo().g.V().hasLabel(State.label).has('owner_workspace_id', self.workspace_id)
+        if since is not None:
+            base_query = base_query.has('created_at', gte(since))
+        if until is not None:
+            base_query = base_query.has('created_at', lte(until))
+        return base_query
+
+    def revisions(self, since=None, until=None, limit=None):
+        """Fetch the Workspace's state revisions, including the current one, using the owner_workspace_id and
+        ordinal stored on each State rather than following succeeded Edges one revision at a time.
 
+        Args
+            since: only return revisions created at or after this timestamp.
+            until: only return revisions created at or before this timestamp.
+            limit: the maximum number of revisions to return.
         Returns
-            1 (the current_state_revision) + the count of succeeded (old) revisions.
+            A list of States, most recent first.
+        """
+        base_query = self._revisions_query(since=since, until=until).order().by('ordinal', Order.desc)
+        if limit is not None:
+            base_query = base_query.limit(limit)
+        return [State.from_element_map(r) for r in base_query.elementMap(*STATE_PROPERTIES).toList()]
+
+    def index_revisions(self):
+        """Tag every State in the Workspace's history with the Workspace's workspace_id and its ordinal, by
+        walking the succeeded Edges back from the current state revision once. Only needed for Workspaces
+        synced before revisions were indexed, new revisions are tagged as they are synced.
         """
         try:
-            v = Gizmo().g.V().hasLabel(Workspace.label).has('name', self.name).outE('has_current_state').inV().next()
-            return 1 + Gizmo().g.V(v).repeat(outE('succeeded').inV()).emit().until(outE('succeeded').count().is_(0)).count().next()
+            current = Gizmo().g.V(self.v).outE('has_current_state').inV().next()
         except StopIteration:
-            return 0
+            current = None
+
+        if current is not None:
+            state_ids = [current.id] + Gizmo().g.V(current).repeat(outE('succeeded').inV()).emit() \
+                .until(outE('succeeded').count().is_(0)).id_().toList()
+            for start in range(0, len(state_ids), REVISION_INDEX_BATCH_SIZE):
+                query = Gizmo().g
+                for i, state_id in enumerate(state_ids[start:start + REVISION_INDEX_BATCH_SIZE], start=start):
+                    query = query.V(state_id) \
+                        .property(Cardinality.single, 'owner_workspace_id', self.workspace_id) \
+                        .property(Cardinality.single, 'ordinal', len(state_ids) - 1 - i)
+                query.iterate()
+
+        self.mark_revisions_indexed()
+
+    def mark_revisions_indexed(self):
+        Gizmo().g.V(self.v).property(Cardinality.single, 'revisions_indexed', True).iterate()
+        self.revisions_indexed = True
+
+    def get_total_revision_count(self):
+        """Count the Workspace's state revisions.
+
+        Returns
+            1 (the current_state_revision) + the count of succeeded (old) revisions.
+        """
+        return self._revisions_query().count().next()
 
     def get_first_revision(self):
-        v = Gizmo().g.V().hasLabel(Workspace.label).has('name', self.name).outE('has_current_state').inV().next()
-        r = Gizmo().g.V(v).repeat(outE('succeeded').inV()).until(outE('succeeded').count().is_(0)).elementMap().next()
-        return State(
-            _id=r[T.id],
-            state_id=r['state_id'],
-            resource_count=r['resource_count'],
-            serial=r['serial'],
-            created_at=r['created_at'],
-            terraform_version=r['terraform_version']
-        )
+        results = self._revisions_query().order().by('ordinal', Order.asc).limit(1).elementMap(*STATE_PROPERTIES).toList()
+        if not results:
+            raise VertexDoesNotExistException
+        return State.from_element_map(results[0])
 
     def get_state_revisions(self):
-        v = Gizmo().g.V().hasLabel(Workspace.label).has('name', self.name).outE('has_current_state').inV().next()
-        results = Gizmo().g.V(v).repeat(outE('succeeded').inV()).emit().until(outE('succeeded').count().is_(0)).elementMap().toList()
-        return [State(
-            _id=v[T.id],
-            state_id=v['state_id'],
-            resource_count=v['resource_count'],
-            serial=v['serial'],
-            created_at=v['created_at'],
-            terraform_version=v['terraform_version']
-        ) for v in results]
+        """Fetch the Workspace's previous state revisions, excluding the current one.
+
+        Returns
+            A list of States, most recent first.
+        """
+        return self.revisions()[1:]
 
     def get_upstreams(self, redundant=None):
         """Fetch a list of all Workspaces that this workspace is required by
@@ -272,6 +489,16 @@ class Workspace(Vertex):
             last_updated=v['last_updated']
         ) for v in Gizmo().g.V().hasLabel(Workspace.label).has('workspace_id', self.workspace_id).outE('contains').inV().elementMap()]
 
+    def get_resources_state_id(self):
+        """Returns the id of the newest of the Workspace's states that has Resources synced, or None if none do.
+        Resource syncs diff the new current state against it.
+        """
+        state_ids = Gizmo().g.V().hasLabel(State.label).has('owner_workspace_id', self.workspace_id) \
+            .where(__.out('contains')) \
+            .order().by(__.coalesce(__.values('ordinal'), __.constant(-1)), Order.desc) \
+            .limit(1).values('state_id').toList()
+        return state_ids[0] if state_ids else None
+
     def get_resource_count(self):
         """Count the number of Resources Vertices that this Workspace depends on by counting the contains out Edges.
         """
@@ -328,25 +555,76 @@ class Workspace(Vertex):
     def get_current_state_revision(self):
         v = Gizmo().g.V().hasLabel(Workspace.label).has('workspace_id', self.workspace_id).outE('has_current_state').inV()
         while v.hasNext():
-            r = Gizmo().g.V().hasLabel(Workspace.label).has('workspace_id', self.workspace_id).outE('has_current_state').inV().elementMap().toList()[0]
-            return State(
-                _id=r[T.id],
-                state_id=r['state_id'],
-                resource_count=r['resource_count'],
-                serial=r['serial'],
-                created_at=r['created_at'],
-                terraform_version=r['terraform_version']
-            )
+            r = Gizmo().g.V().hasLabel(Workspace.label).has('workspace_id', self.workspace_id).outE('has_current_state').inV().elementMap(*STATE_PROPERTIES).toList()[0]
+            return State.from_element_map(r)
         else:
             raise VertexDoesNotExistException
 
-    def __init__(self, _id: int, workspace_id: str, name: str, organization: str, last_updated: str, created_at: str):
+    def __init__(self, _id: int, workspace_id: str, name: str, organization: str, last_updated: str, created_at: str,
+                 summary: dict = None, revisions_indexed: bool = False):
         self._id = _id
         self.workspace_id = workspace_id
         self.name = name
         self.organization = organization
         self.last_updated = last_updated
         self.created_at = created_at
+        self.summary = summary
+        self.revisions_indexed = revisions_indexed
+
+    @staticmethod
+    def summary_from_map(element_map):
+        """Pull the summary properties out of an elementMap or valueMap of a Workspace Vertex.
+
+        Args
+            element_map: the elementMap() or valueMap() result for the Workspace Vertex.
+        Returns
+            A dict of the summary properties, or None if the summary has not been calculated yet.
+        """
+        if 'revision_count' not in element_map:
+            return None
+        summary = {}
+        for prop, default in SUMMARY_PROPERTIES.items():
+            value = element_map.get(prop, default)
+            # valueMap() returns lists of values where elementMap() returns the values themselves.
+            summary[prop] = value[0] if isinstance(value, list) else value
+        return summary
+
+    def get_summary(self):
+        """Returns the summary properties for the Workspace. Workspaces synced before summaries existed
+        have theirs calculated and stored on first read.
+
+        Returns
+            A dict of the summary properties, see SUMMARY_PROPERTIES.
+        """
+        if self.summary is None:
+            self.update_summary()
+        return self.summary
+
+    def update_summary(self):
+        """Recalculate the summary properties from the current state revision, the dependencies and the
+        revision history and store them on the Workspace Vertex. Called whenever the Workspace is synced.
+        """
+        counts = Gizmo().g.V(self.v).project('current_state', 'dependency_count', 'redundant_dependency_count') \
+            .by(__.outE('has_current_state').inV().valueMap('terraform_version', 'serial', 'resource_count').fold()) \
+            .by(__.outE('depends_on').count()) \
+            .by(__.outE('depends_on').has('redundant', 'true').count()).next()
+
+        summary = dict(SUMMARY_PROPERTIES)
+        if counts['current_state']:
+            current_state = counts['current_state'][0]
+            summary['terraform_version'] = current_state['terraform_version'][0]
+            summary['serial'] = current_state['serial'][0]
+            summary['resource_count'] = current_state['resource_count'][0]
+        summary['dependency_count'] = counts['dependency_count']
+        summary['redundant_dependency_count'] = counts['redundant_dependency_count']
+        summary['revision_count'] = self.get_total_revision_count()
+
+        query = Gizmo().g.V(self.v)
+        for prop, value in summary.items():
+            query = query.property(Cardinality.single, prop, value)
+        query.next()
+
+        self.summary = summary
 
     def depends_on(self, target, lookup_type, redundant=False):
         """Creates an edge from the current workspace to the target one.
@@ -403,6 +681,18 @@ class Workspace(Vertex):
                 # Add the succeeded edge between the new current state revision and the previous one.
                 target.succeeded(out_of_date_current_state_revision)
 
+                if self.revisions_indexed and out_of_date_current_state_revision.ordinal is not None:
+                    target.owner_workspace_id = self.workspace_id
+                    target.ordinal = out_of_date_current_state_revision.ordinal + 1
+                    target.save()
+                else:
+                    self.index_revisions()
+        else:
+            target.owner_workspace_id = self.workspace_id
+            target.ordinal = 0
+            target.save()
+            self.mark_revisions_indexed()
+
         # Quick save to update last_updated.
         self.save()
 
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cartographer.utils import garbage
+
+
+class Command(BaseCommand):
+    help = 'Drop superseded Resources, revisions outside the retention policy and orphaned Vertices from the graph database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be dropped.')
+
+    def handle(self, *args, **options):
+        with garbage.collection_lock() as lock:
+            if not lock.acquired:
+                raise CommandError('Garbage collection is already running.')
+            reclaimed = garbage.collect(dry_run=options['dry_run'])
+        verb = 'Would reclaim' if options['dry_run'] else 'Reclaimed'
+        for kind in ['states', 'resources', 'resource_instances']:
+            self.stdout.write(f'{verb} {reclaimed.get(kind, 0)} {kind.replace("_", " ")}.')
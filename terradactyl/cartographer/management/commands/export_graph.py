@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from cartographer.utils.snapshot import export_graph
+
+
+class Command(BaseCommand):
+    help = 'Export every Vertex and Edge in the graph database, with the sync metadata, to a compressed snapshot file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='The file to write the snapshot to, e.g. terradactyl.snapshot.gz.')
+
+    def handle(self, *args, **options):
+        with open(options['path'], 'wb') as fileobj:
+            counts = export_graph(fileobj)
+        self.stdout.write(f'Exported {counts["vertices"]} vertices, {counts["edges"]} edges and {counts["objects"]} '
+                          f'database rows to {options["path"]}.')
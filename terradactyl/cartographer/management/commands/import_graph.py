@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cartographer.utils.snapshot import SnapshotFormatException, import_graph
+
+
+class Command(BaseCommand):
+    help = 'Restore the graph database, and the sync metadata, from a snapshot written by export_graph.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='The snapshot file to import.')
+        parser.add_argument('--replace', action='store_true', help='Drop everything in the graph database before importing.')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                counts = import_graph(fileobj, replace=options['replace'])
+        except (SnapshotFormatException, ValueError) as error:
+            raise CommandError(error)
+        self.stdout.write(f'Imported {counts["vertices"]} vertices, {counts["edges"]} edges and {counts["objects"]} '
+                          f'database rows from {options["path"]}.')
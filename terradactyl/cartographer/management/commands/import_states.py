@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cartographer.utils.state_files import import_states
+
+
+class Command(BaseCommand):
+    help = ('Build the graph from a directory of state files, laid out as <organization>/<workspace>.tfstate or '
+            '<organization>/<workspace>/<revision>.tfstate, without calling Terraform Cloud.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='The directory of state files.')
+        parser.add_argument('--workers', type=int, default=None, help='The number of processes to parse state files with, defaults to the number of CPUs.')
+        parser.add_argument('--replace', action='store_true', help='Drop everything in the graph database before importing.')
+
+    def handle(self, *args, **options):
+        try:
+            counts = import_states(options['path'], workers=options['workers'], replace=options['replace'])
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(f'Imported {counts.get("workspaces", 0)} workspaces, {counts.get("states", 0)} states, '
+                          f'{counts.get("resources", 0)} resources and {counts.get("dependencies", 0)} dependencies.')
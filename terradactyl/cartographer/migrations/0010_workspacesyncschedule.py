@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cartographer', '0009_alter_organizationsyncjob_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkspaceSyncSchedule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('workspace_name', models.CharField(max_length=128)),
+                ('check_interval', models.IntegerField(default=0)),
+                ('next_check_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('last_checked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_changed_at', models.DateTimeField(blank=True, null=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='cartographer.terraformcloudorganization')),
+            ],
+            options={
+                'unique_together': {('organization', 'workspace_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cartographer', '0010_workspacesyncschedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organizationsyncjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='OrganizationSyncJobCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('workspace_name', models.CharField(max_length=128)),
+                ('stage', models.CharField(max_length=64)),
+                ('completed_at', models.DateTimeField(auto_now_add=True)),
+                ('sync_job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='cartographer.organizationsyncjob')),
+            ],
+            options={
+                'unique_together': {('sync_job', 'workspace_name', 'stage')},
+            },
+        ),
+    ]
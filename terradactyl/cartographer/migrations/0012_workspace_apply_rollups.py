@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cartographer', '0011_sync_job_checkpoints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkspaceApplyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('workspace_name', models.CharField(max_length=128)),
+                ('day', models.DateField(db_index=True)),
+                ('apply_count', models.PositiveIntegerField(default=0)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='cartographer.terraformcloudorganization')),
+            ],
+            options={
+                'unique_together': {('organization', 'workspace_name', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkspaceApplyRollupCursor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('workspace_name', models.CharField(max_length=128)),
+                ('rolled_up_until', models.FloatField(blank=True, null=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='cartographer.terraformcloudorganization')),
+            ],
+            options={
+                'unique_together': {('organization', 'workspace_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cartographer', '0012_workspace_apply_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkspaceRunDuration',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('workspace_name', models.CharField(max_length=128)),
+                ('apply_duration', models.FloatField()),
+                ('run_count', models.IntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='cartographer.terraformcloudorganization')),
+            ],
+            options={
+                'unique_together': {('organization', 'workspace_name')},
+            },
+        ),
+    ]
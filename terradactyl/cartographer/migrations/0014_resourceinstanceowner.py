@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cartographer', '0013_workspacerunduration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceInstanceOwner',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('iid', models.CharField(db_index=True, max_length=1024)),
+                ('workspace_name', models.CharField(max_length=128)),
+                ('state_id', models.CharField(max_length=128)),
+                ('namespace', models.CharField(max_length=1024)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='cartographer.terraformcloudorganization')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organization', 'workspace_name'], name='cartographe_organiz_cd30f0_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cartographer', '0014_resourceinstanceowner'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StateInstanceCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('workspace_name', models.CharField(max_length=128)),
+                ('state_id', models.CharField(max_length=128)),
+                ('provider', models.CharField(max_length=256)),
+                ('resource_type', models.CharField(max_length=256)),
+                ('instance_count', models.PositiveIntegerField(default=0)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='cartographer.terraformcloudorganization')),
+            ],
+            options={
+                'unique_together': {('state_id', 'provider', 'resource_type')},
+            },
+        ),
+    ]
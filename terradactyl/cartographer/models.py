@@ -1,7 +1,12 @@
 import datetime
 import uuid
 
-from django.db import models
+from collections import Counter
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
 
 from cartographer.utils.db import fields
 
@@ -17,26 +22,81 @@ class TerraformCloudOrganization(models.Model):
 
     @property
     def refreshing(self):
-        in_progress_sync_jobs = self.organizationsyncjob_set.filter(~models.Q(state=OrganizationSyncJob.COMPLETE))
-        return True if in_progress_sync_jobs else False
+        in_progress_sync_jobs = self.organizationsyncjob_set.exclude(state__in=OrganizationSyncJob.FINISHED_STATES)
+        return any(not sync_job.abandoned for sync_job in in_progress_sync_jobs)
 
 class OrganizationSyncJob(models.Model):
     COMPLETE = 'COMPLETE'
+    FAILED = 'FAILED'
     FETCHING_REMOTE_WORKSPACES = 'FETCHING_REMOTE_WORKSPACES'
     DRAWING_LOCAL_GRAPH = 'DRAWING_LOCAL_GRAPH'
     IMPORTING_STATE_HISTORY = 'IMPORTING_STATE_HISTORY'
     IMPORTING_RESOURCES = 'IMPORTING_RESOURCES'
 
+    # The stages that fan out a task per Workspace, in the order that they run.
+    STAGES = [DRAWING_LOCAL_GRAPH, IMPORTING_STATE_HISTORY, IMPORTING_RESOURCES]
+    # Jobs in these states are never resumed.
+    FINISHED_STATES = [COMPLETE, FAILED]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     state = models.CharField(default=FETCHING_REMOTE_WORKSPACES, max_length=64, null=True, blank=True) # TODO : Make this an enum thing
     total_workspaces = models.IntegerField(default=0)
     organization = models.ForeignKey(TerraformCloudOrganization, on_delete=models.SET_NULL, null=True, blank=True)
     started_at = models.DateTimeField(null=True, blank=True)
     finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
 
     @property
     def in_progress(self):
-        return self.state != OrganizationSyncJob.COMPLETE
+        return self.state not in OrganizationSyncJob.FINISHED_STATES
+
+    @property
+    def abandoned(self):
+        """An in progress job is abandoned when nothing has reported progress on it for
+        SYNC_JOB_HEARTBEAT_TIMEOUT seconds, for example because the worker running it died.
+        """
+        if not self.in_progress:
+            return False
+        last_seen = self.heartbeat_at or self.started_at
+        if last_seen is None:
+            return True
+        if timezone.is_naive(last_seen):
+            last_seen = timezone.make_aware(last_seen)
+        return last_seen < timezone.now() - datetime.timedelta(seconds=settings.SYNC_JOB_HEARTBEAT_TIMEOUT)
+
+    @classmethod
+    def close_superseded(cls):
+        """Mark in progress jobs as failed when a newer job has been started for the same Organization, or their
+        Organization has been deleted, as they will never be resumed. Jobs from before checkpointing never recorded
+        failures so would otherwise stay in progress forever.
+
+        Returns
+            A dict of Organization name to its newest job, for the Organizations with a job in progress.
+        """
+        latest_jobs = {}
+        superseded_job_ids = []
+        jobs = cls.objects.select_related('organization').order_by('organization_id', F('started_at').desc(nulls_last=True))
+        for sync_job in jobs:
+            if sync_job.organization is None or sync_job.organization_id in latest_jobs:
+                if sync_job.in_progress:
+                    superseded_job_ids.append(sync_job.id)
+                continue
+            latest_jobs[sync_job.organization_id] = sync_job
+
+        if superseded_job_ids:
+            cls.objects.filter(id__in=superseded_job_ids).update(state=cls.FAILED, finished_at=timezone.now())
+        return {sync_job.organization.name: sync_job for sync_job in latest_jobs.values() if sync_job.in_progress}
+
+    def heartbeat(self):
+        """Record that the job is still making progress.
+        """
+        self.heartbeat_at = timezone.now()
+        OrganizationSyncJob.objects.filter(id=self.id).update(heartbeat_at=self.heartbeat_at)
+
+    def completed_workspaces(self, stage: str):
+        """Returns the set of Workspace names that have completed the given stage of this job.
+        """
+        return set(self.checkpoints.filter(stage=stage).values_list('workspace_name', flat=True))
 
     @property
     def duration(self):
@@ -44,3 +104,219 @@ class OrganizationSyncJob(models.Model):
             return self.finished_at - self.started_at
         else:
             return datetime.datetime.now().replace(tzinfo=None) - self.started_at.replace(tzinfo=None)
+
+class OrganizationSyncJobCheckpoint(models.Model):
+    """Records that a Workspace has completed a stage of an OrganizationSyncJob, so that a job that
+    was interrupted can be resumed without repeating the work.
+    """
+    sync_job = models.ForeignKey(OrganizationSyncJob, on_delete=models.CASCADE, related_name='checkpoints')
+    workspace_name = models.CharField(max_length=128)
+    stage = models.CharField(max_length=64)
+    completed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('sync_job', 'workspace_name', 'stage')
+
+    @classmethod
+    def record(cls, sync_job_id, workspace_name: str, stage: str):
+        """Record that the Workspace has completed the stage, which also counts as a heartbeat for the job.
+        """
+        cls.objects.get_or_create(sync_job_id=sync_job_id, workspace_name=workspace_name, stage=stage)
+        OrganizationSyncJob.objects.filter(id=sync_job_id).update(heartbeat_at=timezone.now())
+
+
+class WorkspaceSyncSchedule(models.Model):
+    """When the scheduler should next check a Workspace for changes. The check interval adapts to how
+    often the Workspace is applied, so busy Workspaces are checked often and dormant ones rarely.
+    """
+    organization = models.ForeignKey(TerraformCloudOrganization, on_delete=models.CASCADE)
+    workspace_name = models.CharField(max_length=128)
+    check_interval = models.IntegerField(default=0)   # Seconds
+    next_check_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    last_checked_at = models.DateTimeField(null=True, blank=True)
+    last_changed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('organization', 'workspace_name')
+
+
+class WorkspaceApplyRollupCursor(models.Model):
+    """The created_at timestamp of the most recent state revision that has been counted in a Workspace's
+    WorkspaceApplyRollups, so each revision sync only counts revisions it hasn't seen before.
+    """
+    organization = models.ForeignKey(TerraformCloudOrganization, on_delete=models.CASCADE)
+    workspace_name = models.CharField(max_length=128)
+    rolled_up_until = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('organization', 'workspace_name')
+
+
+class WorkspaceApplyRollup(models.Model):
+    """The number of applies (state revisions) a Workspace had on a given day. Kept up to date by revision
+    syncs so that apply activity can be reported without walking every Workspace's history.
+    """
+    organization = models.ForeignKey(TerraformCloudOrganization, on_delete=models.CASCADE)
+    workspace_name = models.CharField(max_length=128)
+    day = models.DateField(db_index=True)
+    apply_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('organization', 'workspace_name', 'day')
+
+    @classmethod
+    def record(cls, organization, workspace_name: str, apply_timestamps):
+        """Add the applies that haven't been counted yet to the Workspace's daily rollups.
+
+        Args
+            organization: the TerraformCloudOrganization the Workspace belongs to.
+            workspace_name: the name of the Workspace.
+            apply_timestamps: the created_at timestamps of the Workspace's state revisions, any that are not
+                              newer than the Workspace's cursor are ignored.
+        Returns
+            The number of applies added.
+        """
+        with transaction.atomic():
+            cursor, _ = WorkspaceApplyRollupCursor.objects.select_for_update().get_or_create(
+                organization=organization, workspace_name=workspace_name)
+            new_timestamps = [float(t) for t in apply_timestamps if cursor.rolled_up_until is None or float(t) > cursor.rolled_up_until]
+            if not new_timestamps:
+                return 0
+
+            daily_counts = Counter(datetime.datetime.fromtimestamp(t, tz=datetime.timezone.utc).date() for t in new_timestamps)
+            for day, count in daily_counts.items():
+                updated = cls.objects.filter(organization=organization, workspace_name=workspace_name, day=day) \
+                    .update(apply_count=F('apply_count') + count)
+                if not updated:
+                    cls.objects.create(organization=organization, workspace_name=workspace_name, day=day, apply_count=count)
+
+            cursor.rolled_up_until = max(new_timestamps)
+            cursor.save()
+        return len(new_timestamps)
+
+
+class WorkspaceRunDuration(models.Model):
+    """How long a Workspace's runs usually take to plan and apply, taken from its recent successful runs in
+    Terraform Cloud. Used to work out how long it would take to rebuild a set of Workspaces.
+    """
+    organization = models.ForeignKey(TerraformCloudOrganization, on_delete=models.CASCADE)
+    workspace_name = models.CharField(max_length=128)
+    apply_duration = models.FloatField()   # Median, in seconds
+    run_count = models.IntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('organization', 'workspace_name')
+
+    @classmethod
+    def record(cls, organization, workspace_name: str, durations):
+        """Store the median of the given run durations for the Workspace, ignored if there are none.
+        """
+        if not durations:
+            return
+        ordered = sorted(durations)
+        middle = len(ordered) // 2
+        median = ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+        cls.objects.update_or_create(
+            organization=organization,
+            workspace_name=workspace_name,
+            defaults={'apply_duration': median, 'run_count': len(ordered)})
+
+
+class ResourceInstanceOwner(models.Model):
+    """Which Workspace, state and Resource manage a cloud resource, keyed by its instance id (iid). Replaced for
+    a Workspace whenever its resources are synced, so a cloud id can be traced back to the state managing it
+    without scanning every ResourceInstance in the graph.
+    """
+    iid = models.CharField(max_length=1024, db_index=True)
+    organization = models.ForeignKey(TerraformCloudOrganization, on_delete=models.CASCADE)
+    workspace_name = models.CharField(max_length=128)
+    state_id = models.CharField(max_length=128)
+    namespace = models.CharField(max_length=1024)
+
+    class Meta:
+        indexes = [models.Index(fields=['organization', 'workspace_name'])]
+
+    @classmethod
+    def replace(cls, organization, workspace_name: str, state_id: str, instances):
+        """Replace the instance ids owned by a Workspace with those in its current state.
+
+        Args
+            organization: the TerraformCloudOrganization the Workspace belongs to.
+            workspace_name: the name of the Workspace.
+            state_id: the id of the Workspace's current state.
+            instances: (iid, namespace) pairs for every Resource Instance in the current state.
+        Returns
+            The number of instance ids now owned by the Workspace.
+        """
+        owners = [cls(iid=iid, organization=organization, workspace_name=workspace_name, state_id=state_id, namespace=namespace)
+                  for iid, namespace in set(instances) if iid]
+        with transaction.atomic():
+            cls.objects.filter(organization=organization, workspace_name=workspace_name).delete()
+            cls.objects.bulk_create(owners, batch_size=500)
+        return len(owners)
+
+    @classmethod
+    def lookup(cls, iids):
+        """Find the owners of many instance ids in one query.
+
+        Args
+            iids: the instance ids to look up.
+        Returns
+            A dict of each instance id to a list of dicts containing the organization, workspace, state_id and
+            namespace of every Resource that manages it, empty when it is not managed by any.
+        """
+        owners = {iid: [] for iid in iids}
+        for owner in cls.objects.filter(iid__in=owners.keys()).select_related('organization').order_by('workspace_name', 'namespace'):
+            owners[owner.iid].append({
+                'organization': owner.organization.name,
+                'workspace': owner.workspace_name,
+                'state_id': owner.state_id,
+                'namespace': owner.namespace
+            })
+        return owners
+
+
+class StateInstanceCount(models.Model):
+    """The number of Resource Instances of each provider and resource type in a Workspace's synced state. Kept by
+    resource syncs so the dashboards can count instances without a Vertex per instance in the graph.
+    """
+    organization = models.ForeignKey(TerraformCloudOrganization, on_delete=models.CASCADE)
+    workspace_name = models.CharField(max_length=128)
+    state_id = models.CharField(max_length=128)
+    provider = models.CharField(max_length=256)
+    resource_type = models.CharField(max_length=256)
+    instance_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('state_id', 'provider', 'resource_type')
+
+    @classmethod
+    def record(cls, organization, workspace_name: str, state_id: str, counts):
+        """Replace the instance counts for a Workspace with those of its current state. Resource syncs carry a
+        Workspace's Resources forward to its newest state, so older states no longer hold any.
+
+        Args
+            organization: the TerraformCloudOrganization the Workspace belongs to.
+            workspace_name: the name of the Workspace the state belongs to.
+            state_id: the id of the state.
+            counts: a dict of (provider, resource_type) to the number of instances in the state.
+        """
+        with transaction.atomic():
+            cls.objects.filter(models.Q(state_id=state_id) | models.Q(organization=organization, workspace_name=workspace_name)).delete()
+            cls.objects.bulk_create([
+                cls(organization=organization, workspace_name=workspace_name, state_id=state_id,
+                    provider=provider, resource_type=resource_type, instance_count=count)
+                for (provider, resource_type), count in counts.items()])
+
+    @classmethod
+    def count_by(cls, group_by: str):
+        """Returns the total number of instances for each value of group_by, either provider or resource_type.
+        """
+        return {row[group_by]: row['total'] for row in cls.objects.values(group_by).annotate(total=models.Sum('instance_count'))}
+
+    @classmethod
+    def total(cls):
+        """Returns the total number of instances across every state.
+        """
+        return cls.objects.aggregate(total=models.Sum('instance_count'))['total'] or 0
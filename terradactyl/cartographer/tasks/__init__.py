@@ -0,0 +1,2 @@
+# Import task modules so that they're registered when Celery autodiscovers this package.
+from . import maintenance, scheduler, terraform_cloud
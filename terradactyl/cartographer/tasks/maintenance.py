@@ -0,0 +1,22 @@
+import logging
+
+from celery import shared_task
+
+from cartographer.utils import garbage
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def collect_garbage():
+    """Periodic task (run by Celery beat) that drops stale data from the graph database, see
+    cartographer.utils.garbage.collect().
+
+    Returns
+        A dict of the number of each kind of Vertex reclaimed, or None if a collection was already running.
+    """
+    with garbage.collection_lock() as lock:
+        if not lock.acquired:
+            logger.info('Garbage collection already in progress, skipping.')
+            return None
+        return garbage.collect()
@@ -0,0 +1,129 @@
+import datetime
+import logging
+import time
+
+from celery import chain, shared_task
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from cartographer.gizmo.models import Workspace
+from cartographer.gizmo.models.exceptions import VertexDoesNotExistException
+from cartographer.models import WorkspaceSyncSchedule
+from cartographer.tasks.terraform_cloud import sync_resources, sync_revisions, sync_workspace
+from cartographer.utils.locks import get_redis_connection
+from cartographer.utils.scheduling import check_interval
+from cartographer.utils.terraform_cloud import WorkspaceNotFoundException, get_client
+
+logger = logging.getLogger(__name__)
+
+SPENT_REQUESTS_KEY = 'terradactyl:scheduler:spent:{minute}'
+
+
+def _record_spent_requests(count: int):
+    """Record Terraform Cloud requests made by scheduled syncs against the current minute.
+    """
+    key = SPENT_REQUESTS_KEY.format(minute=int(time.time() // 60))
+    pipeline = get_redis_connection().pipeline()
+    pipeline.incrby(key, count)
+    pipeline.expire(key, 180)
+    pipeline.execute()
+
+
+def _requests_spent_last_minute():
+    spent = get_redis_connection().get(SPENT_REQUESTS_KEY.format(minute=int(time.time() // 60) - 1))
+    return int(spent) if spent else 0
+
+
+@shared_task
+def schedule_workspace_syncs():
+    """Periodic task (run by Celery beat) that queues a change check for every Workspace that is due one,
+    most overdue first. The number of checks queued is capped so that, along with the syncs triggered by
+    changes found last minute, the scheduler stays within SCHEDULED_SYNC_REQUEST_BUDGET.
+
+    Returns
+        The number of Workspace checks queued.
+    """
+    available_requests = settings.SCHEDULED_SYNC_REQUEST_BUDGET - _requests_spent_last_minute()
+    if available_requests <= 0:
+        logger.info('Scheduled sync request budget used up, no Workspace checks queued this time.')
+        return 0
+
+    now = timezone.now()
+    due_schedules = list(WorkspaceSyncSchedule.objects.filter(Q(next_check_at__isnull=True) | Q(next_check_at__lte=now))
+                         .order_by(F('next_check_at').asc(nulls_first=True))[:available_requests])
+
+    # Push the next check back straight away so queued checks aren't picked up again by the next run.
+    for schedule in due_schedules:
+        schedule.next_check_at = now + datetime.timedelta(seconds=max(schedule.check_interval, settings.SCHEDULED_SYNC_MIN_INTERVAL))
+    WorkspaceSyncSchedule.objects.bulk_update(due_schedules, ['next_check_at'])
+
+    for schedule in due_schedules:
+        check_workspace.delay(schedule.id)
+
+    logger.info(f'Queued {len(due_schedules)} scheduled Workspace checks.')
+    return len(due_schedules)
+
+
+@shared_task
+def check_workspace(schedule_id: int):
+    """Check whether a Workspace's current state has changed on the remote and, if it has, sync it.
+    Then work out when to check it next based on how often it has been applied.
+
+    Args
+        schedule_id: the id of the WorkspaceSyncSchedule for the Workspace.
+    """
+    schedule = WorkspaceSyncSchedule.objects.select_related('organization').get(id=schedule_id)
+    organization = schedule.organization
+    tfc_client = get_client(organization.name)
+
+    try:
+        workspace = Workspace.vertices.get(name=schedule.workspace_name, organization=organization.name)
+    except VertexDoesNotExistException:
+        logger.warning(f'Workspace {schedule.workspace_name} has been scheduled but does not exist locally, removing schedule.')
+        schedule.delete()
+        return
+
+    try:
+        _record_spent_requests(1)
+        remote_state_id = tfc_client.current_state_version_id(workspace.name, organization.name)
+    except WorkspaceNotFoundException:
+        logger.warning(f'Workspace {workspace.name} no longer exists in Terraform Cloud, removing schedule.')
+        schedule.delete()
+        return
+
+    try:
+        local_state_id = workspace.get_current_state_revision().state_id
+    except VertexDoesNotExistException:
+        local_state_id = None
+
+    now = timezone.now()
+    # Only the applies within the history window count towards the interval.
+    apply_timestamps = [r.created_at for r in workspace.revisions(since=now.timestamp() - settings.SCHEDULED_SYNC_HISTORY_WINDOW)]
+
+    if remote_state_id and remote_state_id != local_state_id:
+        logger.info(f'Workspace {workspace.name} has changed, syncing.')
+        _record_spent_requests(settings.SCHEDULED_SYNC_CHANGE_COST)
+        chain(
+            sync_workspace.si({
+                'name': workspace.name,
+                'organization': workspace.organization,
+                'id': workspace.workspace_id,
+                'created_at': workspace.created_at
+            }),
+            sync_revisions.si(workspace_name=workspace.name, organization_name=workspace.organization, initial_run=False),
+            sync_resources.si(workspace_name=workspace.name, organization_name=workspace.organization)
+        ).apply_async()
+        schedule.last_changed_at = now
+        apply_timestamps.append(now.timestamp())
+
+    schedule.check_interval = check_interval(
+        apply_timestamps,
+        now=now.timestamp(),
+        min_interval=settings.SCHEDULED_SYNC_MIN_INTERVAL,
+        max_interval=settings.SCHEDULED_SYNC_MAX_INTERVAL,
+        history_window=settings.SCHEDULED_SYNC_HISTORY_WINDOW,
+        checks_per_apply=settings.SCHEDULED_SYNC_CHECKS_PER_APPLY)
+    schedule.last_checked_at = now
+    schedule.next_check_at = now + datetime.timedelta(seconds=schedule.check_interval)
+    schedule.save()
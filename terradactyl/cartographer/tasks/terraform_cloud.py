@@ -1,92 +1,275 @@
 import datetime
 import logging
+import time
+
+from collections import Counter
 
 from celery import group, shared_task
 from celery.result import AsyncResult
+from django.conf import settings
 
-from cartographer.gizmo.models import Resource, ResourceInstance, State, Workspace
-from cartographer.models import TerraformCloudOrganization, OrganizationSyncJob
-from cartographer.utils.terraform_cloud import TerraformCloudClient, WorkspaceNotFoundException
+from cartographer.gizmo.models import Resource, State, Workspace
+from cartographer.models import (TerraformCloudOrganization, OrganizationSyncJob, OrganizationSyncJobCheckpoint, ResourceInstanceOwner,
+                                 StateInstanceCount, WorkspaceApplyRollup, WorkspaceApplyRollupCursor, WorkspaceRunDuration,
+                                 WorkspaceSyncSchedule)
+from cartographer.utils.terraform_cloud import WorkspaceNotFoundException, build_resource_adjacency, get_client
 from cartographer.gizmo.models.exceptions import VertexDoesNotExistException
+from cartographer.utils.cache import bump_dependency_generation, bump_sync_generation
+from cartographer.utils.garbage import drop_workspaces, resources_lock
+from cartographer.utils.locks import SyncLock, clear_in_flight, coalesce
+from cartographer.utils.resources import diff_resources, resource_changed
+from cartographer.utils.search import record_search_change
 
 BASE_URL = 'https://app.terraform.io'
 
 logger = logging.getLogger(__name__)
 
-@shared_task
-def sync_organization(org_name: str):
+@shared_task(bind=True)
+def sync_organization(self, org_name: str, resume_job_id: str = None):
     """For a given organization, fetch all Workspaces and create relevent nodes in the Graph Database. Once
     all nodes are created ensure that dependency edges are created.
 
+    Only one sync runs per Organization at a time, if one is already in progress this call attaches
+    to it and returns its job id rather than starting another. If a previous job for the Organization
+    was abandoned (e.g. the worker running it died) that job is resumed from its last checkpoints.
+
     Args:
         org_name (str): The name of the Organization to import all Workspaces for.
+        resume_job_id (str): the id of an abandoned OrganizationSyncJob to resume.
+
+    Returns:
+        The id of the OrganizationSyncJob doing the work.
     """
+    lock = SyncLock(f'sync-organization:{org_name}', task_id=self.request.id)
+    if not lock.acquire():
+        clear_in_flight(lock.name, self.request.id)
+        in_progress_job = OrganizationSyncJob.objects.filter(organization__name=org_name).exclude(
+            state__in=OrganizationSyncJob.FINISHED_STATES).order_by('-started_at').first()
+        logger.info(f'Sync already in progress for Organization {org_name}, attaching to it.')
+        return str(in_progress_job.id) if in_progress_job else None
+
+    try:
+        if resume_job_id:
+            resume_job = OrganizationSyncJob.objects.get(id=resume_job_id)
+        else:
+            in_progress_jobs = OrganizationSyncJob.objects.filter(organization__name=org_name).exclude(
+                state__in=OrganizationSyncJob.FINISHED_STATES).order_by('-started_at')
+            resume_job = next((job for job in in_progress_jobs if job.abandoned), None)
+        return str(_sync_organization(org_name, resume_job).id)
+    finally:
+        lock.release()
+
+
+def _wait_for_group(result, sync_org_job):
+    """Block until every task in the group result has finished, heart beating the job while waiting.
+
+    Returns
+        True if every task succeeded and no chunk reported a failed Workspace.
+    """
+    last_heartbeat = 0
+    while not result.ready():
+        if time.monotonic() - last_heartbeat > settings.SYNC_JOB_HEARTBEAT_INTERVAL:
+            sync_org_job.heartbeat()
+            last_heartbeat = time.monotonic()
+        time.sleep(1)
+
+    if not result.successful():
+        return False
+    # sync_chunk catches failures itself and returns the names of the Workspaces that failed.
+    return not any(isinstance(r.result, dict) and r.result.get('failed') for r in result.results)
 
+
+def _sync_organization(org_name: str, resume_job=None):
     org = TerraformCloudOrganization.objects.get(name=org_name)
-    tfc_client = TerraformCloudClient(api_key=org.api_key.value)
+    tfc_client = get_client(org_name)
     org.save()
 
-    # TODO : Check no other sync job in progress. If there is - fail.
-    sync_org_job = OrganizationSyncJob.objects.create(state=OrganizationSyncJob.FETCHING_REMOTE_WORKSPACES, organization=org)
-    sync_org_job.started_at = datetime.datetime.now()
-    sync_org_job.save()
+    if resume_job:
+        logger.info(f'Resuming sync job {resume_job.id} for Organization {org_name} from {resume_job.state}.')
+        sync_org_job = resume_job
+    else:
+        sync_org_job = OrganizationSyncJob.objects.create(state=OrganizationSyncJob.FETCHING_REMOTE_WORKSPACES, organization=org)
+        sync_org_job.started_at = datetime.datetime.now()
+        sync_org_job.save()
+    sync_org_job.heartbeat()
 
-    workspaces = tfc_client.workspaces(org_name)
+    workspaces, listing_complete = tfc_client.workspaces_listing(org_name)
 
-    sync_org_job.state = OrganizationSyncJob.DRAWING_LOCAL_GRAPH
     sync_org_job.total_workspaces=len(workspaces)
     sync_org_job.save()
-    
-    sync_workspace_tasks = group(sync_workspace.s(workspace, sync_org_job.id).set(task_id=f'sync-workspace:' + workspace['name']) for workspace in workspaces)
-    result = sync_workspace_tasks.apply_async()
 
-    while not result.ready():
-        continue
+    stage_signatures = {
+        OrganizationSyncJob.DRAWING_LOCAL_GRAPH: lambda workspace: sync_workspace.s(workspace, sync_org_job.id)
+            .set(task_id=f'sync-workspace:' + workspace['name']),
+        OrganizationSyncJob.IMPORTING_STATE_HISTORY: lambda workspace: sync_revisions.s(workspace_name=workspace['name'], organization_name=org_name, initial_run=True, sync_org_job_id=sync_org_job.id)
+            .set(task_id=f'sync-revisions:' + workspace['name']),
+        OrganizationSyncJob.IMPORTING_RESOURCES: lambda workspace: sync_resources.s(workspace_name=workspace['name'], organization_name=org_name, sync_org_job_id=sync_org_job.id)
+            .set(task_id=f'sync-resources:' + workspace['name'])
+    }
+
+    chunk_size = settings.SYNC_CHUNK_SIZE
+
+    # When resuming skip any stage the job has already moved past.
+    first_stage = OrganizationSyncJob.STAGES.index(sync_org_job.state) if sync_org_job.state in OrganizationSyncJob.STAGES else 0
+    failed_stages = []
+    for stage in OrganizationSyncJob.STAGES[first_stage:]:
+        sync_org_job.state = stage
+        sync_org_job.save()
+
+        completed_workspaces = sync_org_job.completed_workspaces(stage)
+        remaining_workspaces = [workspace for workspace in workspaces if workspace['name'] not in completed_workspaces]
+        if completed_workspaces:
+            logger.info(f'Skipping {len(completed_workspaces)} Workspaces that have already completed {stage}.')
+
+        if chunk_size > 1:
+            if stage == OrganizationSyncJob.DRAWING_LOCAL_GRAPH:
+                # Chunks don't retry waiting on each other for dependencies to exist, so create every
+                # Workspace Vertex up front.
+                for workspace in remaining_workspaces:
+                    Workspace.vertices.get_or_create(
+                        workspace_id=workspace['id'],
+                        name=workspace['name'],
+                        organization=workspace['organization'],
+                        created_at=workspace['created_at'])
+                bump_dependency_generation()
+            chunks = [remaining_workspaces[i:i + chunk_size] for i in range(0, len(remaining_workspaces), chunk_size)]
+            result = group(sync_chunk.s(stage, chunk, org_name, sync_org_job.id) for chunk in chunks).apply_async()
+        else:
+            result = group(stage_signatures[stage](workspace) for workspace in remaining_workspaces).apply_async()
+        if not _wait_for_group(result, sync_org_job):
+            failed_stages.append(stage)
+
+    # Make sure every Workspace is picked up by the scheduled sync.
+    WorkspaceSyncSchedule.objects.bulk_create(
+        [WorkspaceSyncSchedule(organization=org, workspace_name=workspace['name']) for workspace in workspaces],
+        ignore_conflicts=True)
+
+    # Drop the Workspaces that have been deleted from Terraform Cloud since the last sync, unless anything failed
+    # as then a Workspace missing from the listing may still exist.
+    if not listing_complete or failed_stages:
+        logger.warning(f'Not dropping deleted Workspaces for Organization {org_name} as the sync was incomplete. '
+                       f'Listing complete: {listing_complete}, failed stages: {failed_stages}.')
+    else:
+        remote_names = {workspace['name'] for workspace in workspaces}
+        deleted_names = [name for name in Workspace.vertices.names(org_name) if name not in remote_names]
+        if deleted_names:
+            drop_workspaces(org_name, deleted_names)
 
-    sync_org_job.state = OrganizationSyncJob.IMPORTING_STATE_HISTORY
+    sync_org_job.finished_at = datetime.datetime.now()
+    sync_org_job.state = OrganizationSyncJob.COMPLETE
     sync_org_job.save()
 
-    sync_revisions_tasks = group(sync_revisions.s(workspace_name=workspace['name'], organization_name=org_name, initial_run=True)
-                                 .set(task_id=f'sync-revisions:' + workspace['name']) for workspace in workspaces)
-
-    result = sync_revisions_tasks.apply_async()
+    logger.info('Sync Organization - All Workspace Nodes Created!')
 
-    while not result.ready():
-        continue
+    return sync_org_job
 
-    sync_org_job.save()
 
-    sync_org_job.state = OrganizationSyncJob.IMPORTING_RESOURCES
-    sync_org_job.save()
-    
-    sync_resources_tasks = group(sync_resources.s(workspace_name=workspace['name'], organization_name=org_name).set(task_id=f'sync-resources:' + workspace['name']) for workspace in workspaces)
-    result = sync_resources_tasks.apply_async()
-
-    while not result.ready():
-        continue
+@shared_task
+def sync_chunk(stage: str, workspace_infos: list, organization_name: str, sync_org_job_id=None):
+    """Run one stage of an Organization sync for a batch of Workspaces in a single task. The batch shares
+    one Terraform Cloud client (and its connection pool) and graph connection. Used instead of a task per
+    Workspace when SYNC_CHUNK_SIZE is set, to cut broker and result backend overhead for large Organizations.
+    A failure syncing one Workspace is logged and does not stop the rest of the chunk.
 
-    sync_org_job.finished_at = datetime.datetime.now()
-    sync_org_job.state = OrganizationSyncJob.COMPLETE
-    sync_org_job.save()
+    Args
+        stage: the OrganizationSyncJob stage to run, one of OrganizationSyncJob.STAGES.
+        workspace_infos: list of Workspace information dicts, as returned by TerraformCloudClient.workspaces().
+        organization_name: the organization which the Workspaces belong to.
+        sync_org_job_id: the id of the OrganizationSyncJob this is part of, if any.
+    Returns
+        A dict containing the names of the Workspaces that succeeded and failed.
+    """
+    if stage not in OrganizationSyncJob.STAGES:
+        raise ValueError(f'Invalid stage {stage} must be one of {OrganizationSyncJob.STAGES}.')
+
+    tfc_client = get_client(organization_name)
+
+    results = {'succeeded': [], 'failed': []}
+    for workspace_info in workspace_infos:
+        workspace_name = workspace_info['name']
+        try:
+            if stage == OrganizationSyncJob.DRAWING_LOCAL_GRAPH:
+                lock = SyncLock(f'sync-workspace:{organization_name}:{workspace_name}')
+                if lock.acquire():
+                    try:
+                        _sync_workspace(None, workspace_info, sync_org_job_id, tfc_client=tfc_client)
+                    finally:
+                        lock.release()
+                else:
+                    logger.info(f'Sync already in progress for Workspace {workspace_name}, attaching to it.')
+                    if not lock.wait(timeout=lock.ttl):
+                        raise TimeoutError(f'the in flight sync did not finish within {lock.ttl}s')
+            elif stage == OrganizationSyncJob.IMPORTING_STATE_HISTORY:
+                _sync_revisions(tfc_client, workspace_name, organization_name, initial_run=True)
+            elif stage == OrganizationSyncJob.IMPORTING_RESOURCES:
+                _sync_resources(tfc_client, workspace_name, organization_name)
+        except Exception as error:
+            logger.error(f'Failed {stage} for Workspace {workspace_name}. Error: {error}.')
+            results['failed'].append(workspace_name)
+            continue
+
+        if sync_org_job_id:
+            OrganizationSyncJobCheckpoint.record(sync_org_job_id, workspace_name, stage)
+        results['succeeded'].append(workspace_name)
+
+    logger.info(f'Finished {stage} for chunk of {len(workspace_infos)} Workspaces, {len(results["failed"])} failed.')
+    return results
 
-    logger.info('Sync Organization - All Workspace Nodes Created!')   # TODO : Handle Deletion
 
 @shared_task
-def sync_resources(workspace_name, organization_name):
+def resume_abandoned_sync_jobs():
+    """Periodic task (run by Celery beat) that finds OrganizationSyncJobs that have stopped making progress
+    and resumes them from their last checkpoints. Only the newest job for each Organization is resumed, older
+    jobs that never finished are marked as failed.
+
+    Returns
+        The ids of the jobs that were resumed.
+    """
+    resumed_job_ids = []
+    for org_name, sync_org_job in OrganizationSyncJob.close_superseded().items():
+        if sync_org_job.abandoned:
+            logger.warning(f'Sync job {sync_org_job.id} for Organization {org_name} has been abandoned, resuming it.')
+            coalesce(f'sync-organization:{org_name}', sync_organization, org_name, str(sync_org_job.id))
+            resumed_job_ids.append(str(sync_org_job.id))
+    return resumed_job_ids
+
+@shared_task(bind=True)
+def sync_resources(self, workspace_name, organization_name, sync_org_job_id=None):
     """Given the Workspace name, fetch all resources for the current revision and create
     a Resource(Vertex) to represent it in the graph database. Each Resourec only stored basic
     metadata like name, resource type. This does not store any other, especially sensitive,
     information about resources.
 
-    TODO : Handle refresh/subdequent calls. Detach / DROP old resources and make new ones on the new, current revision.
+    Only the Resources that changed since the Workspace's resources were last synced are written, the unchanged
+    ones are moved across to the new current revision.
 
     Args
         workspace_name: the name of the Terraform Cloud Workspace to load resources for.
+        organization_name: the organization which the workspace belongs to.
+        sync_org_job_id: the id of the OrganizationSyncJob this is part of, if any.
     """
-    logger.info(f'Loading resources for workspace: {workspace_name}...')
-    organization = TerraformCloudOrganization.objects.get(name=organization_name)
-    tfc_client = TerraformCloudClient(api_key=organization.api_key.value)
+    tfc_client = get_client(organization_name)
 
+    _sync_resources(tfc_client, workspace_name, organization_name, task_id=self.request.id)
+
+    if sync_org_job_id:
+        OrganizationSyncJobCheckpoint.record(sync_org_job_id, workspace_name, OrganizationSyncJob.IMPORTING_RESOURCES)
+
+
+def _sync_resources(tfc_client, workspace_name, organization_name, task_id=None):
+    # Garbage collection holds the same lock while it drops a Workspace's superseded Resources. The lock shares
+    # its name with the key refreshes are coalesced on, so releasing it lets the next refresh start a new task.
+    lock = resources_lock(organization_name, workspace_name, task_id=task_id)
+    while not lock.acquire():
+        lock.wait()
+    try:
+        _write_resources(tfc_client, workspace_name, organization_name)
+    finally:
+        lock.release()
+
+
+def _write_resources(tfc_client, workspace_name, organization_name):
+    logger.info(f'Loading resources for workspace: {workspace_name}...')
     workspace = Workspace.vertices.get(name=workspace_name)
 
     try:
@@ -97,51 +280,51 @@ def sync_resources(workspace_name, organization_name):
 
     resources_info = tfc_client.resources(workspace.organization, workspace_name)
     resources = resources_info['resources']
-
-    logger.debug(f'Handling resources for {workspace_name}')
-    # First pass, create resources.
+    for resource in resources.values():
+        resource['provider'] = resource['provider'].replace('provider[\"', '').replace('\"]', '')
+
+    # Diff against the Resources last synced for the Workspace (normally the previous revision's) so only the
+    # Resources that changed are written, the rest are carried forward to the new state.
+    previous_state_id = workspace.get_resources_state_id()
+    previous_resources = Resource.vertices.snapshot(previous_state_id) if previous_state_id else {}
+    diff = diff_resources(previous_resources, resources)
+    logger.debug(f'Handling resources for {workspace_name}: {len(diff["unchanged"])} unchanged, {len(diff["changed"])} changed, '
+                 f'{len(diff["moved"])} moved, {len(diff["added"])} added, {len(diff["removed"])} removed.')
+
+    state_id = current_revision.state_id
+    compact = settings.COMPACT_RESOURCE_INSTANCES
+    if previous_state_id and previous_state_id != state_id:
+        Resource.vertices.carry_forward(previous_state_id, state_id, diff['unchanged'] + diff['changed'] + list(diff['moved']))
+        # The previous state no longer holds the Resources its adjacency list describes.
+        State.vertices.drop_resource_dependencies(previous_state_id)
+    Resource.vertices.bulk_drop(previous_state_id or state_id, diff['removed'])
+    Resource.vertices.move(state_id, diff['moved'], resources)
+    # Moved Resources are renamed by move(), so only their instances, mode and provider need comparing.
+    changed = diff['changed'] + [namespace for previous, namespace in diff['moved'].items()
+                                 if resource_changed(previous_resources[previous], resources[namespace], attributes=('mode', 'provider'))]
+    Resource.vertices.replace_instances(state_id, {namespace: resources[namespace] for namespace in changed}, compact=compact)
+    Resource.vertices.bulk_create(state_id, {namespace: resources[namespace] for namespace in diff['added']}, compact=compact)
+
+    instance_owners = []
+    instance_counts = Counter()
     for r_namespace, resource in resources.items():
-        r = Resource.vertices.update_or_create(
-            name=resource['name'],
-            state_id=current_revision.state_id,
-            namespace=r_namespace,
-            mode=resource['mode'],
-            resource_type=resource['resource_type']
-        )
+        instance_owners.extend((instance['iid'], r_namespace) for instance in resource['instances'])
+        instance_counts[(resource['provider'], resource['resource_type'])] += len(resource['instances'])
 
-        for instance in resource['instances']:
-            ri = ResourceInstance.vertices.update_or_create(
-                index_key=instance['index_key'],
-                iid=instance['iid'],
-                state_id=current_revision.state_id,
-                provider=resource['provider'].replace('provider[\"', '').replace('\"]', ''),
-                resource_type=resource['resource_type']
-            )
-            logger.debug(f'Adding instance {instance["iid"]} to {r.namespace}')
-            ri.instance_of(r)
-
-        current_revision.contains(r)
-
-    # Second pass, create dependencies.
-    # TODO : Turn this back on - it's just too much to handle locally. DB becomes way too complex.
-    # for r_namespace, resource in resources.items():
-    #     try:
-    #         source_r = Resource.vertices.get(name=resource['name'], namespace=r_namespace, resource_type=resource['resource_type'], state_id=current_revision.state_id)
-    #     except VertexDoesNotExistException:
-    #         logger.warning(f'Unable to find resource {r_namespace} so no dependencies added.')
-    #         continue
-    #     for dependency in [dep for dep in resource['depends_on'] if 'terraform_remote_state' not in dep]:
-    #         try:
-    #             dependency_r = Resource.vertices.get(namespace=dependency, state_id=current_revision.state_id)
-    #             source_r.depends_on(dependency_r)
-    #         except VertexDoesNotExistException:
-    #             logger.warning(f'Could not find: {dependency} for {r_namespace} in {workspace_name}')
+    # Store the dependencies between the resources as one adjacency list on the state, an edge per dependency
+    # makes the graph far too large.
+    current_revision.set_resource_dependencies(build_resource_adjacency(resources))
 
+    organization = TerraformCloudOrganization.objects.get(name=workspace.organization)
+    ResourceInstanceOwner.replace(organization, workspace_name, state_id, instance_owners)
+    StateInstanceCount.record(organization, workspace_name, state_id, instance_counts)
+
+    record_search_change(workspace_name)
     logger.info(f'Finished processing resources for {workspace_name}')
 
 
 @shared_task
-def sync_revisions(workspace_name, organization_name, initial_run):
+def sync_revisions(workspace_name, organization_name, initial_run, sync_org_job_id=None):
     """Async Celery task that calls Terraform Cloud to fetch all State Revisions for a Terraform
     Workspace. For each State version retrieved (an ordered list from oldest to newest) it will
     create a State(Vertex) to represent it and then set then set that it succeeded the State before.
@@ -150,11 +333,18 @@ def sync_revisions(workspace_name, organization_name, initial_run):
         workspace_name: the name of the Workspace to sync.
         organization_name: the organization which the workspace belongs to.
         initial_run: whether the import is the initial import.
+        sync_org_job_id: the id of the OrganizationSyncJob this is part of, if any.
     """
     
-    organization = TerraformCloudOrganization.objects.get(name=organization_name)
-    tfc_client = TerraformCloudClient(api_key=organization.api_key.value)
+    tfc_client = get_client(organization_name)
+
+    _sync_revisions(tfc_client, workspace_name, organization_name, initial_run)
+
+    if sync_org_job_id:
+        OrganizationSyncJobCheckpoint.record(sync_org_job_id, workspace_name, OrganizationSyncJob.IMPORTING_STATE_HISTORY)
 
+
+def _sync_revisions(tfc_client, workspace_name, organization_name, initial_run):
     logger.info(f'Fetching revisions for workspace {workspace_name}...')
 
     workspace = Workspace.vertices.get(name=workspace_name, organization=organization_name)
@@ -167,13 +357,15 @@ def sync_revisions(workspace_name, organization_name, initial_run):
     sorted_state_revisions = tfc_client.state_revisions(workspace.name, workspace.organization, current_local_state_id, initial_run)
     previous_state = None
     if len(sorted_state_revisions) > 0:
-        for state_info in sorted_state_revisions:
+        for ordinal, state_info in enumerate(sorted_state_revisions):
             this_state = State.vertices.update_or_create(
                 state_id=state_info['state_id'],
                 serial=state_info['serial'],
                 resource_count=state_info['resource_count'],
                 created_at=state_info['created_at'],
-                terraform_version=state_info['terraform_version']
+                terraform_version=state_info['terraform_version'],
+                owner_workspace_id=workspace.workspace_id,
+                ordinal=ordinal
             )
             # TODO: Does this break current state or does it work as already exists just updates.
             if previous_state:
@@ -181,6 +373,35 @@ def sync_revisions(workspace_name, organization_name, initial_run):
             previous_state = this_state
         total_revisions = len(sorted_state_revisions)
         logger.info(f'Created {total_revisions} revisions for {workspace_name}...')
+        workspace.mark_revisions_indexed()
+        workspace.update_summary()
+        bump_sync_generation()
+
+    _record_applies(workspace)
+    _record_run_durations(tfc_client, workspace, has_new_revisions=len(sorted_state_revisions) > 0)
+
+
+def _record_run_durations(tfc_client, workspace, has_new_revisions):
+    """Refresh how long the Workspace's runs take. Runs only change when there are new revisions, so the
+    runs are only fetched then, or if the Workspace has no recorded durations yet.
+    """
+    organization = TerraformCloudOrganization.objects.get(name=workspace.organization)
+    if not has_new_revisions and WorkspaceRunDuration.objects.filter(organization=organization, workspace_name=workspace.name).exists():
+        return
+    durations = tfc_client.run_durations(workspace.workspace_id, limit=settings.RUN_DURATION_SAMPLE_SIZE)
+    WorkspaceRunDuration.record(organization, workspace.name, durations)
+
+
+def _record_applies(workspace):
+    """Add any of the Workspace's revisions that haven't been counted yet to its apply rollups. Only the
+    revisions newer than the rollup cursor are read, so this is cheap when nothing has changed.
+    """
+    organization = TerraformCloudOrganization.objects.get(name=workspace.organization)
+    rolled_up_until = WorkspaceApplyRollupCursor.objects.filter(organization=organization, workspace_name=workspace.name) \
+        .values_list('rolled_up_until', flat=True).first()
+    applies = WorkspaceApplyRollup.record(organization, workspace.name, [r.created_at for r in workspace.revisions(since=rolled_up_until)])
+    if applies:
+        logger.info(f'Added {applies} applies to the rollups for {workspace.name}.')
 
 
 @shared_task(bind=True, max_retries=100, default_retry_delay=10)
@@ -198,15 +419,46 @@ def sync_workspace(self, workspace_info, sync_org_job_id=None):
             }
         sync_org_job_id (str): the unique id for the sync job.
     """
-    organization = TerraformCloudOrganization.objects.get(name=workspace_info['organization'])
+    lock = SyncLock(f'sync-workspace:{workspace_info["organization"]}:{workspace_info["name"]}', task_id=self.request.id)
+    if lock.acquire():
+        try:
+            _sync_workspace(self, workspace_info, sync_org_job_id)
+        finally:
+            lock.release()
+    else:
+        # Another sync for this Workspace is in flight, wait for it rather than repeating the work. Waiting
+        # (rather than returning straight away) means anything checking on this task sees it finish only
+        # once the Workspace has actually been synced. The wait is bounded so a long sync can't hold this
+        # worker, the task is retried instead.
+        logger.info(f'Sync already in progress for Workspace {workspace_info["name"]}, attaching to it.')
+        clear_in_flight(lock.name, self.request.id)
+        if not lock.wait(timeout=lock.ttl):
+            raise self.retry()
+
+    if sync_org_job_id:
+        OrganizationSyncJobCheckpoint.record(sync_org_job_id, workspace_info['name'], OrganizationSyncJob.DRAWING_LOCAL_GRAPH)
+
+
+def _sync_workspace(task, workspace_info, sync_org_job_id=None, tfc_client=None):
+    """Sync a single Workspace. When task is None (i.e. when running as part of a chunk) missing dependencies
+    are logged as broken rather than retried, as all Workspace Vertices are created before chunks run.
+    """
     if sync_org_job_id:
         sync_org_job = OrganizationSyncJob.objects.get(id=sync_org_job_id)   # TODO : Handle does not exist
-    tfc_client = TerraformCloudClient(api_key=organization.api_key.value)
+    if not tfc_client:
+        tfc_client = get_client(workspace_info['organization'])
 
     workspace_name = workspace_info['name']
 
     workspace_dict = tfc_client.workspace(workspace_name, workspace_info['organization'])
 
+    # Note what the Workspace depends on beforehand (None if it's new) so the dependency graph is only
+    # reloaded when it changes.
+    try:
+        previous_dependencies = set(Workspace.vertices.get(name=workspace_name, organization=workspace_info['organization']).get_dependencies())
+    except VertexDoesNotExistException:
+        previous_dependencies = None
+
     # Create the workspace.
     ws = Workspace.vertices.update_or_create(
         name=workspace_name,
@@ -243,6 +495,10 @@ def sync_workspace(self, workspace_info, sync_org_job_id=None):
                     rws = Workspace.vertices.get(name=required_workspace_name, organization=dependency_info['organization'])
                     ws.depends_on(rws, lookup_type=dependency_info['lookup_type'], redundant=dependency_info['redundant'])
                 except VertexDoesNotExistException:
+                    if task is None:
+                        logger.warning(f'Vertex did not exist for dependency {required_workspace_name} in {workspace_name}.')
+                        broken_dependencies.append({'name': required_workspace_name, 'organization': dependency_info['organization']})
+                        continue
                     res = AsyncResult(f'sync-workspace:' + required_workspace_name)
                     if not res.ready():
                         # This is overkill, will iterate over all dependencies even if only one isn't there.
@@ -270,9 +526,14 @@ def sync_workspace(self, workspace_info, sync_org_job_id=None):
                 logger.info(f'Removing existing dependency {existing_dependency} from {ws.name}')
                 ws.remove_dependency(Workspace.vertices.get(name=existing_dependency))
 
-    if sync_org_job_id:
+    ws.update_summary()
+    if set(ws.get_dependencies()) != previous_dependencies:
+        bump_dependency_generation()
+    record_search_change(ws.name)
+
+    if sync_org_job_id and task:
         # When a full organisation sync we can get broken Workspaces with bad dep links.
-        if self.request.retries == self.max_retries:
+        if task.request.retries == task.max_retries:
             # We're out of retries, just quickly check if we have any broken dependencies.
             current_workspaces = Workspace.vertices.count()
             expected_workspaces = sync_org_job.total_workspaces
@@ -287,4 +548,4 @@ def sync_workspace(self, workspace_info, sync_org_job_id=None):
                     except WorkspaceNotFoundException:
                         logger.error(f'Dependency {broken_dependency["name"]} does not exist. Has the Workspace been deleted?')
     if retry:
-        self.retry()
+        task.retry()
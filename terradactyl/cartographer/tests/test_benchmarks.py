@@ -0,0 +1,103 @@
+from django.test import SimpleTestCase, override_settings
+
+from benchmarks.compare import compare
+from benchmarks.fake_tfc import FakeTerraformCloud
+from benchmarks.synthetic import SyntheticOrganization
+from cartographer.utils.terraform_cloud import TerraformCloudClient, WorkspaceNotFoundException
+
+
+class TestSyntheticOrganization(SimpleTestCase):
+
+    def test_same_arguments_give_same_organization(self):
+        organization = SyntheticOrganization(workspaces=20, seed=3)
+        again = SyntheticOrganization(workspaces=20, seed=3)
+        self.assertEqual(organization.workspaces, again.workspaces)
+        self.assertEqual(organization.state('sv-00019-0003'), again.state('sv-00019-0003'))
+
+    def test_dependencies_are_acyclic(self):
+        organization = SyntheticOrganization(workspaces=20, fan_out=3)
+        for workspace in organization.workspaces:
+            self.assertTrue(all(dependency < workspace['name'] for dependency in workspace['depends_on']))
+        self.assertEqual(organization.workspaces[0]['depends_on'], [])
+        self.assertEqual(len(organization.workspaces[-1]['depends_on']), 3)
+
+    def test_state_unknown_id(self):
+        organization = SyntheticOrganization(workspaces=2, revisions=2)
+        self.assertIsNone(organization.state('sv-00002-0001'))
+        self.assertIsNone(organization.state('sv-00001-0003'))
+        self.assertIsNone(organization.state('not-a-state'))
+
+
+class TestFakeTerraformCloud(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.organization = SyntheticOrganization(name='happylittleorg', workspaces=120, fan_out=2, resources=10, revisions=25)
+        cls.server = FakeTerraformCloud(cls.organization)
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        with override_settings(TERRAFORM_CLOUD_URL=self.server.url):
+            self.client = TerraformCloudClient('happylittlekey')
+
+    def test_workspaces_paginated(self):
+        workspaces = self.client.workspaces('happylittleorg')
+        self.assertEqual([w['name'] for w in workspaces], [w['name'] for w in self.organization.workspaces])
+        self.assertEqual(workspaces[5]['id'], self.organization.workspaces[5]['id'])
+
+    def test_workspaces_listing_complete(self):
+        workspaces, complete = self.client.workspaces_listing('happylittleorg')
+        self.assertEqual(len(workspaces), 120)
+        self.assertTrue(complete)
+
+        workspaces, complete = self.client.workspaces_listing('nosuchorg')
+        self.assertEqual(workspaces, [])
+        self.assertFalse(complete)
+
+    def test_workspace_dependencies(self):
+        workspace = self.client.workspace('workspace-00010', 'happylittleorg')
+        self.assertEqual(workspace['current_state']['state_id'], 'sv-00010-0025')
+        depends_on = sorted(d['workspace_name'] for d in workspace['depends_on'].values())
+        self.assertEqual(depends_on, self.organization.workspace(name='workspace-00010')['depends_on'])
+        # Only every other remote state lookup is used.
+        self.assertEqual([d['redundant'] for _, d in sorted(workspace['depends_on'].items())], [False, True])
+
+    def test_workspace_not_found(self):
+        with self.assertRaises(WorkspaceNotFoundException):
+            self.client.workspace('workspace-99999', 'happylittleorg')
+
+    def test_resources(self):
+        resources = self.client.resources('happylittleorg', 'workspace-00010')['resources']
+        self.assertIn('aws_instance.r0', resources)
+        self.assertEqual(len([r for r in resources.values() if r['mode'] == 'managed']), 10)
+
+    def test_state_revisions_paginated(self):
+        revisions = self.client.state_revisions('workspace-00010', 'happylittleorg', initial_run=True)
+        self.assertEqual([r['serial'] for r in revisions], list(range(1, 26)))
+
+    def test_current_state_version_id(self):
+        self.assertEqual(self.client.current_state_version_id('workspace-00003', 'happylittleorg'), 'sv-00003-0025')
+
+    def test_run_durations(self):
+        self.assertEqual(self.client.run_durations(self.organization.workspaces[0]['id']), [60.0, 90.0, 120.0, 150.0, 180.0])
+
+    def test_requests_counted(self):
+        requests = self.server.requests
+        self.client.current_state_version_id('workspace-00003', 'happylittleorg')
+        self.assertEqual(self.server.requests, requests + 1)
+
+
+class TestCompare(SimpleTestCase):
+
+    def test_regressions(self):
+        baseline = {'targets': {'a': {'median': 1.0}, 'b': {'median': 2.0}, 'c': {'median': 1.0}}}
+        current = {'targets': {'a': {'median': 1.05}, 'b': {'median': 3.0}, 'd': {'median': 1.0}}}
+        comparisons = compare(baseline, current, threshold=0.1)
+        self.assertEqual([(target, regressed) for target, _, _, _, regressed in comparisons], [('a', False), ('b', True)])
+        self.assertAlmostEqual(comparisons[1][3], 0.5)
@@ -0,0 +1,113 @@
+from django.test import SimpleTestCase
+
+from cartographer.utils.dag import DependencyGraph, strongly_connected_components
+
+
+class TestStronglyConnectedComponents(SimpleTestCase):
+
+    def test_components_in_reverse_topological_order(self):
+        # 0 -> 1 -> 2 -> 1, 2 -> 3
+        component_of, components = strongly_connected_components(4, [[1], [2], [1, 3], []])
+        self.assertEqual(component_of[1], component_of[2])
+        self.assertEqual(len(components), 3)
+        self.assertLess(component_of[3], component_of[1])
+        self.assertLess(component_of[1], component_of[0])
+
+    def test_long_chain_does_not_recurse(self):
+        node_count = 5000
+        adjacency = [[n + 1] for n in range(node_count - 1)] + [[]]
+        _, components = strongly_connected_components(node_count, adjacency)
+        self.assertEqual(len(components), node_count)
+
+
+class TestDependencyGraph(SimpleTestCase):
+
+    def setUp(self):
+        # network depends on nothing, database and cluster depend on network, app depends on both.
+        self.graph = DependencyGraph(
+            ['network', 'database', 'cluster', 'app', 'lonely'],
+            [('database', 'network'), ('cluster', 'network'), ('app', 'database'), ('app', 'cluster')])
+
+    def test_impact(self):
+        impact = self.graph.impact('network')
+        self.assertEqual(impact['upstreams'], [
+            {'name': 'cluster', 'depth': 1},
+            {'name': 'database', 'depth': 1},
+            {'name': 'app', 'depth': 2}
+        ])
+        self.assertEqual(impact['downstreams'], [])
+        self.assertEqual(impact['cycle'], [])
+
+    def test_transitive_depends_on(self):
+        self.assertTrue(self.graph.depends_on('app', 'network'))
+        self.assertFalse(self.graph.depends_on('network', 'app'))
+        self.assertFalse(self.graph.depends_on('lonely', 'network'))
+
+    def test_cycles(self):
+        graph = DependencyGraph(['a', 'b', 'c'], [('a', 'b'), ('b', 'a'), ('c', 'a')])
+        self.assertEqual(graph.cycle('a'), ['b'])
+        self.assertTrue(graph.depends_on('a', 'b'))
+        self.assertTrue(graph.depends_on('b', 'a'))
+        self.assertEqual([u['name'] for u in graph.impact('a')['upstreams']], ['b', 'c'])
+        self.assertEqual([d['name'] for d in graph.impact('c')['downstreams']], ['a', 'b'])
+
+    def test_waves(self):
+        waves = self.graph.waves()
+        self.assertEqual(waves['waves'], [['lonely', 'network'], ['cluster', 'database'], ['app']])
+        self.assertEqual(waves['cycles'], [])
+
+    def test_waves_longest_path(self):
+        # app depends on network directly and through database, so it has to wait for database.
+        graph = DependencyGraph(['network', 'database', 'app'], [('database', 'network'), ('app', 'network'), ('app', 'database')])
+        self.assertEqual(graph.waves()['waves'], [['network'], ['database'], ['app']])
+
+    def test_waves_with_cycle(self):
+        graph = DependencyGraph(['a', 'b', 'c', 'd'], [('a', 'b'), ('b', 'a'), ('a', 'c'), ('d', 'b')])
+        waves = graph.waves()
+        self.assertEqual(waves['waves'], [['c'], ['a', 'b'], ['d']])
+        self.assertEqual(waves['cycles'], [['a', 'b']])
+
+    def test_waves_for_organization(self):
+        graph = DependencyGraph(
+            ['network', 'app', 'other'], [('app', 'network'), ('other', 'app')],
+            organizations={'network': 'infra', 'app': 'product', 'other': 'product'})
+        self.assertEqual(graph.waves(organization='product')['waves'], [['app'], ['other']])
+
+    def test_run_order(self):
+        self.assertEqual(self.graph.run_order(['app', 'network', 'database']), ['network', 'database', 'app'])
+
+    def test_plan(self):
+        durations = {'network': 100, 'database': 600, 'cluster': 300, 'app': 50}
+        plan = self.graph.plan(durations, default_duration=10)
+        self.assertEqual(plan['total_duration'], 750)
+        self.assertEqual([e['name'] for e in plan['critical_path']], ['network', 'database', 'app'])
+        schedule = {e['name']: e for e in plan['schedule']}
+        self.assertEqual(schedule['cluster']['start'], 100)
+        self.assertEqual(schedule['app']['start'], 700)
+        self.assertEqual(schedule['lonely']['finish'], 10)
+
+    def test_plan_for_target(self):
+        plan = self.graph.plan({'network': 100, 'database': 600}, default_duration=10, target='cluster')
+        self.assertEqual(sorted(e['name'] for e in plan['schedule']), ['cluster', 'network'])
+        self.assertEqual(plan['total_duration'], 110)
+
+    def test_plan_with_cycle(self):
+        graph = DependencyGraph(['a', 'b', 'c'], [('a', 'b'), ('b', 'a'), ('c', 'a')])
+        plan = graph.plan({'a': 10, 'b': 20, 'c': 5}, default_duration=0)
+        self.assertEqual(plan['total_duration'], 35)
+        self.assertEqual([e['name'] for e in plan['critical_path']], ['a', 'b', 'c'])
+
+    def test_list_cycles(self):
+        edges = [('a', 'b'), ('b', 'c'), ('c', 'a'), ('d', 'e'), ('e', 'd'), ('f', 'a')]
+        edge_types = {edge: 'terraform_remote_state' for edge in edges}
+        edge_types[('c', 'a')] = 'tfe_outputs'
+        graph = DependencyGraph(['a', 'b', 'c', 'd', 'e', 'f'], edges, edge_types=edge_types)
+
+        cycles = graph.cycles()
+        self.assertEqual([c['workspaces'] for c in cycles], [['a', 'b', 'c'], ['d', 'e']])
+        self.assertEqual(cycles[0]['edges'], [
+            {'source': 'a', 'target': 'b', 'type': 'terraform_remote_state'},
+            {'source': 'b', 'target': 'c', 'type': 'terraform_remote_state'},
+            {'source': 'c', 'target': 'a', 'type': 'tfe_outputs'}
+        ])
+        self.assertEqual(self.graph.cycles(), [])
@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from cartographer.utils.garbage import drop_in_batches, plan_collection
+
+DAY = 86400
+NOW = 100 * DAY
+
+
+def _revision(state_id, ordinal, days_ago, has_resources=0, workspace_id='ws-1'):
+    return {'state_id': state_id, 'owner_workspace_id': workspace_id, 'ordinal': ordinal,
+            'created_at': NOW - days_ago * DAY, 'has_resources': has_resources}
+
+
+class TestPlanCollection(SimpleTestCase):
+
+    def setUp(self):
+        self.revisions = [
+            _revision('s0', 0, days_ago=40, has_resources=1),
+            _revision('s1', 1, days_ago=30),
+            _revision('s2', 2, days_ago=20, has_resources=1),
+            _revision('s3', 3, days_ago=10),
+            _revision('s4', 4, days_ago=1)
+        ]
+
+    def test_keeps_every_revision_by_default(self):
+        plan = plan_collection(self.revisions, keep_revisions=0, keep_seconds=0, now=NOW)
+        self.assertEqual(plan, {'ws-1': {'states': [], 'resource_states': ['s0']}})
+
+    def test_keep_revisions(self):
+        plan = plan_collection(self.revisions, keep_revisions=2, keep_seconds=0, now=NOW)
+        # s2 holds the Workspace's Resources so is kept regardless.
+        self.assertEqual(plan['ws-1']['states'], ['s1', 's0'])
+
+    def test_keep_seconds(self):
+        plan = plan_collection(self.revisions, keep_revisions=0, keep_seconds=25 * DAY, now=NOW)
+        self.assertEqual(plan['ws-1']['states'], ['s1', 's0'])
+
+    def test_kept_by_either_policy(self):
+        plan = plan_collection(self.revisions, keep_revisions=4, keep_seconds=35 * DAY, now=NOW)
+        self.assertEqual(plan['ws-1']['states'], ['s0'])
+
+    def test_always_keeps_current_revision(self):
+        plan = plan_collection([_revision('s0', 0, days_ago=400)], keep_revisions=0, keep_seconds=DAY, now=NOW)
+        self.assertEqual(plan, {})
+
+    def test_planned_per_workspace(self):
+        revisions = self.revisions + [_revision('t0', 0, days_ago=5, has_resources=1, workspace_id='ws-2')]
+        plan = plan_collection(revisions, keep_revisions=1, keep_seconds=0, now=NOW)
+        self.assertNotIn('ws-2', plan)
+        self.assertEqual(plan['ws-1']['states'], ['s3', 's1', 's0'])
+
+
+class TestDropInBatches(SimpleTestCase):
+
+    def test_drops_until_batch_not_full(self):
+        batches = [[1, 2], [3, 4], [5]]
+        query = mock.Mock()
+        query.return_value.limit.return_value.id_.return_value.toList.side_effect = batches
+        with mock.patch('cartographer.utils.garbage.Gizmo') as gizmo:
+            self.assertEqual(drop_in_batches(query, batch_size=2), 5)
+        self.assertEqual([c.args for c in gizmo.return_value.g.V.call_args_list], [(1, 2), (3, 4), (5,)])
+
+    def test_dry_run_only_counts(self):
+        query = mock.Mock()
+        query.return_value.count.return_value.next.return_value = 7
+        with mock.patch('cartographer.utils.garbage.Gizmo') as gizmo:
+            self.assertEqual(drop_in_batches(query, batch_size=2, dry_run=True), 7)
+        gizmo.assert_not_called()
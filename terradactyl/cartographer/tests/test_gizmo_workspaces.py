@@ -1,6 +1,8 @@
 import datetime
 import time
 
+from unittest import mock
+
 from django.test import TestCase
 
 from gremlin_python.driver.driver_remote_connection import DriverRemoteConnection
@@ -8,8 +10,10 @@ from gremlin_python.process.graph_traversal import __
 from gremlin_python.structure.graph import Graph
 
 
-from cartographer.gizmo.models import State, Workspace
+from cartographer.gizmo.models import Resource, State, Workspace
 from cartographer.gizmo.models.exceptions import VertexDoesNotExistException
+from cartographer.gizmo.models.state import PROPERTIES as STATE_PROPERTIES
+from cartographer.utils import garbage
 
 LUT_TERRAFORM_REMOTE_STATE = 'terraform_remote_state'
 LUT_TFE_OUTPUTS = 'tfe_outputs'
@@ -417,4 +421,158 @@ class TestGizmoWorkspaces(TestCase):
         group_counts = Workspace.vertices.count_by_current_rev('terraform_version')
         self.assertEqual(group_counts['0.12.3'], 1)
         self.assertEqual(group_counts['0.13.0'], expected_013_count)
-        self.assertEqual(group_counts['1.2.0'], expected_12_count)
\ No newline at end of file
+        self.assertEqual(group_counts['1.2.0'], expected_12_count)
+
+    def test_workspace_update_summary(self):
+        expected_created_at = time.time()
+        ws = Workspace.vertices.create(workspace_id='1234', name='foo', organization='happylittleorg', created_at=expected_created_at)
+        dependency = Workspace.vertices.create(workspace_id='5678', name='bar', organization='happylittleorg', created_at=expected_created_at)
+        redundant_dependency = Workspace.vertices.create(workspace_id='9012', name='baz', organization='happylittleorg', created_at=expected_created_at)
+        ws.depends_on(dependency, lookup_type=LUT_TERRAFORM_REMOTE_STATE)
+        ws.depends_on(redundant_dependency, lookup_type=LUT_TFE_OUTPUTS, redundant=True)
+
+        previous_state = State.vertices.create(state_id='1', resource_count=10, serial=1, terraform_version='1.1.0', created_at=expected_created_at)
+        current_state = State.vertices.create(state_id='2', resource_count=12, serial=2, terraform_version='1.2.0', created_at=expected_created_at)
+        ws.has_current_state(current_state)
+        current_state.succeeded(previous_state)
+
+        self.assertIsNone(Workspace.vertices.get(name='foo', organization='happylittleorg').summary)
+
+        ws.update_summary()
+
+        summary = Workspace.vertices.get(name='foo', organization='happylittleorg').summary
+        self.assertEqual(summary['terraform_version'], '1.2.0')
+        self.assertEqual(summary['serial'], 2)
+        self.assertEqual(summary['resource_count'], 12)
+        self.assertEqual(summary['dependency_count'], 2)
+        self.assertEqual(summary['redundant_dependency_count'], 1)
+        self.assertEqual(summary['revision_count'], 2)
+
+    @mock.patch('cartographer.utils.garbage.record_search_change')
+    @mock.patch('cartographer.utils.garbage.bump_dependency_generation')
+    def test_drop_workspaces_updates_dependant_summaries(self, *_):
+        ws = Workspace.vertices.create(workspace_id='1234', name='foo', organization='happylittleorg', created_at=time.time())
+        for workspace_id, name in [('5678', 'bar'), ('9012', 'baz')]:
+            ws.depends_on(Workspace.vertices.create(workspace_id=workspace_id, name=name, organization='happylittleorg', created_at=time.time()),
+                          lookup_type=LUT_TERRAFORM_REMOTE_STATE)
+        ws.update_summary()
+
+        garbage.drop_workspaces('happylittleorg', ['bar'])
+
+        self.assertEqual(Workspace.vertices.get(name='foo', organization='happylittleorg').summary['dependency_count'], 1)
+
+    def test_workspace_summary_defaults_without_state(self):
+        ws = Workspace.vertices.create(workspace_id='1234', name='foo', organization='happylittleorg', created_at=time.time())
+        summary = ws.get_summary()
+        self.assertEqual(summary['terraform_version'], 'N/A')
+        self.assertEqual(summary['revision_count'], 0)
+
+    def test_workspace_terraform_versions(self):
+        for i, version in enumerate(['1.2.0', '1.2.0', '0.13.0']):
+            ws = Workspace.vertices.create(workspace_id=str(i), name=f'foo_{i}', organization='happylittleorg', created_at=time.time())
+            state = State.vertices.create(state_id=str(i), resource_count=1, serial=1, terraform_version=version, created_at=time.time())
+            ws.has_current_state(state)
+            if i:
+                ws.update_summary()
+        Workspace.vertices.create(workspace_id='3', name='foo_3', organization='otherorg', created_at=time.time())
+
+        # foo_0 has no summary so its version is read from its current state.
+        self.assertEqual(Workspace.vertices.count_by_terraform_version(), {'1.2.0': 2, '0.13.0': 1, 'N/A': 1})
+        self.assertEqual(Workspace.vertices.count_by_terraform_version(organization='otherorg'), {'N/A': 1})
+
+        workspaces = Workspace.vertices.terraform_versions(terraform_version='1.2.0')
+        self.assertEqual([w['name'] for w in workspaces], ['foo_0', 'foo_1'])
+        workspaces = Workspace.vertices.terraform_versions(start=1, end=3)
+        self.assertEqual([(w['name'], w['terraform_version']) for w in workspaces], [('foo_1', '1.2.0'), ('foo_2', '0.13.0')])
+
+    def test_workspace_resource_graphs(self):
+        ws = Workspace.vertices.create(workspace_id='1234', name='foo', organization='happylittleorg', created_at=time.time())
+        state = State.vertices.create(state_id='1', resource_count=2, serial=1, terraform_version='1.2.0', created_at=time.time())
+        ws.has_current_state(state)
+        for namespace in ['aws_vpc.main', 'aws_subnet.private']:
+            state.contains(Resource.vertices.create(state_id='1', name=namespace.split('.')[1], resource_type=namespace.split('.')[0], namespace=namespace, mode='managed'))
+        state.set_resource_dependencies({'aws_subnet.private': ['aws_vpc.main']})
+
+        graphs = Workspace.vertices.resource_graphs(['foo'])
+        self.assertEqual(len(graphs), 1)
+        self.assertEqual(graphs[0]['state_id'], '1')
+        self.assertEqual(sorted(r.namespace for r in graphs[0]['resources']), ['aws_subnet.private', 'aws_vpc.main'])
+        self.assertEqual(graphs[0]['dependencies'], {'aws_subnet.private': ['aws_vpc.main']})
+
+    def test_resource_dependencies_dropped(self):
+        ws = Workspace.vertices.create(workspace_id='1234', name='foo', organization='happylittleorg', created_at=time.time())
+        state = State.vertices.create(state_id='1', resource_count=2, serial=1, terraform_version='1.2.0', created_at=time.time())
+        ws.has_current_state(state)
+        state.set_resource_dependencies({'aws_subnet.private': ['aws_vpc.main']})
+        self.assertNotIn('resource_dependencies', self.g.V().hasLabel(State.label).has('state_id', '1').elementMap(*STATE_PROPERTIES).next())
+
+        State.vertices.drop_resource_dependencies('1')
+        self.assertNotIn('resource_dependencies', self.g.V().hasLabel(State.label).has('state_id', '1').elementMap().next())
+        self.assertEqual(ws.get_current_state_revision().state_id, '1')
+
+    def test_resources_carried_forward(self):
+        ws = Workspace.vertices.create(workspace_id='1234', name='foo', organization='happylittleorg', created_at=time.time())
+        for serial in range(2):
+            state = State.vertices.create(state_id=str(serial), resource_count=1, serial=serial, terraform_version='1.2.0', created_at=1000 + serial)
+            ws.has_current_state(state)
+
+        def resource(name, *iids):
+            return {'name': name, 'resource_type': 'aws_instance', 'mode': 'managed', 'provider': 'aws',
+                    'instances': [{'index_key': i, 'iid': iid} for i, iid in enumerate(iids)]}
+
+        Resource.vertices.bulk_create('0', {'aws_instance.a': resource('a', 'i-1'), 'aws_instance.b': resource('b', 'i-2', 'i-3')})
+        self.assertEqual(ws.get_resources_state_id(), '0')
+        self.assertEqual(Resource.vertices.snapshot('0')['aws_instance.b']['instances'], [[0, 'i-2'], [1, 'i-3']])
+        self.assertEqual(Resource.vertices.snapshot('0')['aws_instance.b']['provider'], 'aws')
+
+        Resource.vertices.carry_forward('0', '1', ['aws_instance.a', 'aws_instance.b'])
+        Resource.vertices.move('1', {'aws_instance.a': 'aws_instance.c'}, {'aws_instance.c': resource('c', 'i-1')})
+        Resource.vertices.replace_instances('1', {'aws_instance.b': resource('b', 'i-4')})
+
+        self.assertEqual(ws.get_resources_state_id(), '1')
+        self.assertEqual(Resource.vertices.snapshot('0'), {})
+        snapshot = Resource.vertices.snapshot('1')
+        self.assertEqual(sorted(snapshot), ['aws_instance.b', 'aws_instance.c'])
+        self.assertEqual(snapshot['aws_instance.b']['instances'], [[0, 'i-4']])
+
+        Resource.vertices.bulk_drop('1', ['aws_instance.b'])
+        self.assertEqual(sorted(Resource.vertices.snapshot('1')), ['aws_instance.c'])
+
+    def test_workspace_revisions_range(self):
+        ws = Workspace.vertices.create(workspace_id='1234', name='foo', organization='happylittleorg', created_at=time.time())
+        for serial in range(5):
+            state = State.vertices.create(state_id=str(serial), resource_count=serial, serial=serial, terraform_version='1.2.0', created_at=1000 + serial)
+            ws.has_current_state(state)
+
+        self.assertEqual([r.state_id for r in ws.revisions()], ['4', '3', '2', '1', '0'])
+        self.assertEqual([r.state_id for r in ws.revisions(since=1001, until=1003)], ['3', '2', '1'])
+        self.assertEqual([r.state_id for r in ws.revisions(limit=2)], ['4', '3'])
+        self.assertEqual([r.state_id for r in ws.get_state_revisions()], ['3', '2', '1', '0'])
+        self.assertEqual(ws.get_first_revision().state_id, '0')
+        self.assertEqual(ws.get_total_revision_count(), 5)
+
+    def test_workspace_revisions_indexes_unindexed_history(self):
+        workspace_v = self.g.addV(Workspace.label) \
+            .property('workspace_id', '1234') \
+            .property('name', 'foo') \
+            .property('organization', 'happylittleorg') \
+            .property('created_at', time.time()) \
+            .property('last_updated', time.time()).next()
+
+        previous_state_v = None
+        for serial in range(3):
+            state_v = self.g.addV(State.label) \
+                .property('state_id', str(serial)) \
+                .property('resource_count', serial) \
+                .property('serial', serial) \
+                .property('terraform_version', '1.2.0') \
+                .property('created_at', 1000 + serial).next()
+            if previous_state_v:
+                self.g.V(state_v).addE('succeeded').to(__.V(previous_state_v)).iterate()
+            previous_state_v = state_v
+        self.g.V(workspace_v).addE('has_current_state').to(__.V(previous_state_v)).iterate()
+
+        ws = Workspace.vertices.get(name='foo', organization='happylittleorg')
+        self.assertFalse(ws.revisions_indexed)
+        self.assertEqual([r.ordinal for r in ws.revisions()], [2, 1, 0])
+        self.assertTrue(Workspace.vertices.get(name='foo', organization='happylittleorg').revisions_indexed)
@@ -0,0 +1,29 @@
+from django.test import SimpleTestCase
+
+from cartographer.utils.growth import SECONDS_PER_DAY, growth_series
+
+DAY_1 = 100 * SECONDS_PER_DAY
+DAY_2 = DAY_1 + SECONDS_PER_DAY
+
+
+class TestGrowthSeries(SimpleTestCase):
+
+    def test_no_revisions(self):
+        self.assertEqual(growth_series([], [], []), ([], []))
+
+    def test_single_workspace_tracks_resource_count(self):
+        days, counts = growth_series([DAY_1 + 10, DAY_1 + 20, DAY_2], ['ws-1'] * 3, [5, 8, 6])
+        self.assertEqual(days, [DAY_1, DAY_2])
+        self.assertEqual(counts, [8, 6])
+
+    def test_workspaces_are_summed(self):
+        days, counts = growth_series(
+            [DAY_1, DAY_2, DAY_1 + 5, DAY_2 + 5],
+            ['ws-1', 'ws-1', 'ws-2', 'ws-2'],
+            [10, 12, 3, 1])
+        self.assertEqual(days, [DAY_1, DAY_2])
+        self.assertEqual(counts, [13, 13])
+
+    def test_revisions_out_of_order(self):
+        days, counts = growth_series([DAY_2, DAY_1], ['ws-1', 'ws-1'], [7, 4])
+        self.assertEqual(counts, [4, 7])
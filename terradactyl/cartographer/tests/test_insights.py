@@ -0,0 +1,56 @@
+import calendar
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from cartographer.models import TerraformCloudOrganization, WorkspaceApplyRollup
+
+
+def _timestamp(year, month, day, hour=12):
+    return calendar.timegm(datetime.datetime(year, month, day, hour).timetuple())
+
+
+class TestWorkspaceApplyRollup(TestCase):
+
+    def setUp(self):
+        self.org = TerraformCloudOrganization.objects.create(name='happylittleorg')
+
+    def test_record_counts_applies_per_day(self):
+        added = WorkspaceApplyRollup.record(self.org, 'foo', [_timestamp(2022, 7, 1, 9), _timestamp(2022, 7, 1, 17), _timestamp(2022, 7, 2)])
+        self.assertEqual(added, 3)
+        self.assertEqual(WorkspaceApplyRollup.objects.get(workspace_name='foo', day=datetime.date(2022, 7, 1)).apply_count, 2)
+        self.assertEqual(WorkspaceApplyRollup.objects.get(workspace_name='foo', day=datetime.date(2022, 7, 2)).apply_count, 1)
+
+    def test_record_only_counts_new_applies(self):
+        WorkspaceApplyRollup.record(self.org, 'foo', [_timestamp(2022, 7, 1, 9)])
+        added = WorkspaceApplyRollup.record(self.org, 'foo', [_timestamp(2022, 7, 1, 9), _timestamp(2022, 7, 1, 17)])
+        self.assertEqual(added, 1)
+        self.assertEqual(WorkspaceApplyRollup.objects.get(workspace_name='foo', day=datetime.date(2022, 7, 1)).apply_count, 2)
+
+
+class TestDailyChange(TestCase):
+
+    def setUp(self):
+        User.objects.create_user(username='bob', password='ross')
+        self.client.login(username='bob', password='ross')
+        org = TerraformCloudOrganization.objects.create(name='happylittleorg')
+        other_org = TerraformCloudOrganization.objects.create(name='happylittletrees')
+        WorkspaceApplyRollup.record(org, 'foo', [_timestamp(2022, 6, 30), _timestamp(2022, 7, 1), _timestamp(2022, 7, 2)])
+        WorkspaceApplyRollup.record(org, 'bar', [_timestamp(2022, 7, 1)])
+        WorkspaceApplyRollup.record(other_org, 'baz', [_timestamp(2022, 7, 1)])
+
+    def test_daily_change(self):
+        data = self.client.get('/api/v1/insights/daily-change').json()
+        self.assertEqual(data['daily_change'][str(_timestamp(2022, 7, 1, 0))], 3)
+        self.assertEqual(data['stats']['2022-06'], 1)
+        self.assertEqual(data['stats']['2022-07'], 4)
+        self.assertEqual(data['stats']['avg_monthly_applies'], 2.5)
+
+    def test_daily_change_filters(self):
+        data = self.client.get('/api/v1/insights/daily-change', {'organization': 'happylittleorg', 'since': '2022-07-01', 'until': '2022-07-01'}).json()
+        self.assertEqual(data['daily_change'], {str(_timestamp(2022, 7, 1, 0)): 2})
+
+    def test_daily_change_invalid_date(self):
+        response = self.client.get('/api/v1/insights/daily-change', {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,26 @@
+from django.test import TestCase
+
+from cartographer.models import StateInstanceCount, TerraformCloudOrganization
+
+
+class TestStateInstanceCount(TestCase):
+
+    def setUp(self):
+        self.org = TerraformCloudOrganization.objects.create(name='happylittleorg')
+        StateInstanceCount.record(self.org, 'network', 'sv-1', {('aws', 'aws_subnet'): 30, ('aws', 'aws_vpc'): 1})
+        StateInstanceCount.record(self.org, 'dns', 'sv-2', {('aws', 'aws_route53_record'): 200, ('cloudflare', 'cloudflare_record'): 5})
+
+    def test_count_by(self):
+        self.assertEqual(StateInstanceCount.count_by('provider'), {'aws': 231, 'cloudflare': 5})
+        self.assertEqual(StateInstanceCount.count_by('resource_type')['aws_route53_record'], 200)
+        self.assertEqual(StateInstanceCount.total(), 236)
+
+    def test_record_replaces_the_states_counts(self):
+        StateInstanceCount.record(self.org, 'network', 'sv-1', {('aws', 'aws_vpc'): 2})
+        self.assertEqual(StateInstanceCount.count_by('resource_type').get('aws_subnet'), None)
+        self.assertEqual(StateInstanceCount.total(), 207)
+
+    def test_record_replaces_the_workspaces_previous_state(self):
+        StateInstanceCount.record(self.org, 'network', 'sv-3', {('aws', 'aws_vpc'): 1})
+        self.assertFalse(StateInstanceCount.objects.filter(state_id='sv-1').exists())
+        self.assertEqual(StateInstanceCount.total(), 206)
@@ -0,0 +1,47 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+EDGES = [
+    {'source': 'app', 'target': 'network', 'type': 'terraform_remote_state', 'organization': 'happylittleorg'},
+    {'source': 'cluster', 'target': 'network', 'type': 'tfe_outputs', 'organization': 'happylittleorg'},
+    {'source': 'app', 'target': 'dns', 'type': 'tfe_outputs', 'organization': 'happylittletrees'},
+]
+
+
+@mock.patch('cartographer.apis.workspaces.cached_for_generation', side_effect=lambda name, compute: EDGES)
+class TestRedundantDependencies(TestCase):
+
+    def setUp(self):
+        User.objects.create_user(username='bob', password='ross')
+        self.client.login(username='bob', password='ross')
+
+    def _get(self, **params):
+        params = {
+            'draw': 1,
+            'start': 0,
+            'length': 25,
+            'columns[0][name]': 'source',
+            'columns[1][name]': 'target',
+            'columns[2][name]': 'type',
+            'columns[3][name]': 'organization',
+            **params
+        }
+        return self.client.get('/api/v1/dt/redundant-dependencies', params).json()
+
+    def test_lists_every_redundant_edge(self, _):
+        response = self._get(**{'order[0][column]': 1, 'order[0][dir]': 'asc'})
+        self.assertEqual(response['recordsTotal'], 3)
+        self.assertEqual(response['data'][0], ['app', 'dns', 'tfe_outputs', 'happylittletrees'])
+        self.assertEqual([row[1] for row in response['data']], ['dns', 'network', 'network'])
+
+    def test_sorts_descending(self, _):
+        response = self._get(**{'order[0][column]': 0, 'order[0][dir]': 'desc'})
+        self.assertEqual([row[0] for row in response['data']], ['cluster', 'app', 'app'])
+
+    def test_search_and_page(self, _):
+        response = self._get(**{'search[value]': 'network', 'length': 1, 'start': 1})
+        self.assertEqual(response['recordsTotal'], 3)
+        self.assertEqual(response['recordsFiltered'], 2)
+        self.assertEqual(response['data'], [['cluster', 'network', 'tfe_outputs', 'happylittleorg']])
@@ -0,0 +1,50 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from cartographer.models import ResourceInstanceOwner, TerraformCloudOrganization
+
+
+class TestResourceInstanceOwner(TestCase):
+
+    def setUp(self):
+        self.org = TerraformCloudOrganization.objects.create(name='happylittleorg')
+
+    def test_replace_swaps_a_workspaces_instances(self):
+        ResourceInstanceOwner.replace(self.org, 'network', 'sv-1', [('vpc-1', 'aws_vpc.main'), ('subnet-1', 'aws_subnet.a')])
+        ResourceInstanceOwner.replace(self.org, 'cluster', 'sv-2', [('eks-1', 'aws_eks_cluster.main')])
+        added = ResourceInstanceOwner.replace(self.org, 'network', 'sv-3', [('vpc-1', 'aws_vpc.main'), ('vpc-1', 'aws_vpc.main')])
+
+        self.assertEqual(added, 1)
+        self.assertEqual(ResourceInstanceOwner.objects.get(iid='vpc-1').state_id, 'sv-3')
+        self.assertFalse(ResourceInstanceOwner.objects.filter(iid='subnet-1').exists())
+        self.assertTrue(ResourceInstanceOwner.objects.filter(iid='eks-1').exists())
+
+
+class TestResourceOwnersApi(TestCase):
+
+    def setUp(self):
+        User.objects.create_user(username='bob', password='ross')
+        self.client.login(username='bob', password='ross')
+        org = TerraformCloudOrganization.objects.create(name='happylittleorg')
+        ResourceInstanceOwner.replace(org, 'network', 'sv-1', [('vpc-1', 'aws_vpc.main'), ('zone-1', 'aws_route53_zone.main')])
+        ResourceInstanceOwner.replace(org, 'dns', 'sv-2', [('zone-1', 'aws_route53_zone.imported')])
+
+    def test_lookup_many_ids(self):
+        response = self.client.get('/api/v1/resources/owners', {'iids': 'vpc-1,zone-1,i-unknown'}).json()
+        self.assertEqual(response['owners']['vpc-1'], [
+            {'organization': 'happylittleorg', 'workspace': 'network', 'state_id': 'sv-1', 'namespace': 'aws_vpc.main'}
+        ])
+        self.assertEqual([o['workspace'] for o in response['owners']['zone-1']], ['dns', 'network'])
+        self.assertEqual(response['shared'], ['zone-1'])
+        self.assertEqual(response['unmanaged'], ['i-unknown'])
+
+    def test_lookup_by_post(self):
+        response = self.client.post('/api/v1/resources/owners', json.dumps({'iids': ['vpc-1']}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['owners']['vpc-1'][0]['workspace'], 'network')
+
+    def test_bad_body(self):
+        response = self.client.post('/api/v1/resources/owners', json.dumps({'iids': 'vpc-1'}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
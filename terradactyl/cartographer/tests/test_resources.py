@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+
+from cartographer.utils.resources import diff_resources, instance_keys, resource_changed
+
+
+def _resource(resource_type, *iids):
+    return {'resource_type': resource_type, 'instances': [{'index_key': i, 'iid': iid} for i, iid in enumerate(iids)]}
+
+
+class TestDiffResources(SimpleTestCase):
+
+    def test_instance_keys_compare_dicts_and_pairs(self):
+        self.assertEqual(instance_keys([{'index_key': 0, 'iid': 'i-1'}]), instance_keys([[0, 'i-1']]))
+
+    def test_diff(self):
+        previous = {
+            'aws_vpc.main': _resource('aws_vpc', 'vpc-1'),
+            'aws_subnet.private': _resource('aws_subnet', 'subnet-1', 'subnet-2'),
+            'aws_instance.old': _resource('aws_instance', 'i-1'),
+            'aws_s3_bucket.logs': _resource('aws_s3_bucket', 'logs'),
+        }
+        current = {
+            'aws_vpc.main': _resource('aws_vpc', 'vpc-1'),
+            'aws_subnet.private': _resource('aws_subnet', 'subnet-1', 'subnet-2', 'subnet-3'),
+            'module.storage.aws_s3_bucket.logs': _resource('aws_s3_bucket', 'logs'),
+            'aws_instance.new': _resource('aws_instance', 'i-2'),
+        }
+        self.assertEqual(diff_resources(previous, current), {
+            'unchanged': ['aws_vpc.main'],
+            'changed': ['aws_subnet.private'],
+            'moved': {'aws_s3_bucket.logs': 'module.storage.aws_s3_bucket.logs'},
+            'added': ['aws_instance.new'],
+            'removed': ['aws_instance.old']
+        })
+
+    def test_provider_or_mode_change(self):
+        previous = {
+            'aws_vpc.main': dict(_resource('aws_vpc', 'vpc-1'), name='main', mode='managed', provider='registry.terraform.io/hashicorp/aws'),
+            'aws_subnet.private': dict(_resource('aws_subnet', 'subnet-1'), name='private', mode='managed', provider=None),
+        }
+        current = {
+            'aws_vpc.main': dict(_resource('aws_vpc', 'vpc-1'), name='main', mode='managed', provider='registry.terraform.io/hashicorp/aws.east'),
+            'aws_subnet.private': dict(_resource('aws_subnet', 'subnet-1'), name='private', mode='managed', provider='registry.terraform.io/hashicorp/aws'),
+        }
+        diff = diff_resources(previous, current)
+        self.assertEqual(diff['changed'], ['aws_vpc.main'])
+        self.assertEqual(diff['unchanged'], ['aws_subnet.private'])
+        self.assertTrue(resource_changed(dict(previous['aws_vpc.main'], mode='data'), previous['aws_vpc.main']))
+
+    def test_first_sync_adds_everything(self):
+        diff = diff_resources({}, {'aws_vpc.main': _resource('aws_vpc', 'vpc-1')})
+        self.assertEqual(diff['added'], ['aws_vpc.main'])
+        self.assertEqual(diff['moved'], {})
+
+
+@mock.patch('cartographer.apis.workspaces.Workspace')
+class TestRefreshWorkspaceResources(TestCase):
+
+    def setUp(self):
+        User.objects.create_user(username='bob', password='ross')
+        self.client.login(username='bob', password='ross')
+
+    def test_refresh_enqueued_not_run_inline(self, mock_workspace):
+        workspace = mock_workspace.vertices.get.return_value
+        workspace.name, workspace.organization = 'app', 'happylittleorg'
+        mock_workspace.vertices.resource_graphs.return_value = []
+
+        with mock.patch('cartographer.apis.workspaces.coalesce') as mock_coalesce, \
+                mock.patch('cartographer.tasks.terraform_cloud._sync_resources') as mock_sync_resources:
+            mock_coalesce.return_value.id = 'a-task-id'
+            response = self.client.get('/api/v1/g/workspaces/app/resources', {'refresh': 'true'}).json()
+
+        self.assertEqual(response['task'], 'a-task-id')
+        self.assertEqual(mock_coalesce.call_args.args[0], 'sync-resources:happylittleorg:app')
+        mock_sync_resources.assert_not_called()
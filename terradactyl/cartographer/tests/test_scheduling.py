@@ -0,0 +1,46 @@
+from django.test import SimpleTestCase
+
+from cartographer.utils.scheduling import check_interval
+
+MIN_INTERVAL = 300
+MAX_INTERVAL = 86400
+HISTORY_WINDOW = 30 * 86400
+CHECKS_PER_APPLY = 4
+NOW = 1700000000.0
+
+
+class TestCheckInterval(SimpleTestCase):
+
+    def _check_interval(self, apply_timestamps):
+        return check_interval(
+            apply_timestamps,
+            now=NOW,
+            min_interval=MIN_INTERVAL,
+            max_interval=MAX_INTERVAL,
+            history_window=HISTORY_WINDOW,
+            checks_per_apply=CHECKS_PER_APPLY)
+
+    def test_no_applies_uses_max_interval(self):
+        self.assertEqual(self._check_interval([]), MAX_INTERVAL)
+
+    def test_applies_outside_window_uses_max_interval(self):
+        self.assertEqual(self._check_interval([NOW - HISTORY_WINDOW - 1]), MAX_INTERVAL)
+
+    def test_hot_workspace_uses_min_interval(self):
+        # An apply every minute for the last hour.
+        apply_timestamps = [NOW - (i * 60) for i in range(1, 61)]
+        self.assertEqual(self._check_interval(apply_timestamps), MIN_INTERVAL)
+
+    def test_interval_is_fraction_of_average_gap(self):
+        # An apply every 4 hours for the last day.
+        apply_timestamps = [NOW - (i * 4 * 3600) for i in range(1, 7)]
+        self.assertEqual(self._check_interval(apply_timestamps), 3600)
+
+    def test_quiet_workspace_drifts_towards_max_interval(self):
+        busy = [NOW - 3600 - (i * 600) for i in range(10)]
+        gone_quiet = [t - (5 * 86400) for t in busy]
+        self.assertGreater(self._check_interval(gone_quiet), self._check_interval(busy))
+
+    def test_string_timestamps(self):
+        apply_timestamps = [str(NOW - (i * 4 * 3600)) for i in range(1, 7)]
+        self.assertEqual(self._check_interval(apply_timestamps), 3600)
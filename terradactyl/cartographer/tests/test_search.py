@@ -0,0 +1,70 @@
+from django.test import SimpleTestCase
+
+from cartographer.utils.search import KIND_IID, KIND_NAMESPACE, KIND_RESOURCE_TYPE, KIND_WORKSPACE, TrigramIndex, _document_entries
+
+
+class TestTrigramIndex(SimpleTestCase):
+
+    def setUp(self):
+        self.index = TrigramIndex.build([
+            ('network', 'happylittleorg', [
+                (KIND_WORKSPACE, 'network'),
+                (KIND_NAMESPACE, 'aws_vpc.main'),
+                (KIND_RESOURCE_TYPE, 'aws_vpc'),
+                (KIND_IID, 'vpc-0123456789'),
+            ]),
+            ('network-logs', 'happylittleorg', [
+                (KIND_WORKSPACE, 'network-logs'),
+                (KIND_NAMESPACE, 'aws_s3_bucket.logs'),
+                (KIND_RESOURCE_TYPE, 'aws_s3_bucket'),
+            ])
+        ])
+
+    def test_substring_search(self):
+        results = self.index.search('LOGS')
+        self.assertEqual([r['value'] for r in results], ['network-logs', 'aws_s3_bucket.logs'])
+        self.assertEqual(results[0]['organization'], 'happylittleorg')
+
+    def test_exact_and_prefix_matches_first(self):
+        self.assertEqual([r['value'] for r in self.index.search('network')], ['network', 'network-logs'])
+        self.assertEqual([r['value'] for r in self.index.search('aws_vpc')], ['aws_vpc', 'aws_vpc.main'])
+
+    def test_filter_by_kind_and_limit(self):
+        results = self.index.search('aws', kind=KIND_RESOURCE_TYPE)
+        self.assertEqual([r['value'] for r in results], ['aws_s3_bucket', 'aws_vpc'])
+        self.assertEqual(len(self.index.search('aws', limit=1)), 1)
+
+    def test_short_queries(self):
+        self.assertEqual([r['workspace'] for r in self.index.search('vp', kind=KIND_IID)], ['network'])
+        self.assertEqual(self.index.search(''), [])
+
+    def test_replace_workspace(self):
+        self.index.replace_workspace('network', 'happylittleorg', [(KIND_WORKSPACE, 'network'), (KIND_RESOURCE_TYPE, 'aws_iam_role')])
+        self.assertEqual(self.index.search('vpc'), [])
+        self.assertEqual([r['value'] for r in self.index.search('aws', kind=KIND_RESOURCE_TYPE)], ['aws_iam_role', 'aws_s3_bucket'])
+        self.index.remove_workspace('network-logs')
+        self.assertEqual([r['value'] for r in self.index.search('net')], ['network'])
+        self.assertEqual(len(self.index), 2)
+
+    def test_copy(self):
+        index = self.index.copy()
+        index.replace_workspace('network', 'happylittleorg', [(KIND_WORKSPACE, 'network')])
+        index.remove_workspace('network-logs')
+        self.assertEqual([r['value'] for r in index.search('net')], ['network'])
+        self.assertEqual([r['value'] for r in self.index.search('vpc')], ['vpc-0123456789', 'aws_vpc', 'aws_vpc.main'])
+        self.assertEqual(len(self.index), 7)
+
+
+class TestDocumentEntries(SimpleTestCase):
+
+    def test_packed_instances(self):
+        document = {
+            'name': 'network',
+            'organization': 'happylittleorg',
+            'resources': [
+                {'namespace': 'aws_subnet.private', 'resource_type': 'aws_subnet', 'iids': [], 'instances': ['[[0, "subnet-1"], [1, "subnet-2"]]']},
+                {'namespace': 'aws_vpc.main', 'resource_type': 'aws_vpc', 'iids': ['vpc-1'], 'instances': []}
+            ]
+        }
+        iids = [value for kind, value in _document_entries(document) if kind == KIND_IID]
+        self.assertEqual(iids, ['subnet-1', 'subnet-2', 'vpc-1'])
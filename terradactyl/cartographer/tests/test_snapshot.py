@@ -0,0 +1,79 @@
+import gzip
+import io
+
+from django.test import SimpleTestCase, TestCase
+
+from cartographer.models import (OrganizationSyncJob, OrganizationSyncJobCheckpoint, TerraformCloudOrganization,
+                                 WorkspaceSyncSchedule)
+from cartographer.utils.snapshot import SnapshotFormatException, _load_objects, _sync_objects, read_snapshot, write_snapshot
+
+
+class TestSnapshotFormat(SimpleTestCase):
+
+    def test_round_trip(self):
+        fileobj = io.BytesIO()
+        counts = write_snapshot(
+            fileobj,
+            organizations=['happylittleorg'],
+            vertices=[(1, 'workspace', {'name': 'foo', 'revisions_indexed': True}), (2, 'state', {'serial': 3})],
+            edges=[('has_current_state', 1, 2, {})],
+            objects=[{'model': 'cartographer.workspacesyncschedule', 'pk': 1, 'fields': {'workspace_name': 'foo'}}])
+        self.assertEqual(counts, {'vertices': 2, 'edges': 1, 'objects': 1})
+
+        fileobj.seek(0)
+        header, records = read_snapshot(fileobj)
+        self.assertEqual(header['organizations'], ['happylittleorg'])
+        self.assertEqual(list(records), [
+            ['v', 1, 'workspace', {'name': 'foo', 'revisions_indexed': True}],
+            ['v', 2, 'state', {'serial': 3}],
+            ['e', 'has_current_state', 1, 2, {}],
+            ['o', {'model': 'cartographer.workspacesyncschedule', 'pk': 1, 'fields': {'workspace_name': 'foo'}}]
+        ])
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(SnapshotFormatException):
+            read_snapshot(io.BytesIO(b'not gzip'))
+        with self.assertRaises(SnapshotFormatException):
+            read_snapshot(io.BytesIO(gzip.compress(b'{"format": "something-else"}\n')))
+
+
+class TestSnapshotObjects(TestCase):
+
+    def test_sync_metadata_restored_by_organization_name(self):
+        org = TerraformCloudOrganization.objects.create(name='happylittleorg')
+        job = OrganizationSyncJob.objects.create(organization=org, state=OrganizationSyncJob.COMPLETE)
+        OrganizationSyncJobCheckpoint.objects.create(sync_job=job, workspace_name='foo', stage=OrganizationSyncJob.DRAWING_LOCAL_GRAPH)
+        WorkspaceSyncSchedule.objects.create(organization=org, workspace_name='foo', check_interval=600)
+
+        objects = list(_sync_objects())
+        self.assertEqual(objects[0]['fields']['organization'], 'happylittleorg')
+
+        # Restore into an Organization with a different id.
+        org.delete()
+        restored_org = TerraformCloudOrganization.objects.create(name='happylittleorg')
+        self.assertEqual(_load_objects(objects, {'happylittleorg': restored_org.id}), 3)
+
+        restored_job = OrganizationSyncJob.objects.get(organization=restored_org)
+        self.assertNotEqual(restored_job.id, job.id)
+        self.assertEqual(restored_job.completed_workspaces(OrganizationSyncJob.DRAWING_LOCAL_GRAPH), {'foo'})
+        self.assertEqual(WorkspaceSyncSchedule.objects.get(organization=restored_org).check_interval, 600)
+
+    def test_other_organizations_jobs_untouched(self):
+        org = TerraformCloudOrganization.objects.create(name='happylittleorg')
+        job = OrganizationSyncJob.objects.create(organization=org, state=OrganizationSyncJob.COMPLETE)
+        OrganizationSyncJobCheckpoint.objects.create(sync_job=job, workspace_name='foo', stage=OrganizationSyncJob.DRAWING_LOCAL_GRAPH)
+        objects = list(_sync_objects())
+
+        # The same job now belongs to another Organization, e.g. in a database the snapshot was taken from.
+        other_org = TerraformCloudOrganization.objects.create(name='anotherhappylittleorg')
+        OrganizationSyncJob.objects.filter(id=job.id).update(organization=other_org)
+        restored_org = TerraformCloudOrganization.objects.create(name='restoredorg')
+        for obj in objects:
+            if obj['fields'].get('organization'):
+                obj['fields']['organization'] = 'restoredorg'
+        _load_objects(objects, {'restoredorg': restored_org.id})
+
+        self.assertEqual(OrganizationSyncJob.objects.get(id=job.id).organization, other_org)
+        self.assertEqual(job.completed_workspaces(OrganizationSyncJob.DRAWING_LOCAL_GRAPH), {'foo'})
+        self.assertEqual(OrganizationSyncJob.objects.get(organization=restored_org).completed_workspaces(
+            OrganizationSyncJob.DRAWING_LOCAL_GRAPH), {'foo'})
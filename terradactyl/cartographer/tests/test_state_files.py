@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from cartographer.utils.state_files import _workspace_dependencies, find_state_files, offline_workspace_id, parse_workspace
+
+
+def _state(serial, resources):
+    return {'version': 4, 'terraform_version': '1.2.0', 'serial': serial, 'lineage': 'abc', 'outputs': {}, 'resources': resources}
+
+
+NETWORK_LOOKUP = {
+    'mode': 'data', 'type': 'terraform_remote_state', 'name': 'network', 'provider': 'provider["terraform.io/builtin/terraform"]',
+    'instances': [{'attributes': {'config': {'value': {'organization': 'happylittleorg', 'workspaces': {'name': 'network'}}}}}]
+}
+
+INSTANCE = {
+    'mode': 'managed', 'type': 'aws_instance', 'name': 'app', 'provider': 'provider["registry.terraform.io/hashicorp/aws"]',
+    'instances': [{'index_key': 0, 'attributes': {'id': 'i-1'}, 'dependencies': ['aws_subnet.private', 'data.terraform_remote_state.network']},
+                  {'index_key': 1, 'attributes': {'id': 'i-2'}}]
+}
+
+SUBNET = {
+    'mode': 'managed', 'type': 'aws_subnet', 'name': 'private', 'provider': 'provider["registry.terraform.io/hashicorp/aws"]',
+    'instances': [{'attributes': {'id': 'subnet-1'}}]
+}
+
+
+class TestStateFiles(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+
+    def _write(self, path, state):
+        path = os.path.join(self.root.name, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(state, f)
+        return path
+
+    def test_find_state_files(self):
+        network = self._write('happylittleorg/network.tfstate', _state(1, []))
+        first = self._write('happylittleorg/app/sv-1.json', _state(1, []))
+        second = self._write('happylittleorg/app/sv-2.json', _state(2, []))
+        self._write('happylittleorg/app/notes.txt', {})
+        self._write('README.json', {})
+
+        self.assertEqual(find_state_files(self.root.name), {
+            ('happylittleorg', 'app'): [first, second],
+            ('happylittleorg', 'network'): [network]
+        })
+
+    def test_parse_workspace(self):
+        paths = [
+            self._write('happylittleorg/app/sv-2.json', _state(2, [NETWORK_LOOKUP, INSTANCE, SUBNET])),
+            self._write('happylittleorg/app/terraform.tfstate', _state(1, [SUBNET]))
+        ]
+        workspace = parse_workspace('happylittleorg', 'app', paths)
+
+        self.assertEqual(workspace['workspace_id'], offline_workspace_id('happylittleorg', 'app'))
+        self.assertEqual([r['state_id'] for r in workspace['revisions']], ['happylittleorg:app:1', 'sv-2'])
+        self.assertEqual(workspace['revisions'][-1]['resource_count'], 4)
+        self.assertEqual(workspace['depends_on']['data.terraform_remote_state.network'], {
+            'workspace_name': 'network', 'organization': 'happylittleorg', 'lookup_type': 'terraform_remote_state', 'redundant': False
+        })
+        self.assertEqual(workspace['resources']['aws_instance.app']['provider'], 'registry.terraform.io/hashicorp/aws')
+        self.assertEqual(workspace['resources']['aws_instance.app']['instances'], [{'index_key': 0, 'iid': 'i-1'}, {'index_key': 1, 'iid': 'i-2'}])
+        self.assertEqual(workspace['resource_dependencies'], {'aws_instance.app': ['aws_subnet.private', 'data.terraform_remote_state.network']})
+
+    def test_dependencies_only_on_imported_workspaces(self):
+        workspace = {
+            'name': 'app',
+            'depends_on': {
+                'data.terraform_remote_state.network': {'workspace_name': 'network', 'organization': 'happylittleorg', 'lookup_type': 'terraform_remote_state', 'redundant': True},
+                'module.x.data.tfe_outputs.network': {'workspace_name': 'network', 'organization': 'happylittleorg', 'lookup_type': 'tfe_outputs', 'redundant': False},
+                'data.terraform_remote_state.dns': {'workspace_name': 'dns', 'organization': 'happylittleorg', 'lookup_type': 'terraform_remote_state', 'redundant': False},
+                'data.terraform_remote_state.self': {'workspace_name': 'app', 'organization': 'happylittleorg', 'lookup_type': 'terraform_remote_state', 'redundant': False}
+            }
+        }
+        known = {('happylittleorg', 'app'), ('happylittleorg', 'network')}
+        self.assertEqual(_workspace_dependencies(workspace, known),
+                         [(offline_workspace_id('happylittleorg', 'network'), 'terraform_remote_state', 'true')])
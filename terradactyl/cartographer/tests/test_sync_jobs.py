@@ -0,0 +1,132 @@
+import datetime
+
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from cartographer.models import OrganizationSyncJob, OrganizationSyncJobCheckpoint, TerraformCloudAPIKey, TerraformCloudOrganization
+from cartographer.tasks.terraform_cloud import _wait_for_group, resume_abandoned_sync_jobs, sync_chunk
+
+HEARTBEAT_TIMEOUT = 300
+
+
+@override_settings(SYNC_JOB_HEARTBEAT_TIMEOUT=HEARTBEAT_TIMEOUT)
+class TestOrganizationSyncJob(TestCase):
+
+    def setUp(self):
+        self.org = TerraformCloudOrganization.objects.create(name='happylittleorg')
+
+    def _create_job(self, state=OrganizationSyncJob.DRAWING_LOCAL_GRAPH, heartbeat_seconds_ago=0, started_hours_ago=1):
+        return OrganizationSyncJob.objects.create(
+            organization=self.org,
+            state=state,
+            started_at=timezone.now() - datetime.timedelta(hours=started_hours_ago),
+            heartbeat_at=timezone.now() - datetime.timedelta(seconds=heartbeat_seconds_ago))
+
+    def test_recent_heartbeat_not_abandoned(self):
+        sync_job = self._create_job(heartbeat_seconds_ago=10)
+        self.assertFalse(sync_job.abandoned)
+        self.assertTrue(self.org.refreshing)
+
+    def test_stale_heartbeat_abandoned(self):
+        sync_job = self._create_job(heartbeat_seconds_ago=HEARTBEAT_TIMEOUT + 10)
+        self.assertTrue(sync_job.abandoned)
+        self.assertFalse(self.org.refreshing)
+
+    def test_complete_job_never_abandoned(self):
+        sync_job = self._create_job(state=OrganizationSyncJob.COMPLETE, heartbeat_seconds_ago=HEARTBEAT_TIMEOUT + 10)
+        self.assertFalse(sync_job.abandoned)
+
+    def test_checkpoint_records_heartbeat(self):
+        sync_job = self._create_job(heartbeat_seconds_ago=HEARTBEAT_TIMEOUT + 10)
+        OrganizationSyncJobCheckpoint.record(sync_job.id, 'foo', OrganizationSyncJob.DRAWING_LOCAL_GRAPH)
+        sync_job.refresh_from_db()
+        self.assertFalse(sync_job.abandoned)
+
+    def test_completed_workspaces_by_stage(self):
+        sync_job = self._create_job()
+        OrganizationSyncJobCheckpoint.record(sync_job.id, 'foo', OrganizationSyncJob.DRAWING_LOCAL_GRAPH)
+        OrganizationSyncJobCheckpoint.record(sync_job.id, 'foo', OrganizationSyncJob.DRAWING_LOCAL_GRAPH)
+        OrganizationSyncJobCheckpoint.record(sync_job.id, 'bar', OrganizationSyncJob.DRAWING_LOCAL_GRAPH)
+        OrganizationSyncJobCheckpoint.record(sync_job.id, 'foo', OrganizationSyncJob.IMPORTING_STATE_HISTORY)
+
+        self.assertEqual(sync_job.completed_workspaces(OrganizationSyncJob.DRAWING_LOCAL_GRAPH), {'foo', 'bar'})
+        self.assertEqual(sync_job.completed_workspaces(OrganizationSyncJob.IMPORTING_STATE_HISTORY), {'foo'})
+        self.assertEqual(sync_job.completed_workspaces(OrganizationSyncJob.IMPORTING_RESOURCES), set())
+
+    def test_superseded_jobs_closed(self):
+        oldest = self._create_job(heartbeat_seconds_ago=HEARTBEAT_TIMEOUT + 10, started_hours_ago=3)
+        older = self._create_job(heartbeat_seconds_ago=HEARTBEAT_TIMEOUT + 10, started_hours_ago=2)
+        newest = self._create_job(heartbeat_seconds_ago=HEARTBEAT_TIMEOUT + 10)
+
+        self.assertEqual(OrganizationSyncJob.close_superseded(), {'happylittleorg': newest})
+        for sync_job in (oldest, older):
+            sync_job.refresh_from_db()
+            self.assertEqual(sync_job.state, OrganizationSyncJob.FAILED)
+            self.assertFalse(sync_job.abandoned)
+
+    def test_job_superseded_by_complete_job_closed(self):
+        stale = self._create_job(heartbeat_seconds_ago=HEARTBEAT_TIMEOUT + 10, started_hours_ago=2)
+        self._create_job(state=OrganizationSyncJob.COMPLETE)
+
+        self.assertEqual(OrganizationSyncJob.close_superseded(), {})
+        stale.refresh_from_db()
+        self.assertEqual(stale.state, OrganizationSyncJob.FAILED)
+
+    def test_only_latest_abandoned_job_resumed(self):
+        self._create_job(heartbeat_seconds_ago=HEARTBEAT_TIMEOUT + 10, started_hours_ago=2)
+        newest = self._create_job(heartbeat_seconds_ago=HEARTBEAT_TIMEOUT + 10)
+
+        with mock.patch('cartographer.tasks.terraform_cloud.coalesce') as mock_coalesce:
+            resumed_job_ids = resume_abandoned_sync_jobs()
+
+        self.assertEqual(resumed_job_ids, [str(newest.id)])
+        mock_coalesce.assert_called_once()
+        self.assertEqual(mock_coalesce.call_args.args[3], str(newest.id))
+
+
+class TestSyncChunk(TestCase):
+
+    def setUp(self):
+        api_key = TerraformCloudAPIKey.objects.create(name='key', value='secret')
+        self.org = TerraformCloudOrganization.objects.create(name='happylittleorg', api_key=api_key)
+        self.sync_job = OrganizationSyncJob.objects.create(organization=self.org, state=OrganizationSyncJob.IMPORTING_STATE_HISTORY)
+        self.workspace_infos = [{'name': name, 'organization': self.org.name} for name in ['foo', 'bar', 'baz']]
+
+    def test_failures_isolated_per_workspace(self):
+        def sync_revisions(tfc_client, workspace_name, organization_name, initial_run):
+            if workspace_name == 'bar':
+                raise Exception('Boom')
+
+        with mock.patch('cartographer.tasks.terraform_cloud._sync_revisions', side_effect=sync_revisions) as mock_sync_revisions:
+            results = sync_chunk(OrganizationSyncJob.IMPORTING_STATE_HISTORY, self.workspace_infos, self.org.name, self.sync_job.id)
+
+        self.assertEqual(mock_sync_revisions.call_count, 3)
+        self.assertEqual(results, {'succeeded': ['foo', 'baz'], 'failed': ['bar']})
+        self.assertEqual(self.sync_job.completed_workspaces(OrganizationSyncJob.IMPORTING_STATE_HISTORY), {'foo', 'baz'})
+
+    def test_chunk_shares_client(self):
+        with mock.patch('cartographer.tasks.terraform_cloud._sync_resources') as mock_sync_resources:
+            sync_chunk(OrganizationSyncJob.IMPORTING_RESOURCES, self.workspace_infos, self.org.name)
+
+        tfc_clients = {id(c.args[0]) for c in mock_sync_resources.call_args_list}
+        self.assertEqual(len(tfc_clients), 1)
+
+    def test_invalid_stage(self):
+        with self.assertRaises(ValueError):
+            sync_chunk('NOT_A_STAGE', self.workspace_infos, self.org.name)
+
+    def test_wait_for_group_reports_failed_chunks(self):
+        result = mock.Mock()
+        result.ready.return_value = True
+        result.successful.return_value = True
+        result.results = [mock.Mock(result={'succeeded': ['foo'], 'failed': []})]
+        self.assertTrue(_wait_for_group(result, self.sync_job))
+
+        result.results.append(mock.Mock(result={'succeeded': [], 'failed': ['bar']}))
+        self.assertFalse(_wait_for_group(result, self.sync_job))
+
+        result.successful.return_value = False
+        result.results = []
+        self.assertFalse(_wait_for_group(result, self.sync_job))
@@ -0,0 +1,67 @@
+from django.test import SimpleTestCase, TestCase
+
+from cartographer.models import TerraformCloudAPIKey, TerraformCloudOrganization
+from cartographer.utils.terraform_cloud import TerraformCloudClientRegistry, _registry, build_resource_adjacency, get_client
+
+
+class TestTerraformCloudClientRegistry(TestCase):
+
+    def setUp(self):
+        self.api_key = TerraformCloudAPIKey.objects.create(name='happylittlekey', value='happylittlevalue')
+        self.org = TerraformCloudOrganization.objects.create(name='happylittleorg', api_key=self.api_key)
+        _registry.invalidate()
+
+    def test_client_reused_within_ttl(self):
+        registry = TerraformCloudClientRegistry(ttl=60)
+        client = registry.get('happylittleorg')
+        with self.assertNumQueries(0):
+            self.assertIs(registry.get('happylittleorg'), client)
+
+    def test_client_rebuilt_after_ttl(self):
+        registry = TerraformCloudClientRegistry(ttl=0)
+        client = registry.get('happylittleorg')
+        self.assertIsNot(registry.get('happylittleorg'), client)
+
+    def test_client_rebuilt_when_api_key_changes(self):
+        client = get_client('happylittleorg')
+        self.api_key.value = 'anotherhappylittlevalue'
+        self.api_key.save()
+
+        new_client = get_client('happylittleorg')
+        self.assertIsNot(new_client, client)
+        self.assertEqual(new_client._api_key, 'anotherhappylittlevalue')
+
+    def test_client_kept_when_organization_saved(self):
+        client = get_client('happylittleorg')
+        self.org.save()
+        self.assertIs(get_client('happylittleorg'), client)
+
+    def test_client_rebuilt_when_organization_api_key_changes(self):
+        other_api_key = TerraformCloudAPIKey.objects.create(name='anotherhappylittlekey', value='anotherhappylittlevalue')
+        client = get_client('happylittleorg')
+        self.org.api_key = other_api_key
+        self.org.save()
+
+        new_client = get_client('happylittleorg')
+        self.assertIsNot(new_client, client)
+        self.assertEqual(new_client._api_key, 'anotherhappylittlevalue')
+
+    def test_client_rebuilt_when_organization_deleted(self):
+        client = get_client('happylittleorg')
+        self.org.delete()
+        TerraformCloudOrganization.objects.create(name='happylittleorg', api_key=self.api_key)
+        self.assertIsNot(get_client('happylittleorg'), client)
+
+
+class TestBuildResourceAdjacency(SimpleTestCase):
+
+    def test_only_keeps_dependencies_within_the_state(self):
+        resources = {
+            'aws_vpc.main': {'depends_on': []},
+            'aws_subnet.private': {'depends_on': ['aws_vpc.main', 'data.terraform_remote_state.network']},
+            'module.eks.aws_eks_cluster.main': {'depends_on': ['aws_subnet.private', 'aws_vpc.main', 'aws_vpc.main']},
+        }
+        self.assertEqual(build_resource_adjacency(resources), {
+            'aws_subnet.private': ['aws_vpc.main'],
+            'module.eks.aws_eks_cluster.main': ['aws_subnet.private', 'aws_vpc.main']
+        })
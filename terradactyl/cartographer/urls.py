@@ -2,7 +2,7 @@ from django.contrib.auth.decorators import login_required
 from django.urls import path
 
 from .views import auth, remotes, reports as reports_view, workspaces as workspaces_view
-from .apis import terraform_cloud, workspaces as workspaces_api, insights as insights_api
+from .apis import terraform_cloud, workspaces as workspaces_api, insights as insights_api, resources as resources_api, search as search_api
 
 
 urlpatterns = [
@@ -17,15 +17,23 @@ urlpatterns = [
     path('organizations/<organization_name>', remotes.organization, name='organization'),
     path('reports/terraform-versions', reports_view.terraform_versions, name='reports-terraform-versions'),
     path('reports/redundant-dependencies', reports_view.redundant_dependencies, name='reports-redundant-dependencies'),
+    path('reports/dependency-cycles', reports_view.dependency_cycles, name='reports-dependency-cycles'),
 
     # Apis
     path('api/v1/dt/workspaces', workspaces_api.get_table_workspaces_data, name='dt-get-workspaces'),
+    path('api/v1/dt/redundant-dependencies', workspaces_api.get_table_redundant_dependencies, name='dt-get-redundant-dependencies'),
     path('api/v1/g/workspaces', workspaces_api.get_graph_workspaces_data, name='g-get-workspaces'),
+    path('api/v1/g/run-waves', workspaces_api.get_run_waves, name='g-get-run-waves'),
+    path('api/v1/g/cycles', workspaces_api.get_cycles, name='g-get-cycles'),
+    path('api/v1/g/run-plan', workspaces_api.get_run_plan, name='g-get-run-plan'),
     path('api/v1/g/workspaces/<workspace_name>', workspaces_api.get_workspace, name='get-workspace'),
     path('api/v1/g/workspaces/<workspace_name>/resources', workspaces_api.get_workspace_resources, name='get-workspace-resources'),
     path('api/v1/g/workspaces/<workspace_name>/run-order', workspaces_api.get_workspace_run_order, name='get-workspace-run-order'),
+    path('api/v1/g/workspaces/<workspace_name>/impact', workspaces_api.get_workspace_impact, name='get-workspace-impact'),
     path('api/v1/terraform-cloud/api-keys', login_required(terraform_cloud.TerraformCloudAPIKeys.as_view()), name='terraform-cloud-api-keys'),
     path('api/v1/terraform-cloud/organizations', login_required(terraform_cloud.TerraformCloudOrganizations.as_view()), name='terraform-cloud-organizations'),
 
     path('api/v1/insights/daily-change', insights_api.daily_change, name='insights'),
+    path('api/v1/search', search_api.search, name='search'),
+    path('api/v1/resources/owners', resources_api.get_resource_owners, name='get-resource-owners'),
 ]
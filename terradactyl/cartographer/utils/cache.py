@@ -0,0 +1,64 @@
+import json
+import logging
+
+from django.conf import settings
+
+from cartographer.utils.locks import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'terradactyl:sync:generation'
+DEPENDENCY_GENERATION_KEY = 'terradactyl:sync:dependency-generation'
+CACHE_KEY = 'terradactyl:cache:{name}:{generation}'
+
+
+def get_sync_generation():
+    """Returns the current sync generation, a counter bumped whenever a sync changes the graph. Results
+    derived from the whole graph are cached against it, so they are recalculated after the next change.
+    """
+    generation = get_redis_connection().get(GENERATION_KEY)
+    return int(generation) if generation else 0
+
+
+def bump_sync_generation():
+    """Mark that a sync has changed the graph, invalidating everything cached for the previous generation.
+    """
+    return get_redis_connection().incr(GENERATION_KEY)
+
+
+def get_dependency_generation():
+    """Returns the current dependency generation, a counter bumped only when Workspaces or the depends_on Edges
+    between them are added or removed. Results derived from the dependency graph alone are cached against it,
+    so syncing a Workspace's revisions or Resources doesn't invalidate them.
+    """
+    generation = get_redis_connection().get(DEPENDENCY_GENERATION_KEY)
+    return int(generation) if generation else 0
+
+
+def bump_dependency_generation():
+    """Mark that Workspaces or the dependencies between them have changed, call before bumping the sync generation.
+    """
+    return get_redis_connection().incr(DEPENDENCY_GENERATION_KEY)
+
+
+def cached_for_generation(name: str, compute, ttl: int = None, generation: int = None):
+    """Return the cached result for the current sync generation, computing and caching it if there is none.
+
+    Args
+        name: the name to cache the result under, e.g. 'growth:myorg'.
+        compute: a function taking no arguments that returns a JSON serialisable result.
+        ttl: how many seconds to keep the result for, defaults to GENERATION_CACHE_TTL.
+        generation: the generation to cache the result for, defaults to the sync generation.
+    Returns
+        The result of compute(), possibly from the cache.
+    """
+    connection = get_redis_connection()
+    key = CACHE_KEY.format(name=name, generation=get_sync_generation() if generation is None else generation)
+
+    cached = connection.get(key)
+    if cached is not None:
+        return json.loads(cached)
+
+    result = compute()
+    connection.set(key, json.dumps(result), ex=ttl or settings.GENERATION_CACHE_TTL)
+    return result
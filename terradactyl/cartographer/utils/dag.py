@@ -0,0 +1,352 @@
+import threading
+
+from collections import deque
+
+from cartographer.utils.cache import cached_for_generation, get_dependency_generation
+
+
+def strongly_connected_components(node_count: int, adjacency):
+    """Find the strongly connected components of a directed graph using Tarjan's algorithm. Iterative so
+    that long dependency chains don't hit the recursion limit.
+
+    Args
+        node_count: the number of nodes, nodes are identified by 0..node_count - 1.
+        adjacency: a list where adjacency[n] is the list of nodes that n has an edge to.
+    Returns
+        A tuple of the component id of each node and the list of components (each a list of nodes). Components
+        are in reverse topological order, every component only has edges to components before it in the list.
+    """
+    index_counter = 0
+    indices = [-1] * node_count
+    low_links = [0] * node_count
+    on_stack = [False] * node_count
+    stack = []
+    component_of = [-1] * node_count
+    components = []
+
+    for root in range(node_count):
+        if indices[root] != -1:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, edge_index = work.pop()
+            if edge_index == 0:
+                indices[node] = low_links[node] = index_counter
+                index_counter += 1
+                stack.append(node)
+                on_stack[node] = True
+
+            recurse = False
+            edges = adjacency[node]
+            while edge_index < len(edges):
+                successor = edges[edge_index]
+                edge_index += 1
+                if indices[successor] == -1:
+                    work.append((node, edge_index))
+                    work.append((successor, 0))
+                    recurse = True
+                    break
+                elif on_stack[successor]:
+                    low_links[node] = min(low_links[node], indices[successor])
+            if recurse:
+                continue
+
+            if low_links[node] == indices[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component_of[member] = len(components)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+
+            if work:
+                parent = work[-1][0]
+                low_links[parent] = min(low_links[parent], low_links[node])
+
+    return component_of, components
+
+
+class DependencyGraph():
+    """The Workspace dependency graph held in memory, with a reachability index so that "what does X depend
+    on" and "what depends on X" can be answered without traversing the graph database.
+
+    Cycles are handled by condensing strongly connected components, so every Workspace in a cycle can reach
+    every other. Reachability is stored as a bitset (a Python int) per component, where bit n is set if the
+    Workspace with id n is reachable.
+    """
+
+    def __init__(self, names, edges, organizations=None, edge_types=None):
+        """
+        Args
+            names: the names of every Workspace.
+            edges: (source, target) name pairs where the source Workspace depends on the target Workspace.
+            organizations: optional dict of Workspace name to the name of its Organization.
+            edge_types: optional dict of (source, target) to the lookup type of the dependency.
+        """
+        self.names = list(names)
+        self.organizations = organizations or {}
+        self.edge_types = edge_types or {}
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.dependencies = [[] for _ in self.names]
+        self.dependents = [[] for _ in self.names]
+        for source, target in set(edges):
+            if source == target or source not in self.ids or target not in self.ids:
+                continue
+            self.dependencies[self.ids[source]].append(self.ids[target])
+            self.dependents[self.ids[target]].append(self.ids[source])
+
+        self.component_of, self.components = strongly_connected_components(len(self.names), self.dependencies)
+        self.component_dependencies = [set() for _ in self.components]
+        for node, targets in enumerate(self.dependencies):
+            for target in targets:
+                if self.component_of[node] != self.component_of[target]:
+                    self.component_dependencies[self.component_of[node]].add(self.component_of[target])
+
+        member_bits = [0] * len(self.components)
+        for c, members in enumerate(self.components):
+            for member in members:
+                member_bits[c] |= 1 << member
+
+        # Components come out of Tarjan's dependencies first, so a single pass in each direction is enough.
+        self._reaches = [0] * len(self.components)
+        for c in range(len(self.components)):
+            bits = member_bits[c]
+            for d in self.component_dependencies[c]:
+                bits |= self._reaches[d]
+            self._reaches[c] = bits
+
+        self._reached_by = list(member_bits)
+        for c in reversed(range(len(self.components))):
+            for d in self.component_dependencies[c]:
+                self._reached_by[d] |= self._reached_by[c]
+
+        # Longest path layering, a component's level is one more than its deepest dependency. Again
+        # dependencies come first so this is a single pass.
+        self._component_levels = [0] * len(self.components)
+        for c in range(len(self.components)):
+            for d in self.component_dependencies[c]:
+                self._component_levels[c] = max(self._component_levels[c], self._component_levels[d] + 1)
+
+        self._impacts = {}
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def downstream_bits(self, name):
+        """Bitset of every Workspace the named Workspace transitively depends on, not including itself.
+        """
+        node = self.ids[name]
+        return self._reaches[self.component_of[node]] & ~(1 << node)
+
+    def upstream_bits(self, name):
+        """Bitset of every Workspace that transitively depends on the named Workspace, not including itself.
+        """
+        node = self.ids[name]
+        return self._reached_by[self.component_of[node]] & ~(1 << node)
+
+    def depends_on(self, name, other):
+        """Whether the named Workspace transitively depends on the other Workspace.
+        """
+        return bool(self.downstream_bits(name) >> self.ids[other] & 1)
+
+    def cycle(self, name):
+        """Returns the names of the other Workspaces in a dependency cycle with the named Workspace.
+        """
+        node = self.ids[name]
+        return [self.names[member] for member in self.components[self.component_of[node]] if member != node]
+
+    def level(self, name):
+        """The length of the longest chain of dependencies below the named Workspace, 0 for Workspaces with no
+        dependencies. Every Workspace in a cycle has the same level.
+        """
+        return self._component_levels[self.component_of[self.ids[name]]]
+
+    def run_order(self, names):
+        """Order the given Workspaces so that every Workspace comes after the Workspaces it depends on, apart from
+        Workspaces in a cycle which are kept next to each other. Workspaces not in the graph come first.
+        """
+        return sorted(names, key=lambda name: (self.level(name) if name in self else 0, name))
+
+    def waves(self, organization=None):
+        """Group Workspaces into waves that can be applied in parallel, where each wave only depends on
+        Workspaces in earlier waves (or in a cycle within the same wave).
+
+        Args
+            organization: only include Workspaces in this Organization. Dependencies on Workspaces in other
+                          Organizations still count towards a Workspace's wave.
+        Returns
+            A dict containing the list of waves, each a sorted list of Workspace names, and the list of
+            dependency cycles.
+        """
+        levels = {}
+        for node, name in enumerate(self.names):
+            if organization and self.organizations.get(name) != organization:
+                continue
+            levels.setdefault(self._component_levels[self.component_of[node]], []).append(name)
+
+        cycles = []
+        for component in self.components:
+            members = sorted(self.names[member] for member in component
+                             if not organization or self.organizations.get(self.names[member]) == organization)
+            if len(component) > 1 and members:
+                cycles.append(members)
+
+        return {
+            'waves': [sorted(levels[level]) for level in sorted(levels)],
+            'cycles': sorted(cycles)
+        }
+
+    def cycles(self):
+        """Every dependency cycle in the graph, found from the strongly connected components.
+
+        Returns
+            A list of cycles, largest first, each a dict of the member Workspace names and the depends_on
+            Edges between them (with their lookup type).
+        """
+        cycles = []
+        for component in self.components:
+            if len(component) < 2:
+                continue
+            members = set(component)
+            edges = [{
+                'source': self.names[node],
+                'target': self.names[target],
+                'type': self.edge_types.get((self.names[node], self.names[target]))
+            } for node in component for target in self.dependencies[node] if target in members]
+            cycles.append({
+                'workspaces': sorted(self.names[node] for node in component),
+                'edges': sorted(edges, key=lambda e: (e['source'], e['target']))
+            })
+        return sorted(cycles, key=lambda c: (-len(c['workspaces']), c['workspaces']))
+
+    def plan(self, durations, default_duration, target=None, organization=None):
+        """Work out the earliest each Workspace could start and finish applying if everything were rebuilt
+        with unlimited parallelism, and the critical path (the chain of dependencies that bounds the total).
+        Workspaces in a cycle are treated as one unit that takes as long as all of its members combined.
+
+        Args
+            durations: a dict of Workspace name to how long it takes to apply, in seconds.
+            default_duration: the duration to use for Workspaces not in durations.
+            target: only plan the named Workspace and everything it transitively depends on.
+            organization: only plan Workspaces in this Organization, dependencies outside it are treated
+                          as already applied.
+        Returns
+            A dict containing the total duration, the critical path and the schedule, where the path and
+            schedule are lists of {'name', 'duration', 'start', 'finish'} dicts.
+        """
+        if target is not None:
+            target_node = self.ids[target]
+            selected = [n for n in range(len(self.names)) if self.downstream_bits(target) >> n & 1] + [target_node]
+        else:
+            selected = [n for n, name in enumerate(self.names) if not organization or self.organizations.get(name) == organization]
+
+        selected_nodes = set(selected)
+        component_durations = {}
+        for node in selected:
+            c = self.component_of[node]
+            component_durations[c] = component_durations.get(c, 0) + durations.get(self.names[node], default_duration)
+
+        # Components come dependencies first, so every dependency has finished by the time it is needed.
+        starts, finishes, critical_dependency = {}, {}, {}
+        for c in sorted(component_durations):
+            starts[c] = 0
+            for d in self.component_dependencies[c]:
+                if d in finishes and finishes[d] > starts[c]:
+                    starts[c] = finishes[d]
+                    critical_dependency[c] = d
+            finishes[c] = starts[c] + component_durations[c]
+
+        def entry(node):
+            c = self.component_of[node]
+            name = self.names[node]
+            return {'name': name, 'duration': durations.get(name, default_duration), 'start': starts[c], 'finish': finishes[c]}
+
+        critical_path = []
+        if finishes:
+            c = max(finishes, key=lambda c: (finishes[c], c))
+            while c is not None:
+                critical_path = sorted((entry(node) for node in self.components[c] if node in selected_nodes), key=lambda e: e['name']) + critical_path
+                c = critical_dependency.get(c)
+
+        return {
+            'total_duration': max(finishes.values()) if finishes else 0,
+            'critical_path': critical_path,
+            'schedule': sorted((entry(node) for node in selected), key=lambda e: (e['start'], e['name']))
+        }
+
+    def depths(self, name, upstream=False):
+        """Breadth first search from the named Workspace.
+
+        Args
+            name: the name of the Workspace to start from.
+            upstream: if True follow dependents (what depends on the Workspace) instead of dependencies.
+        Returns
+            A dict of Workspace name to the minimum number of depends_on hops from the named Workspace.
+        """
+        adjacency = self.dependents if upstream else self.dependencies
+        start = self.ids[name]
+        depths = {}
+        seen = {start}
+        queue = deque([(start, 0)])
+        while queue:
+            node, depth = queue.popleft()
+            for successor in adjacency[node]:
+                if successor not in seen:
+                    seen.add(successor)
+                    depths[self.names[successor]] = depth + 1
+                    queue.append((successor, depth + 1))
+        return depths
+
+    def impact(self, name):
+        """Everything affected by, and everything that affects, the named Workspace. Which Workspaces are
+        affected comes from the reachability index, only their depths need a search, and that is skipped
+        when nothing is reachable. Results are kept for the life of the graph, so repeated requests for the
+        same Workspace are a dict lookup.
+
+        Returns
+            A dict with the upstream (dependent) and downstream (dependency) Workspaces, each a list of
+            {'name': ..., 'depth': ...} ordered by depth, plus any Workspaces in a cycle with this one.
+        """
+        if name not in self._impacts:
+            impact = {'cycle': self.cycle(name)}
+            for direction, bits, upstream in [('upstreams', self.upstream_bits(name), True),
+                                              ('downstreams', self.downstream_bits(name), False)]:
+                depths = self.depths(name, upstream=upstream) if bits else {}
+                members = [self.names[node] for node in range(bits.bit_length()) if bits >> node & 1]
+                impact[direction] = sorted(({'name': n, 'depth': depths[n]} for n in members), key=lambda i: (i['depth'], i['name']))
+            self._impacts[name] = impact
+        return self._impacts[name]
+
+
+_graph = None
+_graph_generation = None
+_graph_lock = threading.Lock()
+
+
+def get_dependency_graph():
+    """Returns the DependencyGraph for the current dependency generation. The graph is loaded from the graph
+    database and indexed the first time it is needed after a sync has added or removed Workspaces or their
+    dependencies, and shared by every request in the process until the next such change.
+    """
+    global _graph, _graph_generation
+    # Imported here to keep this module free of the graph database for the algorithms above.
+    from cartographer.gizmo.models import Workspace
+
+    generation = get_dependency_generation()
+    with _graph_lock:
+        if _graph is None or _graph_generation != generation:
+            organizations = Workspace.vertices.organizations()
+            edge_types = {(edge['source'], edge['target']): edge['type'] for edge in Workspace.vertices.dependency_edges()}
+            _graph = DependencyGraph(organizations.keys(), edge_types.keys(), organizations=organizations, edge_types=edge_types)
+            _graph_generation = generation
+        return _graph
+
+
+def get_dependency_cycles():
+    """Returns every dependency cycle, see DependencyGraph.cycles(). Cached for the current dependency
+    generation so the cycles are only found once per change, whichever process asks first.
+    """
+    return cached_for_generation('dependency-cycles', lambda: get_dependency_graph().cycles(), generation=get_dependency_generation())
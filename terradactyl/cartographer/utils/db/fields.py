@@ -1,4 +1,5 @@
 import base64
+import functools
 
 from cryptography.fernet import Fernet
 from cryptography.hazmat.backends import default_backend
@@ -9,21 +10,36 @@ from django.conf import settings
 from django.db.models import CharField
 
 
-class EncryptedCharField(CharField):
-    """Custom Encrypted CharField
-    Requires that both ENCRYPTED_CHAR_FIELD_SALT and ENCRYPTED_CHAR_FIELD_KEY
-    are set in the settings file.
-    """
+@functools.lru_cache(maxsize=None)
+def get_fernet(key: str, salt: str):
+    """Derive the encryption key from the given key and salt and return a Fernet for it. The
+    derivation is deliberately slow so it is done on first use and memoised, rather than on
+    every process start.
 
-    salt = bytes(settings.ENCRYPTED_CHAR_FIELD_SALT, encoding="raw_unicode_escape")
+    Args
+        key: the secret to derive the encryption key from.
+        salt: the salt to use in the derivation.
+    Returns
+        A Fernet instance using the derived key.
+    """
     kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), 
                     length=32, 
-                    salt=salt, 
+                    salt=bytes(salt, encoding="raw_unicode_escape"), 
                     iterations=100000, 
                     backend=default_backend())
 
-    key = base64.urlsafe_b64encode(kdf.derive(settings.ENCRYPTED_CHAR_FIELD_KEY.encode('utf-8')))
-    f = Fernet(key)
+    return Fernet(base64.urlsafe_b64encode(kdf.derive(key.encode('utf-8'))))
+
+
+class EncryptedCharField(CharField):
+    """Custom Encrypted CharField
+    Requires that both ENCRYPTED_CHAR_FIELD_SALT and ENCRYPTED_CHAR_FIELD_KEY
+    are set in the settings file.
+    """
+
+    @property
+    def f(self):
+        return get_fernet(settings.ENCRYPTED_CHAR_FIELD_KEY, settings.ENCRYPTED_CHAR_FIELD_SALT)
 
     def from_db_value(self, value, expression, connection):
         return self.f.decrypt(value).decode('utf-8')
@@ -0,0 +1,219 @@
+import logging
+import time
+
+from collections import Counter
+
+from django.conf import settings
+from gremlin_python.process.graph_traversal import __
+from gremlin_python.process.traversal import within
+
+from cartographer.gizmo import Gizmo
+from cartographer.gizmo.models import Resource, ResourceInstance, State, Workspace
+from cartographer.models import (ResourceInstanceOwner, StateInstanceCount, WorkspaceApplyRollup, WorkspaceApplyRollupCursor,
+                                 WorkspaceRunDuration, WorkspaceSyncSchedule)
+from cartographer.utils.cache import bump_dependency_generation
+from cartographer.utils.locks import SyncLock
+from cartographer.utils.search import record_search_change
+
+logger = logging.getLogger(__name__)
+
+
+def resources_lock_name(organization: str, workspace_name: str):
+    return f'sync-resources:{organization}:{workspace_name}'
+
+
+def resources_lock(organization: str, workspace_name: str, task_id: str = None):
+    """Returns the SyncLock held while a Workspace's Resources are being written, so garbage collection never
+    drops Resources that a sync is part way through moving between states. Its name is also the key that
+    refreshes of the Workspace's Resources are coalesced on.
+    """
+    return SyncLock(resources_lock_name(organization, workspace_name), task_id=task_id)
+
+
+def collection_lock():
+    """Returns the SyncLock held while garbage is collected, so a collection run by hand never overlaps the
+    scheduled one.
+    """
+    return SyncLock('collect-garbage')
+
+
+def plan_collection(revisions, keep_revisions: int, keep_seconds: int, now: float):
+    """Work out which states to drop, and which states to drop the Resources of, for each Workspace.
+
+    Resources are only kept for the newest state that has any, as each Resource sync moves the unchanged ones
+    forward. A revision is dropped once it is outside both the newest keep_revisions revisions and the last
+    keep_seconds, when they're set. The current revision and the one holding the Resources are always kept.
+
+    Args
+        revisions: dicts containing the state_id, owner_workspace_id, ordinal, created_at and has_resources of
+                   each revision, see State.vertices.revision_summaries().
+        keep_revisions: the number of newest revisions to keep for each Workspace, 0 to not keep by count.
+        keep_seconds: keep revisions created within this many seconds of now, 0 to not keep by age.
+        now: the current timestamp.
+    Returns
+        A dict of workspace_id to a dict of 'states' (the ids of the States to drop) and 'resource_states' (the ids
+        of the States to drop the Resources of), only for Workspaces that have something to drop.
+    """
+    by_workspace = {}
+    for revision in revisions:
+        by_workspace.setdefault(revision['owner_workspace_id'], []).append(revision)
+
+    plan = {}
+    for workspace_id, workspace_revisions in by_workspace.items():
+        workspace_revisions.sort(key=lambda r: r['ordinal'], reverse=True)
+        resources_state_id = next((r['state_id'] for r in workspace_revisions if r['has_resources']), None)
+
+        states = []
+        if keep_revisions or keep_seconds:
+            for position, revision in enumerate(workspace_revisions[1:], start=1):
+                if revision['state_id'] == resources_state_id:
+                    continue
+                if keep_revisions and position < keep_revisions:
+                    continue
+                if keep_seconds and now - float(revision['created_at']) <= keep_seconds:
+                    continue
+                states.append(revision['state_id'])
+
+        resource_states = [r['state_id'] for r in workspace_revisions if r['has_resources'] and r['state_id'] != resources_state_id]
+        if states or resource_states:
+            plan[workspace_id] = {'states': states, 'resource_states': resource_states}
+    return plan
+
+
+def drop_in_batches(query, batch_size: int = None, dry_run: bool = False):
+    """Drop the Vertices (and so their Edges) matched by a traversal, at most batch_size per traversal so that no
+    single drop holds the graph database up for long.
+
+    Args
+        query: a function taking no arguments that returns a new traversal over the Vertices to drop.
+        batch_size: the number of Vertices to drop per traversal, defaults to GC_BATCH_SIZE.
+        dry_run: only count the Vertices that would be dropped.
+    Returns
+        The number of Vertices dropped.
+    """
+    if dry_run:
+        return query().count().next()
+
+    batch_size = batch_size or settings.GC_BATCH_SIZE
+    dropped = 0
+    while True:
+        ids = query().limit(batch_size).id_().toList()
+        if ids:
+            Gizmo().g.V(*ids).drop().iterate()
+            dropped += len(ids)
+        if len(ids) < batch_size:
+            return dropped
+
+
+def _drop_states(state_ids, dry_run: bool = False, resources_only: bool = False):
+    """Drop the ResourceInstances and Resources belonging to the States, then (unless resources_only) the States.
+    """
+    reclaimed = Counter()
+    state_ids = list(state_ids)
+    for start in range(0, len(state_ids), settings.GC_BATCH_SIZE):
+        batch = state_ids[start:start + settings.GC_BATCH_SIZE]
+        reclaimed['resource_instances'] += drop_in_batches(
+            lambda: Gizmo().g.V().hasLabel(ResourceInstance.label).has('state_id', within(*batch)), dry_run=dry_run)
+        reclaimed['resources'] += drop_in_batches(
+            lambda: Gizmo().g.V().hasLabel(Resource.label).has('state_id', within(*batch)), dry_run=dry_run)
+        if not resources_only:
+            reclaimed['states'] += drop_in_batches(
+                lambda: Gizmo().g.V().hasLabel(State.label).has('state_id', within(*batch)), dry_run=dry_run)
+    return reclaimed
+
+
+def collect(dry_run: bool = False):
+    """Drop stale data from the graph database: the Resources of superseded states, revisions outside the
+    retention policy (GC_KEEP_REVISIONS and GC_KEEP_REVISION_DAYS) and Resources and ResourceInstances that no
+    longer belong to anything. Workspaces whose Resources are being synced are skipped until the next run.
+
+    Args
+        dry_run: only count what would be dropped.
+    Returns
+        A dict of the number of each kind of Vertex reclaimed.
+    """
+    started_at = time.monotonic()
+    plan = plan_collection(
+        State.vertices.revision_summaries(),
+        keep_revisions=settings.GC_KEEP_REVISIONS,
+        keep_seconds=settings.GC_KEEP_REVISION_DAYS * 86400,
+        now=time.time())
+    workspaces = {w.workspace_id: w for w in Workspace.vertices.all()}
+
+    reclaimed = Counter()
+    changed_workspaces = []
+    for workspace_id, workspace_plan in plan.items():
+        workspace = workspaces.get(workspace_id)
+        if workspace is None:
+            # The Workspace has gone, its States are dropped along with it.
+            reclaimed.update(_drop_states(workspace_plan['resource_states'] + workspace_plan['states'], dry_run=dry_run))
+            continue
+
+        lock = resources_lock(workspace.organization, workspace.name)
+        if not lock.acquire():
+            logger.info(f'Resources are being synced for Workspace {workspace.name}, collecting its garbage next time.')
+            continue
+        try:
+            reclaimed.update(_drop_states(workspace_plan['resource_states'], dry_run=dry_run, resources_only=True))
+            reclaimed.update(_drop_states(workspace_plan['states'], dry_run=dry_run))
+            if workspace_plan['states'] and not dry_run:
+                workspace.update_summary()
+        finally:
+            lock.release()
+        changed_workspaces.append(workspace.name)
+
+    # Anything left without a parent, e.g. from a sync that died part way through writing.
+    reclaimed['resources'] += drop_in_batches(
+        lambda: Gizmo().g.V().hasLabel(Resource.label).not_(__.inE('contains')), dry_run=dry_run)
+    reclaimed['resource_instances'] += drop_in_batches(
+        lambda: Gizmo().g.V().hasLabel(ResourceInstance.label).not_(__.outE('instance_of')), dry_run=dry_run)
+
+    if not dry_run and any(reclaimed.values()):
+        record_search_change(*changed_workspaces)
+    logger.info(f'{"Would reclaim" if dry_run else "Reclaimed"} {dict(reclaimed)} in {time.monotonic() - started_at:.1f}s.')
+    return dict(reclaimed)
+
+
+def drop_workspaces(organization: str, names, dry_run: bool = False):
+    """Drop Workspaces that no longer exist in Terraform Cloud, along with their States, Resources and everything
+    recorded about them in the database.
+
+    Args
+        organization: the name of the Organization the Workspaces belong to.
+        names: the names of the Workspaces.
+        dry_run: only count what would be dropped.
+    Returns
+        A dict of the number of each kind of Vertex reclaimed.
+    """
+    names = list(names)
+    if not names:
+        return {}
+
+    workspace_ids = Gizmo().g.V().hasLabel(Workspace.label).has('organization', organization) \
+        .has('name', within(*names)).values('workspace_id').toList()
+    state_ids = Gizmo().g.V().hasLabel(State.label).has('owner_workspace_id', within(*workspace_ids)).values('state_id').toList() \
+        if workspace_ids else []
+    # Current states of Workspaces synced before revisions were indexed have no owner_workspace_id.
+    state_ids += Gizmo().g.V().hasLabel(Workspace.label).has('organization', organization).has('name', within(*names)) \
+        .out('has_current_state').values('state_id').toList()
+
+    # Dropping the Workspaces drops the depends_on Edges to them, so the summaries of the Workspaces that depend
+    # on them have to be recalculated afterwards.
+    dependants = Gizmo().g.V().hasLabel(Workspace.label).has('organization', organization).has('name', within(*names)) \
+        .in_('depends_on').hasLabel(Workspace.label).not_(__.has('organization', organization).has('name', within(*names))).dedup() \
+        .project('name', 'organization').by('name').by('organization').toList() if not dry_run else []
+
+    reclaimed = _drop_states(set(state_ids), dry_run=dry_run)
+    reclaimed['workspaces'] += drop_in_batches(
+        lambda: Gizmo().g.V().hasLabel(Workspace.label).has('organization', organization).has('name', within(*names)), dry_run=dry_run)
+
+    if not dry_run:
+        for dependant in dependants:
+            Workspace.vertices.get(name=dependant['name'], organization=dependant['organization']).update_summary()
+        for model in [WorkspaceSyncSchedule, WorkspaceApplyRollupCursor, WorkspaceApplyRollup, WorkspaceRunDuration,
+                      ResourceInstanceOwner, StateInstanceCount]:
+            model.objects.filter(organization__name=organization, workspace_name__in=names).delete()
+        bump_dependency_generation()
+        record_search_change(*names)
+    logger.info(f'{"Would drop" if dry_run else "Dropped"} {len(names)} Workspaces deleted from {organization}, reclaiming {dict(reclaimed)}.')
+    return dict(reclaimed)
@@ -0,0 +1,38 @@
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+
+
+def growth_series(timestamps, workspace_ids, resource_counts):
+    """Work out the total number of resources at the end of each day that had an apply, across any number
+    of Workspaces. Each revision contributes the change in resource count since the previous revision of
+    the same Workspace (or its full count for the first revision), which are summed per day and then
+    cumulatively summed.
+
+    Args
+        timestamps: the created_at timestamp of each revision.
+        workspace_ids: the id of the Workspace each revision belongs to.
+        resource_counts: the resource count of each revision.
+    Returns
+        A tuple of two lists, the timestamp for the start of each day and the total resource count at the
+        end of that day.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if timestamps.size == 0:
+        return [], []
+    resource_counts = np.asarray(resource_counts, dtype=np.int64)
+    _, workspaces = np.unique(np.asarray(workspace_ids, dtype=str), return_inverse=True)
+
+    # Order by Workspace and then time so each Workspace's revisions are contiguous and in order.
+    order = np.lexsort((timestamps, workspaces))
+    timestamps, workspaces, resource_counts = timestamps[order], workspaces[order], resource_counts[order]
+
+    deltas = np.diff(resource_counts, prepend=0)
+    first_revisions = np.ones(workspaces.size, dtype=bool)
+    first_revisions[1:] = workspaces[1:] != workspaces[:-1]
+    deltas[first_revisions] = resource_counts[first_revisions]
+
+    days, day_indices = np.unique((timestamps // SECONDS_PER_DAY).astype(np.int64), return_inverse=True)
+    daily_deltas = np.bincount(day_indices, weights=deltas)
+
+    return (days * SECONDS_PER_DAY).tolist(), np.cumsum(daily_deltas).astype(np.int64).tolist()
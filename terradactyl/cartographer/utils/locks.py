@@ -0,0 +1,206 @@
+import logging
+import threading
+import time
+import uuid
+
+import redis
+
+from celery.result import AsyncResult
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'terradactyl:sync'
+
+# Only touch the lock if we still own it, otherwise we could extend or delete a lock that
+# has since expired and been picked up by another worker.
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    redis.call('pexpire', KEYS[2], ARGV[3])
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# The in flight marker is only cleared when it still points at the task releasing the lock, a request may
+# have coalesced onto the marker with a new task id while the lock was held.
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    if ARGV[2] ~= '' and redis.call('get', KEYS[2]) == ARGV[2] then
+        redis.call('del', KEYS[2])
+    end
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+CLEAR_TASK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_connection = None
+
+
+def get_redis_connection():
+    """Returns a Redis connection shared across the process, created on first use.
+    """
+    global _connection
+    if _connection is None:
+        _connection = redis.Redis.from_url(settings.REDIS_URL)
+    return _connection
+
+
+def _lock_key(name):
+    return f'{KEY_PREFIX}:{name}:lock'
+
+
+def _task_key(name):
+    return f'{KEY_PREFIX}:{name}:task'
+
+
+class SyncLockLostException(Exception):
+    """Raised when a lease can not be renewed because the lock is no longer held by us,
+    for example when the worker was paused for longer than the lock TTL.
+    """
+    pass
+
+
+class SyncLock():
+    """A Redis backed mutex used to make sure only one sync runs for a given key (e.g. an
+    Organization or Workspace) at any one time. The lock is held as a lease that expires
+    after ttl seconds so a dead worker can never hold it forever, while it is held a
+    background thread renews the lease so long running syncs keep it.
+
+    Args
+        name: the key to lock, e.g. 'sync-organization:myorg'.
+        ttl: the number of seconds the lease lasts without being renewed, defaults to SYNC_LOCK_TTL.
+        task_id: the id of the Celery task holding the lock, if it was enqueued by coalesce().
+
+    Usage:
+        with SyncLock('sync-organization:myorg', task_id=self.request.id) as lock:
+            if lock.acquired:
+                ...
+    """
+
+    def __init__(self, name: str, ttl: int = None, task_id: str = None):
+        self.name = name
+        self.ttl = ttl or settings.SYNC_LOCK_TTL
+        self.task_id = task_id
+        self.token = uuid.uuid4().hex
+        self.acquired = False
+        self._connection = get_redis_connection()
+        self._renew_script = self._connection.register_script(RENEW_SCRIPT)
+        self._release_script = self._connection.register_script(RELEASE_SCRIPT)
+        self._stop_renewing = threading.Event()
+        self._renewer = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def acquire(self):
+        """Try to take the lock without blocking. When taken a renewal thread is started
+        that keeps the lease alive until release() is called.
+
+        Returns
+            True if the lock was acquired, False if somebody else holds it.
+        """
+        self.acquired = bool(self._connection.set(_lock_key(self.name), self.token, nx=True, px=self.ttl * 1000))
+        if self.acquired:
+            self._stop_renewing.clear()
+            self._renewer = threading.Thread(target=self._renew_lease, daemon=True)
+            self._renewer.start()
+        return self.acquired
+
+    def renew(self):
+        """Extend the lease on the lock, along with any coalescing marker for the same key.
+
+        Raises
+            SyncLockLostException: when the lock is not held by this SyncLock.
+        """
+        renewed = self._renew_script(
+            keys=[_lock_key(self.name), _task_key(self.name)],
+            args=[self.token, self.ttl * 1000, settings.SYNC_COALESCE_TTL * 1000])
+        if not renewed:
+            raise SyncLockLostException(f'Lost the lock for {self.name}.')
+
+    def release(self):
+        """Release the lock if held and, when it still points at this lock's task, clear the in flight
+        marker so the next request for this key starts a new task rather than attaching to this one.
+        """
+        if not self.acquired:
+            return
+        self._stop_renewing.set()
+        if self._renewer:
+            self._renewer.join()
+        self._release_script(keys=[_lock_key(self.name), _task_key(self.name)], args=[self.token, self.task_id or ''])
+        self.acquired = False
+
+    def wait(self, timeout: int = None, interval: float = 1.0):
+        """Block until whoever holds the lock releases it. Used to attach to an in flight
+        sync rather than duplicating the work.
+
+        Args
+            timeout: the maximum number of seconds to wait, defaults to waiting indefinitely.
+            interval: the number of seconds between checks.
+        Returns
+            True if the lock was released, False if the timeout was reached first.
+        """
+        started_at = time.monotonic()
+        while self._connection.exists(_lock_key(self.name)):
+            if timeout is not None and (time.monotonic() - started_at) > timeout:
+                return False
+            time.sleep(interval)
+        return True
+
+    def _renew_lease(self):
+        while not self._stop_renewing.wait(self.ttl / 3):
+            try:
+                self.renew()
+            except SyncLockLostException as error:
+                logger.error(f'{error} Another sync may now be running concurrently.')
+                return
+            except redis.RedisError as error:
+                logger.warning(f'Unable to renew lock for {self.name}, will try again. Error: {error}.')
+
+
+def coalesce(name: str, task, *args, **kwargs):
+    """Enqueue a task for the given key unless one is already queued or running, in which
+    case the request attaches to the in flight task instead of starting another.
+
+    Args
+        name: the key that identifies the work, e.g. 'sync-workspace:myorg:myworkspace'.
+        task: the Celery task to enqueue.
+        args, kwargs: the arguments to pass to the task.
+    Returns
+        An AsyncResult for the task that is doing the work.
+    """
+    connection = get_redis_connection()
+    while True:
+        task_id = f'{name}:{uuid.uuid4().hex}'
+        if connection.set(_task_key(name), task_id, nx=True, ex=settings.SYNC_COALESCE_TTL):
+            return task.apply_async(args=args, kwargs=kwargs, task_id=task_id)
+
+        in_flight_task_id = connection.get(_task_key(name))
+        if in_flight_task_id:
+            logger.info(f'Request for {name} attached to in flight task {in_flight_task_id.decode()}.')
+            return AsyncResult(in_flight_task_id.decode())
+        # The in flight task finished between the two calls, try again.
+
+
+def clear_in_flight(name: str, task_id: str):
+    """Clear the in flight marker for the key, but only if it still points at the given task.
+    Used by tasks that attached to another sync rather than taking the lock themselves.
+
+    Args
+        name: the key that identifies the work.
+        task_id: the id of the task that the marker should be pointing at.
+    """
+    connection = get_redis_connection()
+    connection.register_script(CLEAR_TASK_SCRIPT)(keys=[_task_key(name)], args=[task_id])
@@ -0,0 +1,77 @@
+def instance_keys(instances):
+    """Normalise a Resource's instances so two sets of instances can be compared.
+
+    Args
+        instances: the instances, as {'index_key': ..., 'iid': ...} dicts or [index_key, iid] pairs.
+    Returns
+        A sorted tuple of (index_key, iid) string pairs.
+    """
+    pairs = [(i['index_key'], i['iid']) if isinstance(i, dict) else tuple(i) for i in instances]
+    return tuple(sorted((str(index_key), str(iid)) for index_key, iid in pairs))
+
+
+# Attributes of a Resource that are written along with its instances, a Resource where any of them differ
+# is rewritten.
+RESOURCE_ATTRIBUTES = ('name', 'mode', 'provider')
+
+
+def resource_changed(previous: dict, current: dict, attributes=RESOURCE_ATTRIBUTES):
+    """Returns whether a Resource has to be rewritten, because its instances or any of the attributes differ.
+    An attribute missing from the previous Resource, e.g. the provider of a Resource without instances, isn't
+    compared as nothing was stored for it.
+    """
+    if instance_keys(current['instances']) != instance_keys(previous['instances']):
+        return True
+    return any(previous.get(attribute) is not None and previous[attribute] != current[attribute] for attribute in attributes)
+
+
+def diff_resources(previous: dict, current: dict):
+    """Work out what changed between the Resources of two consecutive states.
+
+    A Resource that has gone from one namespace and appeared under another with the same resource type
+    and exactly the same instance ids is treated as moved (e.g. by a moved block or state mv), so it can
+    be renamed rather than dropped and created again.
+
+    Args
+        previous: the Resources of the previous state, namespace to {'resource_type': ..., 'instances': ...}
+                  along with any of the RESOURCE_ATTRIBUTES.
+        current: the Resources of the new state, in the same form.
+    Returns
+        A dict of:
+            unchanged: namespaces whose instances and attributes are the same in both states.
+            changed: namespaces in both states whose instances or attributes differ.
+            moved: a dict of previous namespace to its new namespace.
+            added: namespaces only in the new state.
+            removed: namespaces only in the previous state.
+    """
+    unchanged, changed = [], []
+    for namespace in current.keys() & previous.keys():
+        if resource_changed(previous[namespace], current[namespace]):
+            changed.append(namespace)
+        else:
+            unchanged.append(namespace)
+
+    added = current.keys() - previous.keys()
+    removed = previous.keys() - current.keys()
+
+    # Match up removed and added Resources with the same type and instance ids.
+    removed_by_identity = {}
+    for namespace in sorted(removed):
+        iids = frozenset(iid for _, iid in instance_keys(previous[namespace]['instances']))
+        if iids:
+            removed_by_identity.setdefault((previous[namespace]['resource_type'], iids), []).append(namespace)
+
+    moved = {}
+    for namespace in sorted(added):
+        iids = frozenset(iid for _, iid in instance_keys(current[namespace]['instances']))
+        candidates = removed_by_identity.get((current[namespace]['resource_type'], iids))
+        if candidates:
+            moved[candidates.pop(0)] = namespace
+
+    return {
+        'unchanged': sorted(unchanged),
+        'changed': sorted(changed),
+        'moved': moved,
+        'added': sorted(added - set(moved.values())),
+        'removed': sorted(removed - moved.keys())
+    }
@@ -0,0 +1,23 @@
+def check_interval(apply_timestamps, now: float, min_interval: int, max_interval: int, history_window: int, checks_per_apply: int):
+    """Work out how often a Workspace should be checked for changes based on how often it has
+    been applied recently. The average gap between applies is measured up to now (rather than
+    to the latest apply) so a Workspace that has gone quiet drifts towards the max_interval.
+
+    Args
+        apply_timestamps: the created_at timestamps of the Workspace's state revisions.
+        now: the current timestamp.
+        min_interval: the shortest interval to return, in seconds.
+        max_interval: the longest interval to return, in seconds.
+        history_window: only applies within this many seconds of now are considered.
+        checks_per_apply: how many times to check within the average gap between applies.
+    Returns
+        The number of seconds to wait before checking the Workspace again.
+    """
+    recent_applies = [float(t) for t in apply_timestamps if (now - float(t)) <= history_window]
+    if not recent_applies:
+        return max_interval
+
+    average_gap = (now - min(recent_applies)) / len(recent_applies)
+    interval = average_gap / checks_per_apply
+
+    return int(min(max(interval, min_interval), max_interval))
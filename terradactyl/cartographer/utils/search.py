@@ -0,0 +1,230 @@
+import bisect
+import json
+import logging
+import threading
+
+from cartographer.utils.cache import GENERATION_KEY, get_sync_generation
+from cartographer.utils.locks import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# Sorted set of Workspace names scored by the sync generation they last changed in.
+CHANGES_KEY = 'terradactyl:search:changes'
+
+# Bump the sync generation and score the changed Workspaces with the new generation in one step, otherwise
+# an index refreshed between the two could skip past a change scored with an older generation.
+RECORD_CHANGE_SCRIPT = """
+local generation = redis.call('incr', KEYS[1])
+for _, name in ipairs(ARGV) do
+    redis.call('zadd', KEYS[2], generation, name)
+end
+return generation
+"""
+
+KIND_WORKSPACE = 'workspace'
+KIND_NAMESPACE = 'namespace'
+KIND_RESOURCE_TYPE = 'resource_type'
+KIND_IID = 'iid'
+
+
+def trigrams(text: str):
+    """Returns the set of three character substrings of the (lower cased) text.
+    """
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex():
+    """An in memory substring index. Every entry is broken into trigrams and each trigram maps to the
+    entries containing it, so a search only has to check the entries holding the query's rarest trigram
+    rather than scanning them all. Entries are also kept in sorted order so exact and prefix matches,
+    which rank first, are found by binary search. Entries are grouped by Workspace so a Workspace's
+    entries can be replaced as a whole when it is synced.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._postings = {}
+        self._sorted = []
+        self._workspace_entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @classmethod
+    def build(cls, workspaces):
+        """Build an index from scratch, sorting the entries once at the end rather than on every insert.
+
+        Args
+            workspaces: (workspace, organization, entries) tuples, see replace_workspace().
+        Returns
+            The new TrigramIndex.
+        """
+        index = cls()
+        for workspace, organization, entries in workspaces:
+            index._add_workspace(workspace, organization, entries, keep_sorted=False)
+        index._sorted.sort()
+        return index
+
+    def copy(self):
+        """Returns a copy of the index that can be changed without changing this one.
+        """
+        index = TrigramIndex()
+        index._entries = dict(self._entries)
+        index._postings = {trigram: set(keys) for trigram, keys in self._postings.items()}
+        index._sorted = list(self._sorted)
+        index._workspace_entries = dict(self._workspace_entries)
+        return index
+
+    def replace_workspace(self, workspace: str, organization: str, entries):
+        """Replace every entry indexed for a Workspace.
+
+        Args
+            workspace: the name of the Workspace.
+            organization: the name of the Workspace's Organization.
+            entries: (kind, value) pairs to index for the Workspace, e.g. ('namespace', 'aws_s3_bucket.logs').
+        """
+        self.remove_workspace(workspace)
+        self._add_workspace(workspace, organization, entries)
+
+    def _add_workspace(self, workspace, organization, entries, keep_sorted=True):
+        keys = set()
+        for kind, value in entries:
+            if not value:
+                continue
+            key = (kind, value, workspace)
+            if key in keys:
+                continue
+            keys.add(key)
+            text = value.lower()
+            self._entries[key] = (text, organization)
+            if keep_sorted:
+                bisect.insort(self._sorted, (text, key))
+            else:
+                self._sorted.append((text, key))
+            for trigram in trigrams(text):
+                self._postings.setdefault(trigram, set()).add(key)
+        self._workspace_entries[workspace] = keys
+
+    def remove_workspace(self, workspace: str):
+        """Remove every entry indexed for a Workspace.
+        """
+        for key in self._workspace_entries.pop(workspace, ()):
+            text, _ = self._entries.pop(key)
+            del self._sorted[bisect.bisect_left(self._sorted, (text, key))]
+            for trigram in trigrams(text):
+                postings = self._postings.get(trigram)
+                if postings is not None:
+                    postings.discard(key)
+                    if not postings:
+                        del self._postings[trigram]
+
+    def search(self, query: str, kind: str = None, limit: int = 20):
+        """Find the entries containing the query, case insensitively.
+
+        Args
+            query: the text to search for.
+            kind: optionally only return entries of this kind.
+            limit: the maximum number of results to return, None for all of them.
+        Returns
+            A list of dicts containing the kind, value, workspace and organization of each match. Exact and
+            prefix matches come first in alphabetical order, then other matches containing the query.
+        """
+        query = query.lower()
+        if not query:
+            return []
+
+        matches = []
+        position = bisect.bisect_left(self._sorted, (query,))
+        while position < len(self._sorted) and (limit is None or len(matches) < limit):
+            text, key = self._sorted[position]
+            if not text.startswith(query):
+                break
+            if not kind or key[0] == kind:
+                matches.append(key)
+            position += 1
+
+        others = []
+        if limit is None or len(matches) < limit:
+            query_trigrams = trigrams(query)
+            if query_trigrams:
+                # Walk the rarest trigram's entries, the rest only need checking for a match.
+                candidates = min((self._postings.get(t, ()) for t in query_trigrams), key=len)
+            else:
+                candidates = self._entries.keys()
+            for key in candidates:
+                if limit is not None and len(matches) + len(others) >= limit:
+                    break
+                text, _ = self._entries[key]
+                if (not kind or key[0] == kind) and query in text and not text.startswith(query):
+                    others.append((len(text), text, key))
+
+        matches.extend(key for *_, key in sorted(others))
+        return [{
+            'kind': key[0],
+            'value': key[1],
+            'workspace': key[2],
+            'organization': self._entries[key][1]
+        } for key in matches]
+
+
+def _document_entries(document):
+    yield KIND_WORKSPACE, document['name']
+    for resource in document['resources']:
+        yield KIND_NAMESPACE, resource['namespace']
+        yield KIND_RESOURCE_TYPE, resource['resource_type']
+        for iid in resource['iids']:
+            yield KIND_IID, iid
+        # Resources synced with COMPACT_RESOURCE_INSTANCES hold their instances packed as [index_key, iid] pairs.
+        for packed in resource.get('instances', ()):
+            for _, iid in json.loads(packed):
+                yield KIND_IID, iid
+
+
+def record_search_change(*workspace_names):
+    """Bump the sync generation, marking Workspaces as changed in it so their search entries are refreshed.
+    Call in place of bump_sync_generation() whenever a sync changes Workspaces.
+
+    Args
+        workspace_names: the names of the Workspaces that have changed.
+    Returns
+        The new sync generation.
+    """
+    connection = get_redis_connection()
+    return connection.register_script(RECORD_CHANGE_SCRIPT)(keys=[GENERATION_KEY, CHANGES_KEY], args=list(workspace_names))
+
+
+_index = None
+_index_generation = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    """Returns the TrigramIndex for the current sync generation. The index is built from the graph database
+    the first time it is needed, then only the Workspaces that syncs have changed since are re-read. The
+    index returned is never changed afterwards, so it can be searched without holding a lock.
+    """
+    global _index, _index_generation
+    # Imported here to keep this module free of the graph database for the index above.
+    from cartographer.gizmo.models import Workspace
+
+    generation = get_sync_generation()
+    with _index_lock:
+        if _index is None:
+            index = TrigramIndex.build((d['name'], d['organization'], _document_entries(d)) for d in Workspace.vertices.search_documents())
+            logger.info(f'Built search index of {len(index)} entries.')
+            _index = index
+        elif _index_generation != generation:
+            changed = [name.decode() for name in get_redis_connection().zrangebyscore(CHANGES_KEY, f'({_index_generation}', '+inf')]
+            documents = {d['name']: d for d in Workspace.vertices.search_documents(names=changed)} if changed else {}
+            # Other threads may be searching the current index, so the changes are made to a copy that replaces it.
+            index = _index.copy()
+            for name in changed:
+                if name in documents:
+                    index.replace_workspace(name, documents[name]['organization'], _document_entries(documents[name]))
+                else:
+                    index.remove_workspace(name)
+            _index = index
+            logger.debug(f'Refreshed search entries for {len(changed)} Workspaces.')
+        _index_generation = generation
+        return _index
@@ -0,0 +1,277 @@
+import gzip
+import itertools
+import json
+import logging
+import time
+import uuid
+
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from gremlin_python.process.graph_traversal import __
+from gremlin_python.process.traversal import T
+
+from cartographer.gizmo import Gizmo
+from cartographer.gizmo.models import Workspace
+from cartographer.models import (OrganizationSyncJob, OrganizationSyncJobCheckpoint, ResourceInstanceOwner, StateInstanceCount,
+                                 TerraformCloudOrganization, WorkspaceApplyRollup, WorkspaceApplyRollupCursor, WorkspaceRunDuration,
+                                 WorkspaceSyncSchedule)
+from cartographer.utils.cache import bump_dependency_generation
+from cartographer.utils.garbage import drop_in_batches
+from cartographer.utils.search import record_search_change
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 'terradactyl-graph-snapshot'
+VERSION = 1
+
+# Number of Vertices or Edges created per traversal when importing a snapshot.
+IMPORT_BATCH_SIZE = 200
+# Number of database rows written per query when importing a snapshot.
+OBJECT_BATCH_SIZE = 1000
+
+VERTEX = 'v'
+EDGE = 'e'
+OBJECT = 'o'
+
+# The database models exported alongside the graph, in the order they have to be loaded. API keys are never
+# exported, Organizations are matched up by name on import.
+SYNC_MODELS = [OrganizationSyncJob, OrganizationSyncJobCheckpoint, WorkspaceSyncSchedule, WorkspaceApplyRollupCursor,
+               WorkspaceApplyRollup, WorkspaceRunDuration, ResourceInstanceOwner, StateInstanceCount]
+
+
+class SnapshotFormatException(Exception):
+    """Raised when a file being imported is not a graph snapshot, or is from an unsupported version.
+    """
+    pass
+
+
+def write_snapshot(fileobj, organizations, vertices, edges, objects):
+    """Write a snapshot as gzip compressed JSON lines, one record per line, so neither writing nor reading it
+    ever needs the whole graph in memory.
+
+    Args
+        fileobj: the binary file to write to.
+        organizations: the names of the Organizations in the snapshot.
+        vertices: (id, label, properties) for each Vertex.
+        edges: (label, out_vertex_id, in_vertex_id, properties) for each Edge.
+        objects: database rows serialized with the Django 'python' serializer.
+    Returns
+        A dict of the number of vertices, edges and objects written.
+    """
+    counts = {'vertices': 0, 'edges': 0, 'objects': 0}
+    with gzip.open(fileobj, 'wt', encoding='utf-8') as stream:
+        header = {'format': FORMAT, 'version': VERSION, 'exported_at': time.time(), 'organizations': sorted(organizations)}
+        stream.write(json.dumps(header) + '\n')
+        for _id, label, properties in vertices:
+            stream.write(json.dumps([VERTEX, _id, label, properties], separators=(',', ':')) + '\n')
+            counts['vertices'] += 1
+        for label, out_id, in_id, properties in edges:
+            stream.write(json.dumps([EDGE, label, out_id, in_id, properties], separators=(',', ':')) + '\n')
+            counts['edges'] += 1
+        for obj in objects:
+            stream.write(json.dumps([OBJECT, obj], separators=(',', ':'), cls=DjangoJSONEncoder) + '\n')
+            counts['objects'] += 1
+    return counts
+
+
+def read_snapshot(fileobj):
+    """Read a snapshot written by write_snapshot().
+
+    Args
+        fileobj: the binary file to read from.
+    Returns
+        The header dict and a generator of the records that follow it, each a list starting with its kind.
+    Raises
+        SnapshotFormatException: when the file isn't a snapshot this version can read.
+    """
+    stream = gzip.open(fileobj, 'rt', encoding='utf-8')
+    try:
+        header = json.loads(stream.readline())
+    except (OSError, ValueError) as error:
+        raise SnapshotFormatException(f'Not a graph snapshot: {error}.')
+    if not isinstance(header, dict) or header.get('format') != FORMAT:
+        raise SnapshotFormatException('Not a graph snapshot.')
+    if header.get('version') != VERSION:
+        raise SnapshotFormatException(f'Unsupported snapshot version {header.get("version")}, expected {VERSION}.')
+
+    def records():
+        with stream:
+            for line in stream:
+                yield json.loads(line)
+    return header, records()
+
+
+def _graph_vertices():
+    for element_map in Gizmo().g.V().elementMap():
+        _id = element_map.pop(T.id)
+        label = element_map.pop(T.label)
+        yield _id, label, element_map
+
+
+def _graph_edges():
+    query = Gizmo().g.E().project('label', 'out', 'in', 'properties') \
+        .by(T.label) \
+        .by(__.outV().id_()) \
+        .by(__.inV().id_()) \
+        .by(__.valueMap())
+    for edge in query:
+        yield edge['label'], edge['out'], edge['in'], edge['properties']
+
+
+def _sync_objects():
+    # Organizations are referred to by name as their ids differ between databases.
+    organization_names = dict(TerraformCloudOrganization.objects.values_list('id', 'name'))
+    for model in SYNC_MODELS:
+        for obj in serializers.serialize('python', model.objects.order_by('pk').iterator()):
+            if obj['fields'].get('organization') is not None:
+                obj['fields']['organization'] = organization_names[obj['fields']['organization']]
+            yield obj
+
+
+def export_graph(fileobj):
+    """Export every Vertex and Edge in the graph database, along with the sync metadata in the database, to a
+    snapshot that import_graph() can restore without calling Terraform Cloud.
+
+    Args
+        fileobj: the binary file to write to.
+    Returns
+        A dict of the number of vertices, edges and objects exported.
+    """
+    started_at = time.monotonic()
+    organizations = TerraformCloudOrganization.objects.values_list('name', flat=True)
+    counts = write_snapshot(fileobj, organizations, _graph_vertices(), _graph_edges(), _sync_objects())
+    logger.info(f'Exported {counts} in {time.monotonic() - started_at:.1f}s.')
+    return counts
+
+
+def _flush_vertices(batch, vertex_ids):
+    query = Gizmo().g
+    keys = []
+    for n, (_id, label, properties) in enumerate(batch):
+        query = query.addV(label)
+        for k, v in properties.items():
+            query = query.property(k, v)
+        keys.append(f'v{n}')
+        query = query.as_(keys[-1])
+    # select() with a single key returns the value rather than a dict of them.
+    if len(keys) == 1:
+        vertex_ids[batch[0][0]] = query.id_().next()
+    else:
+        new_ids = query.select(*keys).by(T.id).next()
+        for n, (_id, _, _) in enumerate(batch):
+            vertex_ids[_id] = new_ids[keys[n]]
+    return len(batch)
+
+
+def _flush_edges(batch, vertex_ids):
+    query = Gizmo().g
+    for label, out_id, in_id, properties in batch:
+        query = query.V(vertex_ids[out_id]).addE(label).to(__.V(vertex_ids[in_id]))
+        for k, v in properties.items():
+            query = query.property(k, v)
+    query.iterate()
+    return len(batch)
+
+
+def _bulk_create(batch):
+    model = type(batch[0].object)
+    model.objects.bulk_create([o.object for o in batch], ignore_conflicts=True)
+    return len(batch)
+
+
+def _load_objects(objects, organization_ids):
+    """Replace the sync metadata of the snapshot's Organizations with the rows in the snapshot.
+    """
+    OrganizationSyncJob.objects.filter(organization_id__in=organization_ids.values()).delete()
+    for model in SYNC_MODELS[2:]:
+        model.objects.filter(organization_id__in=organization_ids.values()).delete()
+
+    count = 0
+    batch = []
+    # Every row gets a new id so nothing already in the database is overwritten, checkpoints follow their job's new id.
+    job_ids = {}
+    for obj in objects:
+        if obj['fields'].get('organization') is not None:
+            obj['fields']['organization'] = organization_ids[obj['fields']['organization']]
+        if obj['model'] == OrganizationSyncJob._meta.label_lower:
+            job_ids[obj['pk']] = str(uuid.uuid4())
+            obj['pk'] = job_ids[obj['pk']]
+        else:
+            obj['pk'] = None
+            if obj['model'] == OrganizationSyncJobCheckpoint._meta.label_lower:
+                obj['fields']['sync_job'] = job_ids.get(obj['fields']['sync_job'])
+                if obj['fields']['sync_job'] is None:
+                    continue
+        if batch and batch[-1].object._meta.label_lower != obj['model'] or len(batch) >= OBJECT_BATCH_SIZE:
+            count += _bulk_create(batch)
+            batch = []
+        batch.extend(serializers.deserialize('python', [obj]))
+    if batch:
+        count += _bulk_create(batch)
+    return count
+
+
+def import_graph(fileobj, replace: bool = False):
+    """Restore a snapshot written by export_graph(), creating the Vertices and Edges in batches of
+    IMPORT_BATCH_SIZE per traversal. The graph database has to be empty unless replace is set.
+
+    Args
+        fileobj: the binary file to read from.
+        replace: drop everything in the graph database first.
+    Returns
+        A dict of the number of vertices, edges and objects imported.
+    Raises
+        SnapshotFormatException: when the file isn't a snapshot this version can read.
+        ValueError: when the graph database isn't empty and replace isn't set.
+    """
+    started_at = time.monotonic()
+    header, records = read_snapshot(fileobj)
+
+    if replace:
+        drop_in_batches(lambda: Gizmo().g.V())
+    elif Gizmo().g.V().limit(1).hasNext():
+        raise ValueError('The graph database is not empty, import with replace to drop what is in it first.')
+
+    # Organizations are matched up by name, their API keys have to be added again if they don't exist here.
+    organization_ids = {}
+    for name in header['organizations']:
+        organization, _ = TerraformCloudOrganization.objects.get_or_create(name=name)
+        organization_ids[name] = organization.id
+
+    counts = {'vertices': 0, 'edges': 0, 'objects': 0}
+    vertex_ids = {}
+    vertices, edges = [], []
+    # Records are written Vertices, then Edges, then database rows, so each batch is flushed before the next kind.
+    first_object = None
+    for record in records:
+        kind = record[0]
+        if kind == VERTEX:
+            vertices.append(record[1:])
+            if len(vertices) >= IMPORT_BATCH_SIZE:
+                counts['vertices'] += _flush_vertices(vertices, vertex_ids)
+                vertices = []
+        elif kind == EDGE:
+            if vertices:
+                counts['vertices'] += _flush_vertices(vertices, vertex_ids)
+                vertices = []
+            edges.append(record[1:])
+            if len(edges) >= IMPORT_BATCH_SIZE:
+                counts['edges'] += _flush_edges(edges, vertex_ids)
+                edges = []
+        elif kind == OBJECT:
+            first_object = record
+            break
+    if vertices:
+        counts['vertices'] += _flush_vertices(vertices, vertex_ids)
+    if edges:
+        counts['edges'] += _flush_edges(edges, vertex_ids)
+
+    if first_object is not None:
+        with transaction.atomic():
+            counts['objects'] = _load_objects((record[1] for record in itertools.chain([first_object], records)), organization_ids)
+
+    bump_dependency_generation()
+    record_search_change(*Workspace.vertices.organizations())
+    logger.info(f'Imported {counts} in {time.monotonic() - started_at:.1f}s.')
+    return counts
@@ -0,0 +1,271 @@
+import datetime
+import json
+import logging
+import os
+import time
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+
+from django.conf import settings
+from gremlin_python.process.graph_traversal import __
+
+from cartographer.gizmo import Gizmo
+from cartographer.gizmo.models import Resource, State, Workspace
+from cartographer.models import ResourceInstanceOwner, StateInstanceCount, TerraformCloudOrganization
+from cartographer.utils.cache import bump_dependency_generation
+from cartographer.utils.garbage import drop_in_batches
+from cartographer.utils.search import record_search_change
+from cartographer.utils.terraform_cloud import (build_resource_adjacency, parse_resources, parse_workspace_dependencies,
+                                                summarise_state)
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE_EXTENSIONS = ('.tfstate', '.json')
+
+# Number of Vertices or Edges created per traversal when importing state files.
+IMPORT_BATCH_SIZE = 200
+
+
+def find_state_files(root: str):
+    """Find the state files for each Workspace in a directory laid out as either
+    <root>/<organization>/<workspace>.tfstate for a single state per Workspace, or
+    <root>/<organization>/<workspace>/<any path>.tfstate for a Workspace's state revisions.
+    Files ending .json are read too, e.g. state versions downloaded from Terraform Cloud.
+
+    Args
+        root: the directory to search.
+    Returns
+        A dict of (organization, workspace name) to the sorted paths of the Workspace's state files.
+    """
+    workspaces = {}
+    for organization in sorted(os.listdir(root)):
+        organization_dir = os.path.join(root, organization)
+        if not os.path.isdir(organization_dir):
+            continue
+        for entry in sorted(os.listdir(organization_dir)):
+            path = os.path.join(organization_dir, entry)
+            if os.path.isdir(path):
+                paths = sorted(os.path.join(directory, filename) for directory, _, filenames in os.walk(path)
+                               for filename in filenames if filename.endswith(STATE_FILE_EXTENSIONS))
+                if paths:
+                    workspaces.setdefault((organization, entry), []).extend(paths)
+            elif entry.endswith(STATE_FILE_EXTENSIONS):
+                workspaces.setdefault((organization, os.path.splitext(entry)[0]), []).append(path)
+    return workspaces
+
+
+def offline_workspace_id(organization: str, workspace_name: str):
+    """Returns the workspace_id given to a Workspace imported from state files, which have no Terraform Cloud id.
+    """
+    return f'ws-offline-{organization}-{workspace_name}'
+
+
+def _state_id(path: str, organization: str, workspace_name: str, serial: int):
+    # State versions downloaded from Terraform Cloud are named after their id, anything else is named by serial.
+    name = os.path.splitext(os.path.basename(path))[0]
+    return name if name.startswith('sv-') else f'{organization}:{workspace_name}:{serial}'
+
+
+def parse_workspace(organization: str, workspace_name: str, paths):
+    """Parse a Workspace's state files, the last revision (by serial) being the current state. Run in a
+    process pool by import_states() so it only reads files and never touches the graph or the database.
+
+    Args
+        organization: the name of the Organization the Workspace belongs to.
+        workspace_name: the name of the Workspace.
+        paths: the paths of the Workspace's state files.
+    Returns
+        A dict containing the Workspace's name, organization, workspace_id and created_at, its revisions (as
+        returned by summarise_state() with a state_id and created_at, oldest first), and its depends_on,
+        resources and resource_dependencies parsed from the current state.
+    """
+    revisions = {}
+    for path in paths:
+        with open(path) as f:
+            state = json.load(f)
+        revision = summarise_state(state)
+        revision['state_id'] = _state_id(path, organization, workspace_name, revision['serial'])
+        revision['created_at'] = os.path.getmtime(path)
+        revisions[revision['state_id']] = (revision, state['resources'])
+    revisions = sorted(revisions.values(), key=lambda r: (r[0]['serial'], r[0]['created_at']))
+    _, state_resources = revisions[-1]
+
+    try:
+        depends_on = parse_workspace_dependencies(state_resources, workspace_name)
+    except KeyError:
+        logger.warning(f'Unable to parse the dependencies of Workspace {workspace_name}, skipping them.')
+        depends_on = {}
+
+    resources = parse_resources(state_resources)
+    for resource in resources.values():
+        resource['provider'] = resource['provider'].replace('provider[\"', '').replace('\"]', '')
+
+    return {
+        'name': workspace_name,
+        'organization': organization,
+        'workspace_id': offline_workspace_id(organization, workspace_name),
+        'created_at': min(revision['created_at'] for revision, _ in revisions),
+        'revisions': [revision for revision, _ in revisions],
+        'depends_on': depends_on,
+        'resources': resources,
+        'resource_dependencies': build_resource_adjacency(resources)
+    }
+
+
+def _workspace_dependencies(workspace: dict, known_workspaces):
+    """Returns the Workspaces the Workspace depends on as (workspace_id, lookup_type, redundant), one per
+    dependency like Workspace.depends_on(), leaving out any that aren't being imported.
+    """
+    dependencies = {}
+    for dependency in workspace['depends_on'].values():
+        key = (dependency['organization'], dependency['workspace_name'])
+        if dependency['workspace_name'] == workspace['name'] or key in dependencies:
+            continue
+        if key not in known_workspaces:
+            logger.debug(f'Workspace {workspace["name"]} depends on {dependency["workspace_name"]} which is not being imported.')
+            continue
+        dependencies[key] = (offline_workspace_id(*key), dependency['lookup_type'], str(dependency['redundant']).lower())
+    return list(dependencies.values())
+
+
+def _add_vertices(vertices):
+    """Create Vertices, given as (label, properties), IMPORT_BATCH_SIZE per traversal.
+    """
+    for start in range(0, len(vertices), IMPORT_BATCH_SIZE):
+        query = Gizmo().g
+        for label, properties in vertices[start:start + IMPORT_BATCH_SIZE]:
+            query = query.addV(label)
+            for k, v in properties.items():
+                query = query.property(k, v)
+        query.iterate()
+
+
+def _add_edges(edges):
+    """Create Edges, given as (label, (out label, key, value), (in label, key, value), properties) where the key and
+    value look up each end of the Edge, IMPORT_BATCH_SIZE per traversal.
+    """
+    for start in range(0, len(edges), IMPORT_BATCH_SIZE):
+        query = Gizmo().g
+        for label, (out_label, out_key, out_value), (in_label, in_key, in_value), properties in edges[start:start + IMPORT_BATCH_SIZE]:
+            query = query.V().hasLabel(out_label).has(out_key, out_value) \
+                .addE(label).to(__.V().hasLabel(in_label).has(in_key, in_value))
+            for k, v in properties.items():
+                query = query.property(k, v)
+        query.iterate()
+
+
+def _write_workspaces(workspaces, known_workspaces, organizations):
+    """Write a batch of parsed Workspaces, their revisions and their current state's Resources.
+
+    Returns
+        The depends_on Edges of the Workspaces, to create once every Workspace exists.
+    """
+    last_updated = str(datetime.datetime.utcnow().timestamp())
+    vertices, edges, dependency_edges = [], [], []
+    for workspace in workspaces:
+        current = workspace['revisions'][-1]
+        dependencies = _workspace_dependencies(workspace, known_workspaces)
+        vertices.append((Workspace.label, {
+            'workspace_id': workspace['workspace_id'],
+            'name': workspace['name'],
+            'organization': workspace['organization'],
+            'created_at': workspace['created_at'],
+            'last_updated': last_updated,
+            'revisions_indexed': True,
+            # The summary is known up front, so there's no need for update_summary().
+            'terraform_version': current['terraform_version'],
+            'serial': current['serial'],
+            'resource_count': current['resource_count'],
+            'dependency_count': len(dependencies),
+            'redundant_dependency_count': len([d for d in dependencies if d[2] == 'true']),
+            'revision_count': len(workspace['revisions'])
+        }))
+        for ordinal, revision in enumerate(workspace['revisions']):
+            properties = dict(revision, owner_workspace_id=workspace['workspace_id'], ordinal=ordinal)
+            if revision is current:
+                properties['resource_dependencies'] = json.dumps(workspace['resource_dependencies'], sort_keys=True)
+            vertices.append((State.label, properties))
+            if ordinal > 0:
+                edges.append(('succeeded', (State.label, 'state_id', revision['state_id']),
+                              (State.label, 'state_id', workspace['revisions'][ordinal - 1]['state_id']), {}))
+        edges.append(('has_current_state', (Workspace.label, 'workspace_id', workspace['workspace_id']),
+                      (State.label, 'state_id', current['state_id']), {}))
+        dependency_edges.extend(('depends_on', (Workspace.label, 'workspace_id', workspace['workspace_id']),
+                                 (Workspace.label, 'workspace_id', target_id), {'redundant': redundant, 'type': lookup_type})
+                                for target_id, lookup_type, redundant in dependencies)
+
+    _add_vertices(vertices)
+    _add_edges(edges)
+
+    for workspace in workspaces:
+        state_id = workspace['revisions'][-1]['state_id']
+        resources = workspace['resources']
+        Resource.vertices.bulk_create(state_id, resources, compact=settings.COMPACT_RESOURCE_INSTANCES)
+
+        instance_owners = []
+        instance_counts = Counter()
+        for namespace, resource in resources.items():
+            instance_owners.extend((instance['iid'], namespace) for instance in resource['instances'])
+            instance_counts[(resource['provider'], resource['resource_type'])] += len(resource['instances'])
+        organization = organizations[workspace['organization']]
+        ResourceInstanceOwner.replace(organization, workspace['name'], state_id, instance_owners)
+        StateInstanceCount.record(organization, workspace['name'], state_id, instance_counts)
+
+    return dependency_edges
+
+
+def import_states(root: str, workers: int = None, replace: bool = False):
+    """Build the graph from a directory of state files rather than from Terraform Cloud, e.g. for air gapped
+    analysis or to load synthetic Workspaces for benchmarking. See find_state_files() for the layout. Files are
+    parsed in a pool of worker processes while the graph is written in batches. The graph database has to be
+    empty unless replace is set.
+
+    Args
+        root: the directory of state files.
+        workers: the number of processes to parse files with, defaults to the number of CPUs.
+        replace: drop everything in the graph database first.
+    Returns
+        A dict of the number of workspaces, states, resources and dependencies imported.
+    Raises
+        ValueError: when the graph database isn't empty and replace isn't set.
+    """
+    started_at = time.monotonic()
+    state_files = find_state_files(root)
+
+    if replace:
+        drop_in_batches(lambda: Gizmo().g.V())
+    elif Gizmo().g.V().limit(1).hasNext():
+        raise ValueError('The graph database is not empty, import with replace to drop what is in it first.')
+
+    organizations = {name: TerraformCloudOrganization.objects.get_or_create(name=name)[0]
+                     for name in {organization for organization, _ in state_files}}
+
+    counts = Counter()
+    pending, dependency_edges = [], []
+    keys = list(state_files)
+    # django.setup() lets the workers import this module where processes are spawned rather than forked.
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        parsed = executor.map(parse_workspace, [k[0] for k in keys], [k[1] for k in keys], [state_files[k] for k in keys],
+                              chunksize=16)
+        for workspace in parsed:
+            pending.append(workspace)
+            counts['workspaces'] += 1
+            counts['states'] += len(workspace['revisions'])
+            counts['resources'] += len(workspace['resources'])
+            if sum(len(w['revisions']) + 1 for w in pending) >= IMPORT_BATCH_SIZE:
+                dependency_edges.extend(_write_workspaces(pending, state_files, organizations))
+                pending = []
+                logger.info(f'Imported {counts["workspaces"]} of {len(keys)} Workspaces.')
+    if pending:
+        dependency_edges.extend(_write_workspaces(pending, state_files, organizations))
+
+    _add_edges(dependency_edges)
+    counts['dependencies'] = len(dependency_edges)
+
+    bump_dependency_generation()
+    record_search_change(*[name for _, name in keys])
+    logger.info(f'Imported {dict(counts)} from {root} in {time.monotonic() - started_at:.1f}s.')
+    return dict(counts)
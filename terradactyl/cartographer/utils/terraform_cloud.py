@@ -1,10 +1,15 @@
 import datetime
 import logging
 import threading
+import time
 
 import requests
 
-from cartographer.models import TerraformCloudOrganization
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from cartographer.models import TerraformCloudAPIKey, TerraformCloudOrganization
 
 logger = logging.getLogger(__name__)
 
@@ -30,19 +35,33 @@ def parse_tf_datetime_str(datetime_str):
     return datetime.datetime.strptime(datetime_str, '%Y-%m-%dT%H:%M:%S.%fZ')
 
 
+def parse_tf_status_timestamp(timestamp_str):
+    """Parse a Terraform Cloud run status timestamp into a datetime object. These use a different format
+    to other timestamps. Example Terraform Cloud format: 2021-05-24T07:38:04+00:00
+
+    Args
+        timestamp_str: the timestamp string to convert into a datetime object.
+
+    Returns
+        Timezone aware datetime object for the given timestamp.
+    """
+    return datetime.datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+
+
 class TerraformCloudClient():
     """Client containing functionality for interacting with the Terraform Cloud
     APIs and returning smaller, prepared datasets that the calling functions will
     find more easier to interact with.
     """
-    base_url = 'https://app.terraform.io'
-
     def __init__(self, api_key):
+        self.base_url = settings.TERRAFORM_CLOUD_URL
         self._api_key = api_key
         self._headers = {
             'Authorization': 'Bearer ' + api_key,
             'Content-Type': 'application/vnd.api+jso'
         }
+        # Reuse connections across requests, a sync makes many requests to the same hosts.
+        self._session = requests.Session()
 
     def _get_workspaces_page(self, organization_name, page_number, workspaces):
         """Follow a paginated link based on given page_number and parse the Workspace information.
@@ -51,10 +70,13 @@ class TerraformCloudClient():
             organization_name: the name of the Terraform Cloud Organiziation to fetch the workspaces for.
             page_number: the pagination page number that this function call will fetch (as it usually runs threaded).
             workspaces: the dict to update with the fetched workspaces.
+        Returns
+            True if every Workspace on the page was parsed, False if the page or any Workspace on it failed.
         """
-        pagination_url = f'https://app.terraform.io/api/v2/organizations/{organization_name}/workspaces?page%5Bnumber%5D={page_number}&page%5Bsize%5D={PAGE_SIZE}'
-        workspaces_response = requests.get(pagination_url, headers=self._headers, timeout=5)
+        pagination_url = self.base_url + f'/api/v2/organizations/{organization_name}/workspaces?page%5Bnumber%5D={page_number}&page%5Bsize%5D={PAGE_SIZE}'
+        workspaces_response = self._session.get(pagination_url, headers=self._headers, timeout=5)
         response_json = workspaces_response.json()
+        complete = True
         try:
             for workspace_json in response_json['data']:
                 try:
@@ -67,9 +89,12 @@ class TerraformCloudClient():
                 except Exception as error:
                     workspace_name = workspace['name']
                     logger.warning(f'An error occurred fetching workspace {workspace_name}. Error: {error}.')
+                    complete = False
                     continue
         except Exception as error:
             logger.warning(f'An error occurred fetching workspaces for Organization: {organization_name}. Error: {error}.')
+            complete = False
+        return complete
 
 
     def get_current_state_and_resources(self, state_lookup_path):
@@ -90,23 +115,17 @@ class TerraformCloudClient():
             state_resources: list of resources lifted straight from the state file
         """
         state_lookup_url = self.base_url + state_lookup_path
-        state_response = requests.get(state_lookup_url, headers=self._headers, timeout=5)
+        state_response = self._session.get(state_lookup_url, headers=self._headers, timeout=5)
         state_response_json = state_response.json()
 
         hosted_state_dl_url = state_response_json['data']['attributes']['hosted-state-download-url']
 
-        state_response = requests.get(hosted_state_dl_url, self._headers, timeout=5)
+        state_response = self._session.get(hosted_state_dl_url, timeout=5)
         state = state_response.json()
 
-        current_state = {}
+        current_state = summarise_state(state)
         current_state['state_id'] = state_response_json['data']['id']
-        current_state['serial'] = state['serial']
-        current_state['resource_count'] = 0
         current_state['created_at'] = parse_tf_datetime_str(state_response_json['data']['attributes']['created-at']).timestamp()
-        current_state['terraform_version'] = state['terraform_version']
-
-        for resource in state['resources']:
-            current_state['resource_count'] += len(resource['instances'])
 
         return current_state, state['resources']
 
@@ -178,7 +197,7 @@ class TerraformCloudClient():
         """
 
         workspace_dict = {}
-        workspace_request_response = requests.get(self.base_url + f'/api/v2/organizations/{organization_name}/workspaces/{workspace_name}', headers=self._headers, timeout=5)
+        workspace_request_response = self._session.get(self.base_url + f'/api/v2/organizations/{organization_name}/workspaces/{workspace_name}', headers=self._headers, timeout=5)
 
         response_json = workspace_request_response.json()
 
@@ -204,39 +223,66 @@ class TerraformCloudClient():
             workspace_dict['depends_on'] = {}
             workspace_dict['current_state'] = current_state
 
-            # TODO : Refactor this into a function as well
-            data_resources = [r for r in state_resources if (r['mode'] == 'data' and (r['type'] in ['terraform_remote_state', 'tfe_outputs']))]
-            for dr in [dr for dr in data_resources if len(dr['instances']) > 0]:
-                # TODO : Is the hard coded 0 good enough? Not sure of multiple instances use cases.
-                namespace = build_namespace(dr)
-
-                workspace_name = dr['instances'][0]['attributes']['config']['value']['workspaces']['name']
-                if namespace not in workspace_dict['depends_on']:
-                    redundant = False if 'module' in dr else True
-                    workspace_dict['depends_on'][namespace] = {
-                        'workspace_name': workspace_name,
-                        'organization': dr['instances'][0]['attributes']['config']['value']['organization'],
-                        'lookup_type': dr['type'],
-                        'redundant': redundant
-                        # TODO : Modules have remote_states that are required but not used. So although redundant they are required.
-                    }
-            managed_resources = [r for r in state_resources if r['mode'] == 'managed']
-            for r in [r for r in managed_resources if len(r['instances']) > 0]:
-                instance = r['instances'][0]   # TODO : Is this sufficient, do all instances all share the same dependencies?
-                if 'dependencies' in instance:
-                    for dependency in [d for d in instance['dependencies'] if ('terraform_remote_state' in d or 'tfe_outputs' in d)]:
-                        if dependency not in workspace_dict['depends_on']:
-                            # raise Exception(f'Error parsing dependencies... missing terraform_remote_state referenced. Dependency: {dependency}. Workspace: {workspace_dict["name"]}')
-                            # Seems like an optional data in a module is classed as a dep, even though it is not used... so just log info this for now?
-                            logger.debug(f'Error parsing dependencies... missing terraform_remote_state referenced. Dependency: {dependency}. Workspace: {workspace_dict["name"]}')
-                        else:
-                            workspace_dict['depends_on'][dependency]['redundant'] = False
-                            # TODO : Modules have remote_states that are required but not used. So although redundant they are required.
+            workspace_dict['depends_on'] = parse_workspace_dependencies(state_resources, workspace_dict['name'])
         except KeyError:
             logger.debug('Skipped empty Workspace.')
             
         return workspace_dict
 
+    def current_state_version_id(self, workspace_name: str, organization_name: str):
+        """Fetch only the id of the Workspace's current state version. This is a single request, so is
+        a cheap way to find out whether a Workspace has changed since it was last synced.
+
+        Args
+            workspace_name: the name of the Terraform Cloud Workspace to check.
+            organization_name: the name of the Terraform Cloud organization that the Workspace belongs to.
+
+        Returns
+            The current state version id or None if the Workspace has no state.
+        """
+        response = self._session.get(self.base_url + f'/api/v2/organizations/{organization_name}/workspaces/{workspace_name}', headers=self._headers, timeout=5)
+        response_json = response.json()
+
+        if 'errors' in response_json:
+            for error in response_json['errors']:
+                if error['status'] == '404' and error['title'] == 'not found':
+                    raise WorkspaceNotFoundException
+
+        current_state_version = response_json['data']['relationships'].get('current-state-version', {}).get('data')
+        return current_state_version['id'] if current_state_version else None
+
+    def run_durations(self, workspace_id: str, limit: int = 20):
+        """Fetch how long the Workspace's most recent successful runs took, from the start of planning to
+        the end of the apply.
+
+        Args
+            workspace_id: the Terraform Cloud identifier for the Workspace.
+            limit: the maximum number of runs to fetch, most recent first.
+
+        Returns
+            A list of run durations in seconds, most recent first.
+        """
+        params = {
+            'page[size]': limit,
+            'filter[status]': 'applied'
+        }
+        response = self._session.get(self.base_url + f'/api/v2/workspaces/{workspace_id}/runs', headers=self._headers, params=params, timeout=5)
+        if response.status_code != 200:
+            logger.info(f'Non 200 response {response.status_code} fetching runs for workspace {workspace_id}.')
+            return []
+
+        durations = []
+        for run in response.json()['data']:
+            attributes = run['attributes']
+            timestamps = attributes.get('status-timestamps', {})
+            started_at = timestamps.get('plan-queued-at') or timestamps.get('planning-at')
+            if attributes['status'] != 'applied' or not started_at or 'applied-at' not in timestamps:
+                continue
+            duration = parse_tf_status_timestamp(timestamps['applied-at']) - parse_tf_status_timestamp(started_at)
+            durations.append(duration.total_seconds())
+
+        return durations
+
     def workspaces(self, organization_name: str):
         """Fetch all workspaces for an organization, parse them and return a dict with the key as workspace
         name, dict contains only useful pieces of information/data that can be used by the calling function.
@@ -257,10 +303,23 @@ class TerraformCloudClient():
             }
 
         """
+        return self.workspaces_listing(organization_name)[0]
+
+    def workspaces_listing(self, organization_name: str):
+        """Fetch all workspaces for an organization as workspaces() does, along with whether the listing is known
+        to be complete. Anything that acts on Workspaces being missing from the listing should check it is.
+
+        Args
+            organization_name: the name of the Terraform Cloud Organization to fetch Workspaces for.
+        Returns
+            A tuple of the list of Workspaces, see workspaces(), and True if every page and every Workspace on
+            it was fetched and parsed.
+        """
         workspaces = []
-        initial_request_response = requests.get(self.base_url + f'/api/v2/organizations/{organization_name}/workspaces?page%5Bsize%5D={PAGE_SIZE}', headers=self._headers, timeout=5)
+        initial_request_response = self._session.get(self.base_url + f'/api/v2/organizations/{organization_name}/workspaces?page%5Bsize%5D={PAGE_SIZE}', headers=self._headers, timeout=5)
         response_json = initial_request_response.json()
 
+        complete = initial_request_response.status_code == 200
         if 'meta' not in response_json:
             total_pages = 1
         else:
@@ -268,57 +327,22 @@ class TerraformCloudClient():
 
         logger.info(f'Fetching {total_pages} pages worth of Workspaces for Organization {organization_name}')
         for page_number in range(1, total_pages + 1):
-            self._get_workspaces_page(organization_name, page_number, workspaces)
+            complete &= self._get_workspaces_page(organization_name, page_number, workspaces)
 
         logger.info(f'Parsed {len(workspaces)} workspaces.')
-        return workspaces
+        return workspaces, complete
 
     def resources(self, organization_name, workspace_name):
         resources = {
             'resources': {}
         }
-        response = requests.get(self.base_url + f'/api/v2/organizations/{organization_name}/workspaces/{workspace_name}', headers=self._headers, timeout=5)
+        response = self._session.get(self.base_url + f'/api/v2/organizations/{organization_name}/workspaces/{workspace_name}', headers=self._headers, timeout=5)
         workspace_json = response.json()
         state_lookup_path = workspace_json['data']['relationships']['current-state-version']['links']['related']
 
         _, state_resources = self.get_current_state_and_resources(state_lookup_path)
 
-        known_data_deps = []   # Store a list of data dependencies as they're seen so that we can check for redundant cross state dependencies.
-
-        for resource in state_resources:
-            namespace = build_namespace(resource)
-            resource_info = {
-                'name': resource['name'],
-                'resource_type': resource['type'],
-                'namespace': namespace,
-                'mode': resource['mode'],
-                'instances': [],
-                'provider': resource['provider'],
-                'depends_on': []
-            }
-            for instance in [ i for i in resource['instances'] if (resource['mode'] != 'data' and (resource['type'] not in ('terraform_remote_state', 'tfe_outputs')))]:
-                if 'index_key' not in instance:
-                    # If a resource doesn't have instances (is singular anyway) then there is no key.
-                    # To make our life easier we'll just default these to _default.
-                    # TODO : This is probably misleading, should maybe remove this?
-                    # Do we still need this or just go TF 1+ support only?
-                    index_key = '_default'
-                else:
-                    index_key = instance['index_key']
-                resource_info['instances'].append({
-                    'index_key': index_key,
-                    'iid': instance['attributes']['id']
-                })
-                if 'dependencies' in instance:
-                    for dependency in instance['dependencies']:
-                        # For now let's just show deps for the parent resource, rather than each instance.
-                        # It looks like all instances of the same resource share the same dependencies anyway?
-                        if dependency not in resource_info['depends_on']:
-                            resource_info['depends_on'].append(dependency)
-                        if dependency not in known_data_deps:
-                            known_data_deps.append(dependency)
-
-            resources['resources'][namespace] = resource_info
+        resources['resources'] = parse_resources(state_resources)
         return resources
 
     def state_revisions(self, workspace_name: str, organization_name: str, current_state_revision_id: str = None, initial_run=False):
@@ -356,7 +380,7 @@ class TerraformCloudClient():
             'filter[organization][name]': organization_name
         }
 
-        response = requests.get(self.base_url + f'/api/v2/state-versions', headers=self._headers, params=params, timeout=5)
+        response = self._session.get(self.base_url + f'/api/v2/state-versions', headers=self._headers, params=params, timeout=5)
         states_versions_response = response.json()
 
         states = []
@@ -378,7 +402,7 @@ class TerraformCloudClient():
                     total_pages = states_versions_response['meta']['pagination']['total-pages']
             for state_version_info in states_versions_response['data']:
                 # Fetch the state for parsing
-                state_contents_response = requests.get(state_version_info['attributes']['hosted-state-download-url'], timeout=5)
+                state_contents_response = self._session.get(state_version_info['attributes']['hosted-state-download-url'], timeout=5)
                 state_contents = state_contents_response.json()
 
                 state_info = {
@@ -406,12 +430,12 @@ class TerraformCloudClient():
                 'filter[organization][name]': organization_name,
                 'page[number]': page_number
             }
-            response = requests.get(self.base_url + f'/api/v2/state-versions', headers=self._headers, params=params, timeout=5)
+            response = self._session.get(self.base_url + f'/api/v2/state-versions', headers=self._headers, params=params, timeout=5)
             pagination_state_response = response.json()
             if response.status_code == 200:
                 for state_version_info in pagination_state_response['data']:
                     # Fetch the state for parsing
-                    state_contents_response = requests.get(state_version_info['attributes']['hosted-state-download-url'], timeout=5)
+                    state_contents_response = self._session.get(state_version_info['attributes']['hosted-state-download-url'], timeout=5)
                     state_contents = state_contents_response.json()
 
                     state_info = {
@@ -435,6 +459,94 @@ class TerraformCloudClient():
         return sorted(states, key=lambda k: k['serial'])
 
 
+class TerraformCloudClientRegistry():
+    """Per process cache of TerraformCloudClients keyed by Organization name. Building a client
+    means a query for the Organization and decrypting its API key, which every sync task would
+    otherwise repeat. Clients are kept for ttl seconds so that a changed API key is picked up by
+    long running workers, and the registry is cleared as soon as a key is saved in this process.
+    """
+
+    def __init__(self, ttl: int = None):
+        self._ttl = ttl
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return settings.TERRAFORM_CLOUD_CLIENT_TTL if self._ttl is None else self._ttl
+
+    def get(self, organization_name: str):
+        """Returns the cached client for the Organization, building a new one if there is no
+        cached client or it has expired.
+
+        Args
+            organization_name: the name of the Terraform Cloud Organization.
+        Returns
+            A TerraformCloudClient using the Organization's API key.
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._clients.get(organization_name)
+            if cached and cached[1] > now:
+                return cached[0]
+
+        organization = TerraformCloudOrganization.objects.select_related('api_key').get(name=organization_name)
+        client = TerraformCloudClient(api_key=organization.api_key.value)
+        with self._lock:
+            self._clients[organization_name] = (client, now + self.ttl, organization.api_key_id)
+        return client
+
+    def invalidate(self, organization_name: str = None):
+        """Drop the cached client for the given Organization, or every cached client if no
+        Organization is given.
+        """
+        with self._lock:
+            if organization_name is None:
+                self._clients.clear()
+            else:
+                self._clients.pop(organization_name, None)
+
+    def invalidate_if_api_key_changed(self, organization_name: str, api_key_id):
+        """Drop the cached client for the given Organization if it was built with a different API key.
+        """
+        with self._lock:
+            cached = self._clients.get(organization_name)
+            if cached and cached[2] != api_key_id:
+                self._clients.pop(organization_name)
+
+
+_registry = TerraformCloudClientRegistry()
+
+
+def get_client(organization_name: str):
+    """Returns a TerraformCloudClient for the Organization, shared across tasks in this process.
+
+    Args
+        organization_name: the name of the Terraform Cloud Organization.
+    Returns
+        A TerraformCloudClient using the Organization's API key.
+    """
+    return _registry.get(organization_name)
+
+
+@receiver(post_save, sender=TerraformCloudAPIKey)
+@receiver(post_delete, sender=TerraformCloudAPIKey)
+def _invalidate_all_clients(sender, **kwargs):
+    # Several Organizations can share a key, so drop them all.
+    _registry.invalidate()
+
+
+@receiver(post_save, sender=TerraformCloudOrganization)
+def _invalidate_organization_client_on_save(sender, instance, **kwargs):
+    # Organizations are saved at the start of every sync, only a change of API key affects the client.
+    _registry.invalidate_if_api_key_changed(instance.name, instance.api_key_id)
+
+
+@receiver(post_delete, sender=TerraformCloudOrganization)
+def _invalidate_organization_client(sender, instance, **kwargs):
+    _registry.invalidate(instance.name)
+
+
 def build_namespace(resource: dict):
     """Given a resource dictionary, returns a full Terraform namespace for the resource.
 
@@ -463,3 +575,134 @@ def build_namespace(resource: dict):
     namespace = namespace.format(module=module_str, data=data_str, resource_type=resource_type, name=name)
 
     return namespace
+
+
+def summarise_state(state: dict):
+    """Given a parsed state file, returns the metadata Terradactyl keeps about the state.
+
+    Args:
+        state (dict): the parsed state file.
+
+    Returns:
+        A dict of the serial, resource_count (the number of resource instances) and terraform_version.
+    """
+    return {
+        'serial': state['serial'],
+        'resource_count': sum(len(resource['instances']) for resource in state['resources']),
+        'terraform_version': state['terraform_version']
+    }
+
+
+def parse_workspace_dependencies(state_resources: list, workspace_name: str):
+    """Given the resources of a Workspace's state file, find the Workspaces it depends on through
+    terraform_remote_state or tfe_outputs data sources.
+
+    Args:
+        state_resources (list): the resources lifted straight from the state file.
+        workspace_name (str): the name of the Workspace the state belongs to, for logging.
+
+    Returns:
+        A dict of the data source namespace to the Workspace it looks up, for example:
+        {'data.terraform_remote_state.more_namespace': {'workspace_name': 'HappyLittleWorkspace', 'organization': 'Org1', 'lookup_type': 'terraform_remote_state', 'redundant': True}}
+
+    Raises:
+        KeyError: when a lookup's config doesn't include the Workspace it reads from.
+    """
+    depends_on = {}
+    data_resources = [r for r in state_resources if (r['mode'] == 'data' and (r['type'] in ['terraform_remote_state', 'tfe_outputs']))]
+    for dr in [dr for dr in data_resources if len(dr['instances']) > 0]:
+        # TODO : Is the hard coded 0 good enough? Not sure of multiple instances use cases.
+        namespace = build_namespace(dr)
+
+        lookup_workspace_name = dr['instances'][0]['attributes']['config']['value']['workspaces']['name']
+        if namespace not in depends_on:
+            redundant = False if 'module' in dr else True
+            depends_on[namespace] = {
+                'workspace_name': lookup_workspace_name,
+                'organization': dr['instances'][0]['attributes']['config']['value']['organization'],
+                'lookup_type': dr['type'],
+                'redundant': redundant
+                # TODO : Modules have remote_states that are required but not used. So although redundant they are required.
+            }
+    managed_resources = [r for r in state_resources if r['mode'] == 'managed']
+    for r in [r for r in managed_resources if len(r['instances']) > 0]:
+        instance = r['instances'][0]   # TODO : Is this sufficient, do all instances all share the same dependencies?
+        if 'dependencies' in instance:
+            for dependency in [d for d in instance['dependencies'] if ('terraform_remote_state' in d or 'tfe_outputs' in d)]:
+                if dependency not in depends_on:
+                    # raise Exception(f'Error parsing dependencies... missing terraform_remote_state referenced. Dependency: {dependency}. Workspace: {workspace_name}')
+                    # Seems like an optional data in a module is classed as a dep, even though it is not used... so just log info this for now?
+                    logger.debug(f'Error parsing dependencies... missing terraform_remote_state referenced. Dependency: {dependency}. Workspace: {workspace_name}')
+                else:
+                    depends_on[dependency]['redundant'] = False
+                    # TODO : Modules have remote_states that are required but not used. So although redundant they are required.
+    return depends_on
+
+
+def parse_resources(state_resources: list):
+    """Given the resources of a state file, returns the information Terradactyl keeps about each of them.
+
+    Args:
+        state_resources (list): the resources lifted straight from the state file.
+
+    Returns:
+        A dict of resource namespace to its name, resource_type, namespace, mode, provider, instances (index_key
+        and iid of each) and depends_on (the namespaces its instances depend on).
+    """
+    resources = {}
+    known_data_deps = []   # Store a list of data dependencies as they're seen so that we can check for redundant cross state dependencies.
+
+    for resource in state_resources:
+        namespace = build_namespace(resource)
+        resource_info = {
+            'name': resource['name'],
+            'resource_type': resource['type'],
+            'namespace': namespace,
+            'mode': resource['mode'],
+            'instances': [],
+            'provider': resource['provider'],
+            'depends_on': []
+        }
+        for instance in [ i for i in resource['instances'] if (resource['mode'] != 'data' and (resource['type'] not in ('terraform_remote_state', 'tfe_outputs')))]:
+            if 'index_key' not in instance:
+                # If a resource doesn't have instances (is singular anyway) then there is no key.
+                # To make our life easier we'll just default these to _default.
+                # TODO : This is probably misleading, should maybe remove this?
+                # Do we still need this or just go TF 1+ support only?
+                index_key = '_default'
+            else:
+                index_key = instance['index_key']
+            resource_info['instances'].append({
+                'index_key': index_key,
+                'iid': instance['attributes']['id']
+            })
+            if 'dependencies' in instance:
+                for dependency in instance['dependencies']:
+                    # For now let's just show deps for the parent resource, rather than each instance.
+                    # It looks like all instances of the same resource share the same dependencies anyway?
+                    if dependency not in resource_info['depends_on']:
+                        resource_info['depends_on'].append(dependency)
+                    if dependency not in known_data_deps:
+                        known_data_deps.append(dependency)
+
+        resources[namespace] = resource_info
+    return resources
+
+
+def build_resource_adjacency(resources: dict):
+    """Given the resources of a state, as returned by TerraformCloudClient.resources(), build the dependencies
+    between them as an adjacency list. Only dependencies on other resources in the same state are kept.
+
+    Args:
+        resources (dict): resource namespace to resource info, including its depends_on list.
+
+    Returns:
+        A dict of resource namespace to the sorted list of namespaces it depends on, resources without any
+        dependencies in the state are left out.
+    """
+    adjacency = {}
+    for namespace, resource in resources.items():
+        dependencies = sorted({d for d in resource['depends_on'] if d in resources and d != namespace})
+        if dependencies:
+            adjacency[namespace] = dependencies
+    return adjacency
@@ -25,7 +25,7 @@ def organizations(request):
     context['organizations'] = []
 
     for org in organizations:
-        sync_job = org.organizationsyncjob_set.filter(~Q(state=OrganizationSyncJob.COMPLETE))
+        sync_job = org.organizationsyncjob_set.filter(~Q(state__in=OrganizationSyncJob.FINISHED_STATES))
         if sync_job:
             state = sync_job[0].state
             duration = sync_job[0].duration
@@ -1,33 +1,65 @@
+import math
+
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 from django.views.decorators.http import require_http_methods
 
 from cartographer.gizmo import Gizmo
 from cartographer.gizmo.models import Workspace
-from cartographer.gizmo.models.exceptions import VertexDoesNotExistException
+from cartographer.models import TerraformCloudOrganization
+from cartographer.utils.dag import get_dependency_cycles
+
+# Number of Workspaces listed per page of a report.
+REPORT_PAGE_SIZE = 50
 
 
 @login_required
 @require_http_methods(['GET'])
 def terraform_versions(request):
+    """Report of the Terraform version each Workspace is on, grouped by version. The breakdown and the
+    requested page of Workspaces are each fetched in a single traversal, so the report takes the same
+    number of round trips however many Workspaces there are.
+
+    Query params
+        organization: only report on the Workspaces in this Organization.
+        version: only list the Workspaces on this Terraform version.
+        page: the page of Workspaces to list, starting at 1.
     """
-    """
-    workspace_data = []
-    workspace_vertices = Workspace.vertices.all()
-
-    for w in workspace_vertices:
-        try:
-            terraform_version = w.get_current_state_revision().terraform_version
-        except VertexDoesNotExistException:
-            terraform_version = 'N/A'
-        workspace_data.append({
-            'name': w.name,
-            'org_name': w.organization,
-            'terraform_version': terraform_version
-        })
+    organization = request.GET.get('organization') or None
+    terraform_version = request.GET.get('version') or None
+
+    version_counts = Workspace.vertices.count_by_terraform_version(organization=organization)
+    workspace_count = version_counts.get(terraform_version, 0) if terraform_version else sum(version_counts.values())
+
+    page_count = max(math.ceil(workspace_count / REPORT_PAGE_SIZE), 1)
+    try:
+        page = min(max(int(request.GET.get('page', 1)), 1), page_count)
+    except ValueError:
+        page = 1
+    start = (page - 1) * REPORT_PAGE_SIZE
+
+    workspace_data = Workspace.vertices.terraform_versions(
+        terraform_version=terraform_version,
+        organization=organization,
+        start=start,
+        end=start + REPORT_PAGE_SIZE)
 
     context = {
         'stats': {
+            'workspace_count': workspace_count,
+            'version_count': len(version_counts)
+        },
+        'versions': sorted(version_counts.items(), key=lambda item: item[1], reverse=True),
+        'organizations': TerraformCloudOrganization.objects.order_by('name').values_list('name', flat=True),
+        'filters': {
+            'organization': organization or '',
+            'version': terraform_version or ''
+        },
+        'page': {
+            'number': page,
+            'count': page_count,
+            'previous': page - 1 if page > 1 else None,
+            'next': page + 1 if page < page_count else None
         },
         'workspace_data': workspace_data
     }
@@ -46,4 +78,22 @@ def redundant_dependencies(request):
         }
     }
 
-    return render(request, 'redundant-dependencies.html', context)
\ No newline at end of file
+    return render(request, 'redundant-dependencies.html', context)
+
+
+@login_required
+@require_http_methods(['GET'])
+def dependency_cycles(request):
+    """Report of every dependency cycle across all Organizations, with the Workspaces in each
+    cycle and the depends_on Edges (and their lookup type) that close it.
+    """
+    cycles = get_dependency_cycles()
+
+    context = {
+        'stats': {
+            'cycle_count': len(cycles),
+            'cyclic_workspace_count': sum(len(c['workspaces']) for c in cycles)
+        },
+        'cycles': cycles
+    }
+    return render(request, 'dependency-cycles.html', context)
@@ -1,8 +1,6 @@
 import datetime
 import json
 
-from collections import OrderedDict
-
 import humanize
 
 from django.conf import settings
@@ -10,11 +8,11 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect, render
 from django.views.decorators.http import require_http_methods
 
-from cartographer.models import TerraformCloudOrganization
+from cartographer.models import StateInstanceCount, TerraformCloudOrganization
 
 from cartographer.gizmo import Gizmo
 from cartographer.gizmo.models import Resource, ResourceInstance, State, Workspace
-from cartographer.gizmo.models.exceptions import VertexDoesNotExistException
+from cartographer.utils.cache import cached_for_generation
 
 
 @login_required
@@ -27,7 +25,7 @@ def index(request):
 
     # Account for the fact the above is a quick count of combinations, not individuals.
     # TODO : Do this on resource so we know a proper ratio of provider usage?
-    terraform_provider_dist = ResourceInstance.vertices.count_by('provider')
+    terraform_provider_dist = _instance_count_by('provider')
     sorted_terraform_provider_dist = dict(sorted(terraform_provider_dist.items(), key=lambda item: item[1], reverse=True)) 
     charts_terraform_provider_distribution = {
         'data': json.dumps([d for d in sorted_terraform_provider_dist.values()]),
@@ -61,8 +59,9 @@ def workspace(request, workspace_name):
     """
     workspace = Workspace.vertices.get(name=workspace_name)
 
-    charts_data_growth, _ = _generate_growth_chart_data([workspace], calculate_cumsum=False)
+    charts_data_growth = _growth_chart_data(*_workspace_growth_series(workspace))
     current_revision = workspace.get_current_state_revision()
+    summary = workspace.get_summary()
 
     resource_type_dist = Resource.vertices.count_by(group_by='resource_type', state_id=current_revision.state_id)
     sorted_resource_type_dist = dict(sorted(resource_type_dist.items(), key=lambda item: item[1], reverse=True)) 
@@ -86,11 +85,11 @@ def workspace(request, workspace_name):
         'upstream_dependencies': upstream_dependencies,
         'stats': {
             'latest_apply': humanize.naturaldate(current_revision.created_at_dt) + ' (' + humanize.naturaltime(current_revision.created_at_dt) + ')',
-            'resource_count': current_revision.resource_count,
+            'resource_count': summary['resource_count'],
             'last_updated': datetime.datetime.utcfromtimestamp(float(workspace.last_updated)),
-            'revision_count': workspace.get_total_revision_count(),
+            'revision_count': summary['revision_count'],
             'created_at': humanize.naturaldate(datetime.datetime.fromtimestamp(workspace.created_at)) + ' (' + humanize.naturaltime(datetime.datetime.fromtimestamp(workspace.created_at)) + ')',
-            'terraform_version': current_revision.terraform_version
+            'terraform_version': summary['terraform_version']
         },
         'charts': {
             'resource_distribution': charts_data_resource_distribution,
@@ -124,7 +123,7 @@ def workspaces_network(request):
         'labels': json.dumps([k for k in terraform_version_dist.keys()])
     }
 
-    resource_type_dist = ResourceInstance.vertices.count_by('resource_type')
+    resource_type_dist = _instance_count_by('resource_type')
     resource_type_dist['terraform_remote_state'] = 0
     sorted_resource_type_dist = dict(sorted(resource_type_dist.items(), key=lambda item: item[1], reverse=True)) 
     charts_data_resource_distribution = {
@@ -132,12 +131,8 @@ def workspaces_network(request):
         'labels': json.dumps([k for k in sorted_resource_type_dist.keys()])
     }
 
-    # workspaces = Workspace.vertices.all()
-    # FIXME : This now takes too long to do, pull it out into an API?
-    charts_data_growth, resource_count = {
-        'data': [],
-        'labels': []
-    }, ResourceInstance.vertices.count()  # TODO : This needs to exclude terraform_remote_state?
+    charts_data_growth = _growth_chart_data(*cached_for_generation('growth', _org_growth_series))
+    resource_count = _instance_count()  # TODO : This needs to exclude terraform_remote_state?
 
     return render(request, 'workspaces-network.html', {
         'stats': {
@@ -168,80 +163,54 @@ def insert_dict(l, d):
     return len(l)-1
 
 
-def _generate_growth_chart_data(workspaces, calculate_cumsum=True):
-    """Generate growth data for the growth chat by inspecting all revisions for
-    either a given, or all workspaces.
+def _instance_count_by(group_by):
+    """Count the Resource Instances by provider or resource_type, from the precomputed per state counts when
+    instances are stored compactly.
+    """
+    if settings.COMPACT_RESOURCE_INSTANCES:
+        return StateInstanceCount.count_by(group_by)
+    return ResourceInstance.vertices.count_by(group_by)
+
 
-    Iterates over revisions and stores the resource count against the date.
-    For the first revision, stores the full resource count.
-    Following revisions store the difference.
-    This allows a cumsum without re-counting existing resources each iteration.
+def _instance_count():
+    if settings.COMPACT_RESOURCE_INSTANCES:
+        return StateInstanceCount.total()
+    return ResourceInstance.vertices.count()
 
-    Args
-        workspaces: list of Workspace objects to generate growth data for.
-        calculate_cumsum: if True then a cumulatitive sum is calculated. This is required when
-                          handling multiple Workspaces.
 
+def _org_growth_series():
+    """Calculate the resource growth series across every Workspace.
+    """
+    # numpy is slow to import and only needed here, so load it on first use rather than at start up.
+    from cartographer.utils.growth import growth_series
+
+    for workspace in Workspace.vertices.all():
+        if not workspace.revisions_indexed:
+            workspace.index_revisions()
+
+    columns = State.vertices.revision_columns()
+    return growth_series(columns['created_at'], columns['owner_workspace_id'], columns['resource_count'])
+
+
+def _workspace_growth_series(workspace):
+    """Calculate the resource growth series for a single Workspace.
+    """
+    from cartographer.utils.growth import growth_series
+
+    revisions = workspace.revisions()
+    return growth_series([r.created_at for r in revisions], [workspace.workspace_id] * len(revisions), [r.resource_count for r in revisions])
+
+
+def _growth_chart_data(days, resource_counts):
+    """Format a growth series for the growth chart.
+
+    Args
+        days: the timestamp for the start of each day.
+        resource_counts: the total resource count at the end of each day.
     Returns
-        The data and labels and a resource count.
+        The data and labels for the chart.
     """
-    charts_growth_data = {}
-    resource_count = 0
-    for workspace in workspaces:
-        has_current_revision = True
-        try:
-            current_revision = workspace.get_current_state_revision()
-        except VertexDoesNotExistException:
-            has_current_revision = False
-
-        state_revisions = workspace.get_state_revisions() if has_current_revision else []
-
-        if has_current_revision:
-            resource_count += current_revision.resource_count
-
-        prev_resource_count = 0
-        # First, for each workspace state revision store the difference on that day.
-        # Then we can use those diffs to calculate a cumsum for each day accross as state revisions?
-        for state_revision in state_revisions:
-            created_at = state_revision.created_at_dt
-            count_diff = state_revision.resource_count - prev_resource_count
-            if created_at not in charts_growth_data:
-                # The first state here is the original, so we add all the resources.
-                charts_growth_data[created_at] = count_diff if calculate_cumsum else state_revision.resource_count
-            else:
-                if calculate_cumsum:
-                    charts_growth_data[created_at] += count_diff
-                else:
-                    charts_growth_data[created_at] = state_revision.resource_count
-            prev_resource_count = state_revision.resource_count
-
-        if has_current_revision:
-            # Handle current revision resource count (not returned by get revisions right now...)
-            count_diff = current_revision.resource_count - prev_resource_count
-            current_rev_dt = current_revision.created_at_dt
-            if current_rev_dt not in charts_growth_data:
-                charts_growth_data[current_rev_dt] = count_diff if calculate_cumsum else current_revision.resource_count
-            else:
-                if calculate_cumsum:
-                    charts_growth_data[current_rev_dt] += count_diff
-                else:
-                    charts_growth_data[current_rev_dt] = current_revision.resource_count
-
-    if workspaces:
-        # Order it
-        sorted_charts_growth_data = OrderedDict(sorted(charts_growth_data.items()))
-
-        if calculate_cumsum:
-            cumsum = 0
-            for k, v in sorted_charts_growth_data.items():
-                cumsum += v
-                sorted_charts_growth_data[k] = cumsum
-    else:
-        sorted_charts_growth_data = {}
-
-    charts_data_growth = {
-        'data': json.dumps([d for d in sorted_charts_growth_data.values()]),
-        'labels': json.dumps([datetime.datetime.strftime(k, '%d %b %Y') for k in sorted_charts_growth_data.keys()])
+    return {
+        'data': json.dumps(resource_counts),
+        'labels': json.dumps([datetime.datetime.utcfromtimestamp(d).strftime('%d %b %Y') for d in days])
     }
-
-    return charts_data_growth, resource_count
\ No newline at end of file
@@ -137,4 +137,59 @@ LOGIN_URL = '/login'
 
 # Celery Config
 CELERY_BROKER_URL='redis://localhost:6379/0'
-CELERY_RESULT_BACKEND='redis://localhost:6379/0'
\ No newline at end of file
+CELERY_RESULT_BACKEND='redis://localhost:6379/0'
+CELERY_BEAT_SCHEDULE = {
+    'schedule-workspace-syncs': {
+        'task': 'cartographer.tasks.scheduler.schedule_workspace_syncs',
+        'schedule': 60.0
+    },
+    'resume-abandoned-sync-jobs': {
+        'task': 'cartographer.tasks.terraform_cloud.resume_abandoned_sync_jobs',
+        'schedule': 300.0
+    },
+    'collect-garbage': {
+        'task': 'cartographer.tasks.maintenance.collect_garbage',
+        'schedule': float(os.getenv('TERRADACTYL_GC_INTERVAL', 86400))
+    }
+}
+
+# Sync Locking & Coalescing
+REDIS_URL = os.getenv('TERRADACTYL_REDIS_URL', CELERY_BROKER_URL)
+SYNC_LOCK_TTL = int(os.getenv('TERRADACTYL_SYNC_LOCK_TTL', 60))
+SYNC_COALESCE_TTL = int(os.getenv('TERRADACTYL_SYNC_COALESCE_TTL', 3600))
+SYNC_JOB_HEARTBEAT_INTERVAL = int(os.getenv('TERRADACTYL_SYNC_JOB_HEARTBEAT_INTERVAL', 10))
+SYNC_JOB_HEARTBEAT_TIMEOUT = int(os.getenv('TERRADACTYL_SYNC_JOB_HEARTBEAT_TIMEOUT', 300))
+# Number of Workspaces each Organization sync task handles. 0 or 1 runs a task per Workspace.
+SYNC_CHUNK_SIZE = int(os.getenv('TERRADACTYL_SYNC_CHUNK_SIZE', 0))
+
+# Scheduled Sync
+SCHEDULED_SYNC_REQUEST_BUDGET = int(os.getenv('TERRADACTYL_SCHEDULED_SYNC_REQUEST_BUDGET', 120))   # Terraform Cloud requests per minute
+SCHEDULED_SYNC_CHANGE_COST = int(os.getenv('TERRADACTYL_SCHEDULED_SYNC_CHANGE_COST', 10))   # Estimated requests to sync a changed Workspace
+SCHEDULED_SYNC_MIN_INTERVAL = int(os.getenv('TERRADACTYL_SCHEDULED_SYNC_MIN_INTERVAL', 300))
+SCHEDULED_SYNC_MAX_INTERVAL = int(os.getenv('TERRADACTYL_SCHEDULED_SYNC_MAX_INTERVAL', 86400))
+SCHEDULED_SYNC_HISTORY_WINDOW = int(os.getenv('TERRADACTYL_SCHEDULED_SYNC_HISTORY_WINDOW', 30 * 86400))
+SCHEDULED_SYNC_CHECKS_PER_APPLY = int(os.getenv('TERRADACTYL_SCHEDULED_SYNC_CHECKS_PER_APPLY', 4))
+
+# Terraform Cloud, or a Terraform Enterprise installation, to sync from.
+TERRAFORM_CLOUD_URL = os.getenv('TERRADACTYL_TERRAFORM_CLOUD_URL', 'https://app.terraform.io').rstrip('/')
+
+# Seconds each worker process reuses a Terraform Cloud client (and its decrypted API key) for.
+TERRAFORM_CLOUD_CLIENT_TTL = int(os.getenv('TERRADACTYL_TERRAFORM_CLOUD_CLIENT_TTL', 300))
+
+# Seconds to keep results that are cached until the next sync changes the graph.
+GENERATION_CACHE_TTL = int(os.getenv('TERRADACTYL_GENERATION_CACHE_TTL', 86400))
+
+# Run planning
+RUN_DURATION_SAMPLE_SIZE = int(os.getenv('TERRADACTYL_RUN_DURATION_SAMPLE_SIZE', 20))   # Recent runs to take the median duration of
+DEFAULT_APPLY_DURATION = int(os.getenv('TERRADACTYL_DEFAULT_APPLY_DURATION', 300))   # Seconds, for Workspaces with no run history
+
+# Pack Resource Instances onto their Resource Vertex (with per state counts kept in the database) rather than
+# storing a Vertex and Edge for each one. Shrinks the graph a lot for large count/for_each Resources.
+COMPACT_RESOURCE_INSTANCES = os.getenv('TERRADACTYL_COMPACT_RESOURCE_INSTANCES', 'false').lower() in ('true', '1')
+
+# Garbage Collection
+# A Workspace's state revisions are dropped once they are outside both the newest GC_KEEP_REVISIONS and the last
+# GC_KEEP_REVISION_DAYS, 0 turns either off. With both off every revision is kept.
+GC_KEEP_REVISIONS = int(os.getenv('TERRADACTYL_GC_KEEP_REVISIONS', 0))
+GC_KEEP_REVISION_DAYS = int(os.getenv('TERRADACTYL_GC_KEEP_REVISION_DAYS', 0))
+GC_BATCH_SIZE = int(os.getenv('TERRADACTYL_GC_BATCH_SIZE', 500))   # Vertices dropped per traversal